@@ -0,0 +1,949 @@
+"""
+Full-text search over the judgments with BM25.
+
+The index is a directory of immutable segments plus a segments.json manifest.
+Each segment holds the posting lists of the documents committed together,
+compressed (delta-coded doc IDs and term frequencies as varints, in blocks of
+128 postings) and read through mmap, so opening an index is cheap and a query
+only touches the blocks it decodes.
+
+    python search_index.py build            # index the crawler's corpus
+    python search_index.py build --update   # only what changed since then
+    python search_index.py search "unfair dismissal" -k 10
+
+The corpus is the crawler's packed corpus store (training/data/corpus_store)
+or, without one, the loose training/data/<category>/<case>.txt files.
+
+New documents go into new segments, so a crawl becomes searchable as soon as
+it is committed; small segments are merged in a background thread. A document
+re-added under the same name shadows its older copy, and a deleted one is
+hidden by a tombstone in the segment that deletes it.
+"""
+
+import argparse
+import bisect
+import heapq
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter, namedtuple
+
+import numpy as np
+
+
+BLOCK_SIZE = 128
+MERGE_POSTINGS = 1 << 21
+K1 = 1.2
+B = 0.75
+
+NON_LETTERS = re.compile(r"[^a-zA-Z]")
+
+# The corpus store's layout, as training/scripts/corpus_store.py writes it: an
+# index.sqlite3 "documents" table locating each case's zlib-compressed UTF-8
+# text in one of the shard files.
+STORE_INDEX = "index.sqlite3"
+SHARD_NAME = "shard-{:05d}.bin"
+
+StoreDocument = namedtuple(
+    "StoreDocument", ["category", "case_id", "shard", "offset", "length"]
+)
+
+
+def get_default_index_path():
+    serving_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(serving_dir, "index")
+
+
+def get_default_data_dir():
+    serving_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(os.path.dirname(serving_dir), "training", "data")
+
+
+def get_default_store_path():
+    return os.path.join(get_default_data_dir(), "corpus_store")
+
+
+def clean_word(word):
+    """
+    The cleaning rule of clean_word in training/scripts/process_text_file.py:
+    letters only (no numbers) and no single-letter words.
+    """
+    if not word.isascii():
+        word = unicodedata.normalize("NFKD", word)
+    cleaned = NON_LETTERS.sub("", word)
+    return cleaned if len(cleaned) > 1 else ""
+
+
+def tokenize(text):
+    """
+    Return the index terms of `text`: cleaned as in training, then
+    lower-cased so that searches are case-insensitive.
+    """
+    terms = (clean_word(word) for word in text.split())
+    return [term.lower() for term in terms if term]
+
+
+# -------------------------------------------------------------------
+# Varint coding, vectorized
+def encode_varints(values):
+    """
+    Encode non-negative integers below 2**35 as LEB128 varints. Returns
+    (bytes, number of bytes of each value).
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    shifts = np.arange(5, dtype=np.uint64) * np.uint64(7)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for i in range(1, 5):
+        nbytes += values >= np.uint64(1 << (7 * i))
+    groups = np.empty((len(values), 5), dtype=np.uint8)
+    for i, shift in enumerate(shifts):
+        groups[:, i] = (values >> shift) & np.uint64(127)
+    position = np.arange(5)[None, :]
+    groups[position < (nbytes - 1)[:, None]] |= 128
+    return groups[position < nbytes[:, None]].tobytes(), nbytes
+
+
+def decode_varints(data):
+    """
+    Decode a uint8 array of concatenated varints into a uint64 array.
+    """
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 128)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 127).astype(np.uint64) << (position * 7).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def bm25_weight(tf, doc_len, avg_len, k1=K1, b=B):
+    return tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_len))
+
+
+def idf(num_docs, doc_freq):
+    return np.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+# -------------------------------------------------------------------
+# Segments
+_SEGMENT_ARRAYS = (
+    ("doc_lens", np.uint32),
+    ("term_blocks", np.int64),
+    ("term_df", np.uint32),
+    ("block_offsets", np.int64),
+    ("block_last_doc", np.int64),
+    ("block_sizes", np.uint16),
+    ("block_max_tf", np.uint32),
+    ("block_min_len", np.uint32),
+)
+
+
+class _SegmentWriter:
+    """
+    Writes one segment directory. Documents are added first, then the
+    postings of batches of terms in sorted term order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path)
+        self.names = []
+        self.deleted = []
+        self.doc_lens = []
+        self.terms = []
+        self._arrays = {name: [] for name, _ in _SEGMENT_ARRAYS}
+        self._num_blocks = 0
+        self._num_bytes = 0
+        self._postings = open(os.path.join(path, "postings.bin"), "wb")
+        self._doc_len_array = None
+
+    def add_document(self, name, length):
+        self.names.append(name)
+        self.doc_lens.append(length)
+
+    def add_terms(self, terms, docs, tfs, df):
+        """
+        Add the postings of `terms`, which sort after any terms added before.
+        docs and tfs hold each term's postings in turn, df[i] of them (at
+        least one) for terms[i], with ascending doc IDs within a term.
+        """
+        if not terms:
+            return
+        if self._doc_len_array is None:
+            self._doc_len_array = np.array(self.doc_lens, dtype=np.int64)
+        df = np.asarray(df, dtype=np.int64)
+        # Split every term's postings into blocks of BLOCK_SIZE.
+        term_starts = np.cumsum(df) - df
+        num_blocks = -(-df // BLOCK_SIZE)
+        block_term = np.repeat(np.arange(len(df)), num_blocks)
+        within = np.arange(num_blocks.sum()) - np.repeat(
+            np.cumsum(num_blocks) - num_blocks, num_blocks
+        )
+        starts = term_starts[block_term] + within * BLOCK_SIZE
+        ends = np.minimum(starts + BLOCK_SIZE, (term_starts + df)[block_term])
+        sizes = ends - starts
+
+        # Doc IDs are delta-coded continuously across a term's blocks: a
+        # block's first delta is relative to the previous block's last doc.
+        deltas = np.diff(docs, prepend=0)
+        deltas[term_starts] = docs[term_starts]
+        # Lay each block out as its deltas followed by its frequencies.
+        block = np.repeat(np.arange(len(starts)), sizes)
+        position = np.arange(len(docs)) - starts[block]
+        values = np.empty(2 * len(docs), dtype=np.int64)
+        values[2 * starts[block] + position] = deltas
+        values[2 * starts[block] + sizes[block] + position] = tfs
+        data, nbytes = encode_varints(values)
+        self._postings.write(data)
+        block_bytes = np.add.reduceat(nbytes, 2 * starts)
+
+        arrays = self._arrays
+        self.terms.extend(terms)
+        arrays["term_df"].append(df)
+        arrays["term_blocks"].append(self._num_blocks + np.cumsum(num_blocks))
+        arrays["block_offsets"].append(self._num_bytes + np.cumsum(block_bytes))
+        arrays["block_last_doc"].append(docs[ends - 1])
+        arrays["block_sizes"].append(sizes)
+        arrays["block_max_tf"].append(np.maximum.reduceat(tfs, starts))
+        arrays["block_min_len"].append(
+            np.minimum.reduceat(self._doc_len_array[docs], starts)
+        )
+        self._num_blocks += int(num_blocks.sum())
+        self._num_bytes += len(data)
+
+    def close(self):
+        self._postings.close()
+        self._arrays["doc_lens"] = [self.doc_lens]
+        # Offsets arrays are CSR-style and start with a 0.
+        self._arrays["term_blocks"].insert(0, [0])
+        self._arrays["block_offsets"].insert(0, [0])
+        for name, dtype in _SEGMENT_ARRAYS:
+            parts = self._arrays[name]
+            values = np.concatenate(parts) if parts else []
+            np.save(os.path.join(self.path, name + ".npy"), np.array(values, dtype))
+        for name, lines in (
+            ("names.txt", self.names),
+            ("terms.txt", self.terms),
+            ("deleted.txt", self.deleted),
+        ):
+            with open(os.path.join(self.path, name), "w", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(line + "\n")
+        meta = {
+            "num_docs": len(self.names),
+            "total_len": int(sum(self.doc_lens)),
+            "num_terms": len(self.terms),
+            "num_blocks": self._num_blocks,
+        }
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+
+class Segment:
+    """
+    Read-only view of a segment directory; every array is memory-mapped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.names = self._read_lines("names.txt")
+        # Names deleted from the older segments (absent before tombstones).
+        if os.path.exists(os.path.join(path, "deleted.txt")):
+            self.deleted = self._read_lines("deleted.txt")
+        else:
+            self.deleted = []
+        self.term_list = self._read_lines("terms.txt")
+        self.terms = {term: i for i, term in enumerate(self.term_list)}
+        for name, _ in _SEGMENT_ARRAYS:
+            # A plain ndarray view of the mmap: cheaper to slice than np.memmap.
+            array = np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+            setattr(self, name, np.asarray(array))
+        self._first_block = np.zeros(len(self.block_sizes), dtype=bool)
+        self._first_block[self.term_blocks[:-1][self.term_df > 0]] = True
+        postings = os.path.join(path, "postings.bin")
+        if os.path.getsize(postings):
+            self.postings = np.asarray(np.memmap(postings, dtype=np.uint8, mode="r"))
+        else:
+            self.postings = np.zeros(0, dtype=np.uint8)
+
+    def _read_lines(self, name):
+        with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+            return f.read().split("\n")[:-1]
+
+    @property
+    def num_docs(self):
+        return self.meta["num_docs"]
+
+    def blocks(self, term_id):
+        return int(self.term_blocks[term_id]), int(self.term_blocks[term_id + 1])
+
+    def read_blocks(self, blocks):
+        """
+        Decode the given blocks (ascending block numbers, of any terms) and
+        return (doc IDs, term frequencies) as int64 arrays.
+        """
+        if len(blocks) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        starts = self.block_offsets[blocks]
+        lengths = self.block_offsets[blocks + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        values = decode_varints(
+            self.postings[offsets + np.arange(lengths.sum())]
+        ).astype(np.int64)
+
+        sizes = self.block_sizes[blocks].astype(np.int64)
+        block_starts = np.cumsum(sizes) - sizes
+        value_starts = 2 * block_starts
+        position = np.arange(sizes.sum()) - np.repeat(block_starts, sizes)
+        deltas = values[np.repeat(value_starts, sizes) + position]
+        tfs = values[np.repeat(value_starts + sizes, sizes) + position]
+        # A block's doc IDs continue from the previous block's last doc.
+        base = np.where(
+            self._first_block[blocks], 0, self.block_last_doc[np.maximum(blocks - 1, 0)]
+        )
+        sums = np.cumsum(deltas)
+        before = np.repeat(sums[block_starts] - deltas[block_starts], sizes)
+        docs = sums - before + np.repeat(base, sizes)
+        return docs, tfs
+
+    def read_term(self, term_id):
+        return self.read_blocks(np.arange(*self.blocks(term_id)))
+
+
+# -------------------------------------------------------------------
+def _read_manifest(path):
+    manifest_path = os.path.join(path, "segments.json")
+    if not os.path.exists(manifest_path):
+        return {"segments": [], "next_segment": 0, "updated_at": 0}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(path, manifest):
+    manifest_path = os.path.join(path, "segments.json")
+    with open(manifest_path + ".part", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".part", manifest_path)
+
+
+def _live_masks(segments):
+    # A name in a newer segment shadows the same name in older ones, and so
+    # does a newer segment's tombstone for it.
+    seen = set()
+    masks = {}
+    for segment in reversed(segments):
+        masks[segment.name] = np.array(
+            [name not in seen for name in segment.names], dtype=bool
+        )
+        seen.update(segment.names)
+        seen.update(segment.deleted)
+    return masks
+
+
+class IndexWriter:
+    """
+    Adds and deletes documents. Documents are buffered and written as a new
+    segment every `buffer_docs` documents (or on commit()), together with
+    tombstones for the documents deleted since the last commit; when there are
+    more than `max_segments` segments, the smallest run of `merge_factor`
+    neighbouring segments is merged in a background thread. Only one
+    IndexWriter should have an index open at a time.
+    """
+
+    def __init__(
+        self, path=None, buffer_docs=2000, max_segments=8, merge_factor=4
+    ):
+        self.path = path or get_default_index_path()
+        os.makedirs(self.path, exist_ok=True)
+        self.buffer_docs = buffer_docs
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        self._buffer = []
+        self._deleted = []
+        self._lock = threading.Lock()
+        self._merge_thread = None
+        # Left behind by a writer that died mid-commit or mid-merge.
+        for name in os.listdir(self.path):
+            if name.endswith(".part"):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def add(self, name, text):
+        counts = Counter(tokenize(text))
+        self._buffer.append((name, sum(counts.values()), counts))
+        if len(self._buffer) >= self.buffer_docs:
+            self.commit()
+
+    def delete(self, name):
+        """
+        Remove a document from the index as of the next commit.
+        """
+        self._buffer = [doc for doc in self._buffer if doc[0] != name]
+        self._deleted.append(name)
+
+    def names(self):
+        """
+        The names of the documents in the index, not counting the buffer.
+        """
+        with self._lock:
+            segments = [
+                Segment(os.path.join(self.path, name))
+                for name in _read_manifest(self.path)["segments"]
+            ]
+        live = _live_masks(segments)
+        return {
+            name
+            for segment in segments
+            for name, keep in zip(segment.names, live[segment.name])
+            if keep
+        }
+
+    def _new_segment_path(self):
+        with self._lock:
+            manifest = _read_manifest(self.path)
+            number = manifest["next_segment"]
+            manifest["next_segment"] = number + 1
+            _write_manifest(self.path, manifest)
+        return os.path.join(self.path, f"seg-{number:06d}")
+
+    def commit(self):
+        """
+        Write the buffered documents and deletions as a new segment and make
+        it visible.
+        """
+        if not self._buffer and not self._deleted:
+            return
+        buffer, self._buffer = self._buffer, []
+        deleted, self._deleted = self._deleted, []
+        terms = []
+        docs = []
+        tfs = []
+        for doc_id, (_, _, counts) in enumerate(buffer):
+            terms.extend(counts)
+            tfs.extend(counts.values())
+            docs.extend([doc_id] * len(counts))
+        vocabulary = sorted(set(terms))
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+        term_ids = np.fromiter((term_ids[term] for term in terms), np.int64, len(terms))
+        # Group the postings by term; the stable sort keeps doc IDs ascending.
+        order = np.argsort(term_ids, kind="stable")
+
+        path = self._new_segment_path()
+        writer = _SegmentWriter(path + ".part")
+        for name, length, _ in buffer:
+            writer.add_document(name, length)
+        writer.deleted = deleted
+        writer.add_terms(
+            vocabulary,
+            np.array(docs, dtype=np.int64)[order],
+            np.array(tfs, dtype=np.int64)[order],
+            np.bincount(term_ids, minlength=len(vocabulary)),
+        )
+        writer.close()
+        os.rename(path + ".part", path)
+
+        with self._lock:
+            manifest = _read_manifest(self.path)
+            manifest["segments"].append(os.path.basename(path))
+            manifest["updated_at"] = time.time()
+            _write_manifest(self.path, manifest)
+        print(
+            f"Committed {len(buffer)} documents and {len(deleted)} deletions "
+            f"to {os.path.basename(path)}"
+        )
+        self.maybe_merge()
+
+    def maybe_merge(self, background=True):
+        if self._merge_thread is not None and self._merge_thread.is_alive():
+            return
+        segments = _read_manifest(self.path)["segments"]
+        if len(segments) <= self.max_segments:
+            return
+        # The neighbouring run with the fewest documents. Merging only
+        # neighbours keeps the newer-shadows-older order intact.
+        sizes = [self._num_docs(name) for name in segments]
+        width = min(self.merge_factor, len(segments))
+        start = min(
+            range(len(segments) - width + 1),
+            key=lambda i: sum(sizes[i : i + width]),
+        )
+        run = segments[start : start + width]
+        if background:
+            self._merge_thread = threading.Thread(target=self.merge, args=(run,))
+            self._merge_thread.start()
+        else:
+            self.merge(run)
+
+    def _num_docs(self, name):
+        with open(os.path.join(self.path, name, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)["num_docs"]
+
+    def merge(self, run=None):
+        """
+        Merge a run of neighbouring segments (all of them by default) into
+        one, dropping shadowed and deleted documents, and swap it into the
+        manifest. Tombstones are kept while older segments remain.
+        """
+        with self._lock:
+            names = _read_manifest(self.path)["segments"]
+        run = list(run or names)
+        if len(run) < 2:
+            return
+        segments = [Segment(os.path.join(self.path, name)) for name in names]
+        live = _live_masks(segments)
+        inputs = [segment for segment in segments if segment.name in run]
+
+        path = self._new_segment_path()
+        writer = _SegmentWriter(path + ".part")
+        if segments[0].name not in run:
+            writer.deleted = sorted(
+                set().union(*(segment.deleted for segment in inputs))
+            )
+        # Old doc ID -> new doc ID (-1 for shadowed documents), per segment.
+        remap = []
+        next_id = 0
+        for segment in inputs:
+            mask = live[segment.name]
+            ids = np.full(segment.num_docs, -1, dtype=np.int64)
+            ids[mask] = np.arange(next_id, next_id + mask.sum())
+            next_id += int(mask.sum())
+            remap.append(ids)
+            lens = segment.doc_lens
+            for doc in np.flatnonzero(mask):
+                writer.add_document(segment.names[doc], int(lens[doc]))
+
+        # Merge a slice of the combined vocabulary at a time, about
+        # MERGE_POSTINGS postings each, so memory stays bounded however large
+        # the merged segments are.
+        vocabulary = sorted(set().union(*(segment.terms for segment in inputs)))
+        positions = {term: i for i, term in enumerate(vocabulary)}
+        doc_freqs = np.zeros(len(vocabulary), dtype=np.int64)
+        for segment in inputs:
+            ids = [positions[term] for term in segment.term_list]
+            doc_freqs[ids] += segment.term_df
+        ends = np.searchsorted(
+            np.cumsum(doc_freqs),
+            np.arange(MERGE_POSTINGS, doc_freqs.sum() + MERGE_POSTINGS, MERGE_POSTINGS),
+            "right",
+        )
+        bounds = np.unique(np.concatenate([[0], ends, [len(vocabulary)]]))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            chunk = vocabulary[start:end]
+            chunk_ids = {term: i for i, term in enumerate(chunk)}
+            parts = []
+            for segment, ids in zip(inputs, remap):
+                first = bisect.bisect_left(segment.term_list, chunk[0])
+                last = bisect.bisect_right(segment.term_list, chunk[-1])
+                if first == last:
+                    continue
+                blocks = np.arange(
+                    segment.term_blocks[first], segment.term_blocks[last]
+                )
+                docs, tfs = segment.read_blocks(blocks)
+                local = [chunk_ids[term] for term in segment.term_list[first:last]]
+                terms = np.repeat(local, segment.term_df[first:last])
+                docs = ids[docs]
+                keep = docs >= 0
+                parts.append((terms[keep], docs[keep], tfs[keep]))
+            if not parts:
+                continue
+            terms, docs, tfs = (np.concatenate(p) for p in zip(*parts))
+            order = np.lexsort((docs, terms))
+            df = np.bincount(terms, minlength=len(chunk))
+            writer.add_terms(
+                [chunk[i] for i in np.flatnonzero(df)],
+                docs[order],
+                tfs[order],
+                df[df > 0],
+            )
+        writer.close()
+        os.rename(path + ".part", path)
+
+        with self._lock:
+            manifest = _read_manifest(self.path)
+            current = manifest["segments"]
+            position = current.index(run[0])
+            current = [name for name in current if name not in run]
+            current.insert(position, os.path.basename(path))
+            manifest["segments"] = current
+            manifest["updated_at"] = time.time()
+            _write_manifest(self.path, manifest)
+        for name in run:
+            # Open readers keep their mmaps; the files go when they close.
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        print(f"Merged {len(run)} segments into {os.path.basename(path)}")
+
+    def close(self):
+        self.commit()
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+
+
+# -------------------------------------------------------------------
+class SearchIndex:
+    """
+    Searches an index written by IndexWriter.
+
+        with SearchIndex() as index:
+            for score, name in index.search("legitimate expectation", k=10):
+                ...
+
+    Scores are BM25 with corpus-wide statistics over the live documents:
+    their number, average length and document frequencies. Shadowed and
+    deleted copies don't count, so scores don't depend on when segments
+    were merged.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_default_index_path()
+        self._segments = {}
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def refresh(self):
+        """
+        Pick up segments committed or merged since the index was opened.
+        """
+        self.manifest = _read_manifest(self.path)
+        names = self.manifest["segments"]
+        self._segments = {
+            name: self._segments.get(name) or Segment(os.path.join(self.path, name))
+            for name in names
+        }
+        self.segments = [self._segments[name] for name in names]
+        self.live = _live_masks(self.segments)
+        # Segments holding shadowed or deleted copies, and the live document
+        # frequencies of their terms, counted when first queried.
+        self._partial = {
+            name for name, mask in self.live.items() if not mask.all()
+        }
+        self._doc_freqs = {}
+        self.num_docs = int(sum(mask.sum() for mask in self.live.values()))
+        total_len = sum(
+            int(segment.doc_lens[self.live[segment.name]].sum())
+            for segment in self.segments
+        )
+        self.avg_len = total_len / self.num_docs if self.num_docs else 1.0
+
+    def __len__(self):
+        return self.num_docs
+
+    def search(self, query, k=10):
+        """
+        Return the top `k` documents for `query` as [(score, name)], best
+        first.
+
+        Within each segment this is MaxScore: terms are scored in order of
+        their upper-bound contribution (from the per-block maximum term
+        frequency and minimum document length). Once the k-th best score
+        beats what the remaining terms could add, only documents that can
+        still reach the top k are candidates, and the remaining terms only
+        decode the posting blocks that hold a candidate.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.num_docs:
+            return []
+        doc_freqs = {
+            term: sum(
+                self._doc_freq(segment, segment.terms[term])
+                for segment in self.segments
+                if term in segment.terms
+            )
+            for term in terms
+        }
+        weights = {
+            term: idf(self.num_docs, df) for term, df in doc_freqs.items() if df
+        }
+        top = []  # min-heap of (score, name)
+        threshold = 0.0
+        for segment in sorted(self.segments, key=lambda s: -s.num_docs):
+            threshold = self._search_segment(segment, weights, k, top, threshold)
+        return sorted(top, reverse=True)
+
+    def _doc_freq(self, segment, term_id):
+        if segment.name not in self._partial:
+            return int(segment.term_df[term_id])
+        key = (segment.name, term_id)
+        if key not in self._doc_freqs:
+            docs, _ = segment.read_term(term_id)
+            self._doc_freqs[key] = int(self.live[segment.name][docs].sum())
+        return self._doc_freqs[key]
+
+    def _search_segment(self, segment, weights, k, top, threshold):
+        plan = []
+        for term, weight in weights.items():
+            term_id = segment.terms.get(term)
+            if term_id is None:
+                continue
+            first, last = segment.blocks(term_id)
+            bound = bm25_weight(
+                segment.block_max_tf[first:last].astype(np.float64),
+                segment.block_min_len[first:last],
+                self.avg_len,
+            ).max()
+            plan.append((weight * bound, weight, term_id))
+        plan.sort(reverse=True)
+        bounds = [bound for bound, _, _ in plan]
+        if not plan or (len(top) == k and sum(bounds) <= threshold):
+            # No document of this segment can make the top k.
+            return threshold
+        remaining = [sum(bounds[i + 1 :]) for i in range(len(plan))]
+
+        live = self.live[segment.name]
+        scores = np.zeros(segment.num_docs)
+        candidates = None
+        for (_, weight, term_id), rest in zip(plan, remaining):
+            first, last = segment.blocks(term_id)
+            blocks = np.arange(first, last)
+            if candidates is not None:
+                last_docs = segment.block_last_doc[first:last]
+                hits = np.searchsorted(last_docs, candidates)
+                blocks = first + np.unique(hits[hits < last - first])
+            docs, tfs = segment.read_blocks(blocks)
+            scores[docs] += weight * bm25_weight(
+                tfs, segment.doc_lens[docs], self.avg_len
+            )
+            # The k-th best score among the documents just scored is a lower
+            # bound for the final k-th best score.
+            scored = scores[docs[live[docs]]]
+            if len(scored) >= k:
+                kth = np.partition(scored, len(scored) - k)[len(scored) - k]
+                threshold = max(threshold, kth)
+            if threshold > rest:
+                # Documents below threshold - rest can no longer make the cut.
+                if candidates is None:
+                    candidates = np.flatnonzero(live & (scores + rest >= threshold))
+                else:
+                    candidates = candidates[scores[candidates] + rest >= threshold]
+                if len(candidates) == 0:
+                    break
+
+        if candidates is None:
+            hits = np.flatnonzero(live & (scores > 0))
+        else:
+            hits = candidates[scores[candidates] > 0]
+        if len(hits) > k:
+            hits = hits[np.argpartition(scores[hits], len(hits) - k)[-k:]]
+        for doc in hits:
+            item = (float(scores[doc]), segment.names[doc])
+            if len(top) < k:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+        if len(top) == k:
+            threshold = max(threshold, top[0][0])
+        return threshold
+
+    def close(self):
+        self._segments = {}
+        self.segments = []
+
+
+# -------------------------------------------------------------------
+def list_text_files(data_dir):
+    """
+    Return (name, path) for every data/<category>/<case>.txt file, where
+    name is "<category>/<case>.txt".
+    """
+    files = []
+    for category in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, category)
+        if not os.path.isdir(folder):
+            continue
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith(".txt"):
+                path = os.path.join(folder, file_name)
+                files.append((f"{category}/{file_name}", path))
+    return files
+
+
+class CorpusStoreReader:
+    """
+    Read-only access to the crawler's corpus store, straight from its on-disk
+    format so that serving needs none of the training code.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_default_store_path()
+        index = os.path.join(self.path, STORE_INDEX)
+        if not os.path.exists(index):
+            raise FileNotFoundError(f"No corpus store at {self.path}")
+        self._conn = sqlite3.connect(index)
+        self._shards = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def documents(self, stored_after=None):
+        """
+        The stored cases (only those stored after the `stored_after`
+        timestamp, if given) in on-disk order, so that reading them one after
+        another scans each shard front to back.
+        """
+        sql = "SELECT category, case_id, shard, offset, length FROM documents"
+        params = ()
+        if stored_after is not None:
+            sql += " WHERE stored_at > ?"
+            params = (stored_after,)
+        sql += " ORDER BY shard, offset"
+        return [StoreDocument(*row) for row in self._conn.execute(sql, params)]
+
+    def read(self, document):
+        """
+        Return the text of a StoreDocument.
+        """
+        f = self._shards.get(document.shard)
+        if f is None:
+            f = open(os.path.join(self.path, SHARD_NAME.format(document.shard)), "rb")
+            self._shards[document.shard] = f
+        f.seek(document.offset)
+        return zlib.decompress(f.read(document.length)).decode("utf-8")
+
+    def close(self):
+        for f in self._shards.values():
+            f.close()
+        self._shards = {}
+        self._conn.close()
+
+
+def build_index(
+    data_dir=None, index_path=None, update=False, source="auto", store_path=None
+):
+    """
+    Index the judgments: the corpus store's cases as "<category>/<case_id>",
+    or the loose data_dir/<category>/<case>.txt files as "<category>/<case>.txt".
+    With source="auto" the store is used when it exists.
+
+    With `update`, only documents new to the index or stored (or modified)
+    since the last build are (re)indexed, and indexed documents that are no
+    longer in the corpus are deleted.
+    """
+    data_dir = data_dir or get_default_data_dir()
+    index_path = index_path or get_default_index_path()
+    store_path = store_path or get_default_store_path()
+    if source == "auto":
+        has_store = os.path.exists(os.path.join(store_path, STORE_INDEX))
+        source = "store" if has_store else "files"
+    manifest = _read_manifest(index_path)
+    since = manifest.get("indexed_until", manifest["updated_at"]) if update else 0
+    # Anything stored while this build runs is picked up by the next update.
+    started = time.time()
+
+    if source == "store":
+        with CorpusStoreReader(store_path) as reader:
+            documents = [
+                (f"{document.category}/{document.case_id}", document)
+                for document in reader.documents()
+            ]
+            recent = {
+                (document.category, document.case_id)
+                for document in reader.documents(stored_after=since)
+            }
+            count = _index_documents(
+                index_path,
+                documents,
+                lambda document: (document.category, document.case_id) in recent,
+                reader.read,
+                update,
+            )
+    else:
+        count = _index_documents(
+            index_path,
+            list_text_files(data_dir),
+            lambda path: os.path.getmtime(path) > since,
+            _read_text_file,
+            update,
+        )
+
+    manifest = _read_manifest(index_path)
+    manifest["indexed_until"] = started
+    _write_manifest(index_path, manifest)
+    return count
+
+
+def _read_text_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _index_documents(index_path, documents, modified, read, update):
+    with IndexWriter(index_path) as writer:
+        indexed = writer.names() if update else set()
+        current = {name for name, _ in documents}
+        removed = sorted(indexed - current)
+        added = [
+            (name, ref)
+            for name, ref in documents
+            if name not in indexed or modified(ref)
+        ]
+        print(f"Indexing {len(added)} documents, deleting {len(removed)}...")
+        for name in removed:
+            writer.delete(name)
+        for name, ref in added:
+            writer.add(name, read(ref))
+    return len(added)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BM25 search over the judgments.")
+    parser.add_argument("--index", default=None, help="Index directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index the judgment corpus.")
+    build.add_argument(
+        "--source",
+        choices=("auto", "store", "files"),
+        default="auto",
+        help="The corpus store, loose .txt files, or the store if it exists.",
+    )
+    build.add_argument("--store", default=None, help="Corpus store directory.")
+    build.add_argument("--data", default=None, help="Folder of <category>/*.txt.")
+    build.add_argument(
+        "--update",
+        action="store_true",
+        help="Only index what changed since the last build, and drop what was "
+        "removed.",
+    )
+    commands.add_parser("merge", help="Merge all segments into one.")
+    search = commands.add_parser("search", help="Run a query.")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.data, args.index, args.update, args.source, args.store)
+    elif args.command == "merge":
+        IndexWriter(args.index).merge()
+    else:
+        with SearchIndex(args.index) as index:
+            start = time.perf_counter()
+            results = index.search(args.query, args.k)
+            elapsed = (time.perf_counter() - start) * 1000
+            for score, name in results:
+                print(f"{score:8.3f}  {name}")
+            print(f"{len(results)} results in {elapsed:.1f} ms")
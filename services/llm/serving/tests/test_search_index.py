@@ -0,0 +1,147 @@
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import pytest
+
+from search_index import (
+    B,
+    K1,
+    IndexWriter,
+    SearchIndex,
+    build_index,
+    tokenize,
+)
+
+# Stores are written with the crawler's own CorpusWriter, so the store tests
+# also check that CorpusStoreReader keeps up with its format.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "training",
+        "scripts",
+    )
+)
+from corpus_store import CorpusWriter  # noqa: E402
+
+WORDS = [
+    "court", "appeal", "dismissal", "unfair", "contract", "labour", "tax",
+    "constitution", "rights", "property", "eviction", "damages", "review",
+    "tender", "municipality", "minister", "pension", "custody", "bail", "fd",
+    "ca", "sentence", "murder", "theft", "fraud", "estate", "trust", "lease",
+]
+
+
+def random_text(rng):
+    # Zipf-like: a few common words, many rare ones.
+    return " ".join(
+        WORDS[min(int(rng.paretovariate(1.0)) - 1, len(WORDS) - 1)]
+        for _ in range(rng.randint(5, 60))
+    )
+
+
+def brute_force(documents, query, k):
+    """
+    BM25 over the live documents, scored one by one.
+    """
+    counts = {name: Counter(tokenize(text)) for name, text in documents.items()}
+    num_docs = len(counts)
+    avg_len = sum(sum(c.values()) for c in counts.values()) / num_docs
+    results = []
+    for name, c in counts.items():
+        length = sum(c.values())
+        score = 0.0
+        for term in dict.fromkeys(tokenize(query)):
+            if not c[term]:
+                continue
+            df = sum(1 for other in counts.values() if other[term])
+            weight = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            tf = c[term]
+            score += weight * tf * (K1 + 1) / (
+                tf + K1 * (1 - B + B * length / avg_len)
+            )
+        if score > 0:
+            results.append((score, name))
+    return sorted(results, reverse=True)[:k]
+
+
+def assert_same_top_k(index, documents, query, k):
+    expected = brute_force(documents, query, k)
+    results = index.search(query, k)
+    assert [s for s, _ in results] == pytest.approx([s for s, _ in expected])
+    # Names may only differ among tied scores.
+    expected_scores = dict((n, s) for s, n in brute_force(documents, query, 10**9))
+    for score, name in results:
+        assert expected_scores[name] == pytest.approx(score)
+
+
+def test_search_matches_brute_force_after_readds_and_deletes(tmp_path):
+    rng = random.Random(0)
+    documents = {}
+    with IndexWriter(str(tmp_path), buffer_docs=100, max_segments=100) as writer:
+        for i in range(400):
+            documents[f"doc-{i}"] = random_text(rng)
+            writer.add(f"doc-{i}", documents[f"doc-{i}"])
+        writer.commit()
+        # Re-add a quarter of the corpus (as `build --update` does) and
+        # delete a few documents; the old copies stay in older segments.
+        for i in rng.sample(range(400), 100):
+            documents[f"doc-{i}"] = random_text(rng)
+            writer.add(f"doc-{i}", documents[f"doc-{i}"])
+        for i in rng.sample(range(400), 20):
+            documents.pop(f"doc-{i}", None)
+            writer.delete(f"doc-{i}")
+
+    queries = ["fd ca", "unfair dismissal", "court", "trust lease fraud"] + [
+        " ".join(rng.sample(WORDS, rng.randint(1, 4))) for _ in range(100)
+    ]
+    with SearchIndex(str(tmp_path)) as index:
+        assert len(index) == len(documents)
+        for query in queries:
+            assert_same_top_k(index, documents, query, 10)
+
+    # Merging drops the old copies but must not change any score.
+    IndexWriter(str(tmp_path)).merge()
+    with SearchIndex(str(tmp_path)) as index:
+        assert len(index.segments) == 1
+        for query in queries:
+            assert_same_top_k(index, documents, query, 10)
+
+
+def test_update_from_corpus_store(tmp_path):
+    store_path = str(tmp_path / "store")
+    index_path = str(tmp_path / "index")
+    store = CorpusWriter(store_path)
+    store.add_text("ZACC", "1995/3", "death penalty unconstitutional")
+    store.add_text("ZASCA", "2001/1", "unfair dismissal appeal")
+    build_index(index_path=index_path, store_path=store_path)
+
+    time.sleep(0.01)
+    store.add_text("ZASCA", "2001/1", "eviction of occupiers")
+    store.add_text("ZALAC", "2010/7", "unfair labour practice")
+    store.close()
+    assert build_index(index_path=index_path, store_path=store_path, update=True) == 2
+
+    with SearchIndex(index_path) as index:
+        assert len(index) == 3
+        assert [name for _, name in index.search("unfair")] == ["ZALAC/2010/7"]
+        assert [name for _, name in index.search("eviction")] == ["ZASCA/2001/1"]
+
+
+def test_update_drops_deleted_files(tmp_path):
+    data_dir = tmp_path / "data"
+    index_path = str(tmp_path / "index")
+    (data_dir / "Court").mkdir(parents=True)
+    for name, text in (("a.txt", "bail hearing"), ("b.txt", "bail refused")):
+        (data_dir / "Court" / name).write_text(text, encoding="utf-8")
+    build_index(str(data_dir), index_path, source="files")
+
+    os.remove(data_dir / "Court" / "a.txt")
+    assert build_index(str(data_dir), index_path, update=True, source="files") == 0
+
+    with SearchIndex(index_path) as index:
+        assert len(index) == 1
+        assert [name for _, name in index.search("bail")] == ["Court/b.txt"]
@@ -0,0 +1,426 @@
+import asyncio
+import functools
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from case_pipeline import CaseFileWriter, CaseJob
+from crawl_manifest import CrawlManifest, case_key, category_code
+from crawl_metrics import log, metrics, response_size
+from http_cache import ListingCache, create_session
+from link_extractor import extract_page
+from pacing import RETRY_EXCEPTIONS, HostPacers, RetryPolicy
+from preprocess_data import (
+    HEADERS,
+    get_month_links,
+    get_target_folder,
+    get_year_links,
+)
+
+
+# -------------------------------------------------------------------
+class AsyncCrawler:
+    """
+    Crawl category -> year -> case -> RTF with many requests in flight.
+
+    Every request must get a global slot, a per-host slot and a token from the
+    host's pacing.AdaptivePacer before it is sent. The pacer's rate starts at
+    `rate` and backs off (AIMD) when the host answers 429/5xx or fails to
+    connect; such requests are retried with jittered exponential backoff or
+    after the host's Retry-After, without holding a slot while they wait.
+    The blocking `requests` calls run on a thread pool sized to the global
+    limit, so no extra HTTP dependency is needed. They share one keep-alive
+    session, and listing pages go through the conditional-request cache.
+    """
+
+    def __init__(
+        self,
+        base_url="",
+        max_concurrency=16,
+        per_host_concurrency=4,
+        rate=4.0,
+        burst=8,
+        manifest=None,
+        listing_cache=None,
+        pipeline=None,
+        output=None,
+        min_rate=0.25,
+        adaptive=True,
+        retries=4,
+    ):
+        self.base_url = base_url
+        self.pipeline = pipeline
+        self.output = output if output is not None else CaseFileWriter()
+        self.manifest = manifest if manifest is not None else CrawlManifest()
+        self.listing_cache = (
+            listing_cache if listing_cache is not None else ListingCache()
+        )
+        self.session = create_session(HEADERS, pool_size=max_concurrency)
+        self.per_host_concurrency = per_host_concurrency
+        self.pacers = HostPacers(
+            max_rate=rate, min_rate=min_rate, burst=burst, adaptive=adaptive
+        )
+        self.policy = RetryPolicy(retries)
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._host_slots = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # (code, case_id) of every case handed to crawl_case, so a case listed
+        # under two categories with the same code is only crawled once.
+        self._scheduled = set()
+        self.cases_downloaded = 0
+
+    def _host_limits(self, url):
+        host = urlparse(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_slots[host], self.pacers.for_url(url)
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def fetch(self, url, listing=False, category=None, consume=None, **kwargs):
+        """
+        GET `url` once the global, per-host and rate limits allow it. Listing
+        pages are served from, or revalidated against, the listing cache; a
+        fresh cached page is returned at once, without taking a slot or a
+        pacer token. The time spent waiting for the limits and the request
+        itself are recorded separately, as the "wait" and "fetch" stages of
+        `category`.
+        Throttled and failed requests are retried per self.policy; the last
+        response is returned (or connection error raised) once retries run out.
+
+        With `consume`, the body is streamed: a 200 response is passed to
+        consume(response) on a worker thread while the slots are still held,
+        and (response, result) is returned, with result None for any other
+        status. A body that breaks off part way is retried like a failed
+        request.
+        """
+        if consume is not None:
+            kwargs["stream"] = True
+        if listing:
+            cached = await self._run_blocking(self.listing_cache.fresh, url)
+            if cached is not None:
+                return cached
+        host_slots, pacer = self._host_limits(url)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            async with self._global_slots:
+                async with host_slots:
+                    await pacer.acquire()
+                    fetch_start = time.perf_counter()
+                    metrics.observe("wait", fetch_start - start, category, start)
+                    try:
+                        with metrics.span("fetch", category):
+                            if listing:
+                                response = await self._run_blocking(
+                                    self.listing_cache.fetch,
+                                    self.session,
+                                    url,
+                                    **kwargs,
+                                )
+                            else:
+                                response = await self._run_blocking(
+                                    self.session.get, url, **kwargs
+                                )
+                        # The pacer sees the latency up to the headers.
+                        latency = time.perf_counter() - fetch_start
+                        result = None
+                        if consume is not None and response.status_code == 200:
+                            result = await self._run_blocking(consume, response)
+                    except RETRY_EXCEPTIONS:
+                        latency = time.perf_counter() - fetch_start
+                        delay = self.policy.outcome(
+                            pacer, url, attempt, latency, None, category
+                        )
+                        if delay is None:
+                            raise
+                    else:
+                        delay = self.policy.outcome(
+                            pacer, url, attempt, latency, response, category
+                        )
+                        if delay is None:
+                            return response if consume is None else (response, result)
+                        if hasattr(response, "close"):
+                            response.close()
+            # Back off outside the slots, so other requests can use them.
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    # ---------------------------------------------------------------
+    async def crawl_category(self, idx, href, title):
+        category_url = urljoin(self.base_url, href)
+        code = category_code(href)
+        log.info("### Processing Category URL: %s (%s)", category_url, title)
+
+        target_folder = get_target_folder(title)
+
+        try:
+            cat_response = await self.fetch(
+                category_url, listing=True, category=code, allow_redirects=True
+            )
+            if cat_response.status_code != 200:
+                log.warning("Failed to fetch category page: %s", category_url)
+                return
+            cat_html = cat_response.text
+        except Exception as e:
+            metrics.error(code, "fetch")
+            log.warning("!!! Error processing %s: %s", category_url, e)
+            return
+
+        with metrics.span("parse", code):
+            year_links = get_year_links(cat_html)
+        if not year_links:
+            log.warning("!!! No year links found on category page %s", category_url)
+            return
+
+        year_urls = [
+            urljoin(category_url + "/", y_href)
+            if not y_href.startswith("http")
+            else y_href
+            for y_href in year_links
+        ]
+        await asyncio.gather(
+            *(self.crawl_year(idx, code, title, year_url, target_folder)
+                for year_url in year_urls)
+        )
+
+    async def crawl_year(self, idx, code, title, year_url, target_folder):
+        try:
+            year_response = await self.fetch(year_url, listing=True, category=code)
+            if year_response.status_code != 200:
+                log.warning("!!! Failed to fetch year page: %s", year_url)
+                return
+            year_html = year_response.text
+        except Exception as e:
+            metrics.error(code, "fetch")
+            log.warning("!!! Error fetching year page %s: %s", year_url, e)
+            return
+
+        with metrics.span("parse", code):
+            month_links = get_month_links(year_html)
+        if not month_links:
+            log.warning("❌  No month links found on year page %s", year_url)
+            return
+
+        log.info("*** %d case files found for year page %s", len(month_links), year_url)
+        case_urls = []
+        for file_href in month_links:
+            case_url = urljoin(year_url + "/", file_href)
+            try:
+                key = (code, case_key(case_url))
+            except ValueError:
+                # crawl_case logs the URL it cannot key.
+                key = None
+            if key in self._scheduled:
+                log.debug("Already crawling %s/%s: %s", *key, case_url)
+                continue
+            if key is not None:
+                self._scheduled.add(key)
+            case_urls.append(case_url)
+        await asyncio.gather(
+            *(
+                self.crawl_case(idx, code, title, case_url, target_folder)
+                for case_url in case_urls
+            )
+        )
+
+    async def crawl_case(self, idx, code, title, file_url, target_folder):
+        case_id = None
+        try:
+            case_id = case_key(file_url)
+            if self.manifest.is_complete(code, case_id):
+                metrics.case(code, "skipped")
+                return
+            self.manifest.mark_started(code, case_id, file_url)
+
+            file_response = await self.fetch(file_url, category=code)
+            if file_response.status_code != 200:
+                log.warning("!!! Failed to fetch case url: %s", file_url)
+                self.manifest.mark_failed(
+                    code, case_id, f"HTTP {file_response.status_code}"
+                )
+                metrics.case(code, "failed")
+                return
+            with metrics.span("parse", code):
+                page = extract_page(file_response.text)
+            case_title = page.title if page.has_title else f"case_{idx}"
+            case_name = re.sub(r'[\/:*?"<>|]', "_", case_title)
+
+            # Same naming and skip rule as the sequential crawler.
+            file_name = os.path.join(target_folder, f"{case_name}.txt")
+            stored = await self._run_blocking(
+                self.output.find, code, case_id, file_name
+            )
+            if stored is not None:
+                log.debug("❌ %s already exists, skipping...", stored.output_path)
+                self.manifest.mark_stored(code, case_id, None, stored)
+                metrics.case(code, "skipped")
+                return
+
+            rtf_href = page.rtf_link
+            if not rtf_href:
+                log.debug("❌ No RTF link found on case page %s", file_url)
+                self.manifest.mark_no_rtf(code, case_id)
+                metrics.case(code, "no_rtf")
+                return
+
+            rtf_url = urljoin(file_url, rtf_href)
+            job = CaseJob(
+                code, case_id, rtf_url, file_name, case_title, title, None
+            )
+            if self.pipeline is None:
+                # Without the pipeline the RTF is converted while it downloads.
+                await self._stream_case(job)
+                return
+
+            try:
+                rtf_response = await self.fetch(rtf_url, category=code)
+                if rtf_response.status_code != 200:
+                    log.warning("!!! Failed to download RTF file: %s", rtf_url)
+                    rtf_response.close()
+                    self.manifest.mark_failed(
+                        code, case_id, f"RTF HTTP {rtf_response.status_code}"
+                    )
+                    metrics.case(code, "failed")
+                    return
+                rtf_content = rtf_response.text
+                self.cases_downloaded += 1
+            except Exception as e:
+                log.warning("!!! Error downloading RTF file %s: %s", rtf_url, e)
+                self.manifest.mark_failed(code, case_id, e)
+                metrics.error(code, "fetch")
+                metrics.case(code, "failed")
+                return
+
+            # Blocks (on a worker thread) while the convert queue is full.
+            await self._run_blocking(
+                self.pipeline.submit,
+                job._replace(
+                    rtf_content=rtf_content, rtf_bytes=response_size(rtf_response)
+                ),
+            )
+
+        except Exception as e:
+            log.warning("!!! Error fetching file page %s: %s", file_url, e)
+            metrics.error(code, "case")
+            if case_id is not None:
+                self.manifest.mark_failed(code, case_id, e)
+                metrics.case(code, "failed")
+
+    async def _stream_case(self, job):
+        """
+        Download the case's RTF and convert it into self.output as it arrives,
+        inside fetch so the download counts against the slots and pacing.
+        """
+        code, case_id, rtf_url = job.category, job.case_id, job.rtf_url
+
+        def save(rtf_response):
+            with metrics.span("stream", code):
+                return self.output.save_stream(job, rtf_response)
+
+        try:
+            rtf_response, stored = await self.fetch(
+                rtf_url, category=code, consume=save
+            )
+        except requests.RequestException as e:
+            log.warning("!!! Error downloading RTF file %s: %s", rtf_url, e)
+            self.manifest.mark_failed(code, case_id, e)
+            metrics.error(code, "fetch")
+            metrics.case(code, "failed")
+            return
+        except Exception as e:
+            log.warning("!!! Error converting RTF file %s: %s", rtf_url, e)
+            self.manifest.mark_failed(code, case_id, e)
+            metrics.error(code, "stream")
+            metrics.case(code, "failed")
+            return
+        if stored is None:
+            log.warning("!!! Failed to download RTF file: %s", rtf_url)
+            rtf_response.close()
+            self.manifest.mark_failed(
+                code, case_id, f"RTF HTTP {rtf_response.status_code}"
+            )
+            metrics.case(code, "failed")
+            return
+        self.cases_downloaded += 1
+        self.manifest.mark_stored(code, case_id, rtf_url, stored)
+        metrics.case(code, "stored", response_size(rtf_response), stored.byte_size)
+        log.debug("✅ Written file: %s", stored.output_path)
+
+    async def run(self, extracted):
+        try:
+            await asyncio.gather(
+                *(
+                    self.crawl_category(idx, href, title)
+                    for idx, (href, title) in enumerate(extracted)
+                )
+            )
+        except asyncio.CancelledError:
+            # Ctrl-C: drop queued requests, but let the running ones finish so
+            # the caller doesn't close the store and manifest underneath them.
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        else:
+            self._executor.shutdown(wait=True)
+        finally:
+            self.session.close()
+
+
+# -------------------------------------------------------------------
+def process_subdirectories_async(
+    base_url="",
+    extracted=None,
+    max_concurrency=16,
+    per_host_concurrency=4,
+    rate=4.0,
+    burst=8,
+    manifest=None,
+    listing_cache=None,
+    pipeline=None,
+    output=None,
+    min_rate=0.25,
+    adaptive=True,
+    retries=4,
+):
+    """
+    Async counterpart of process_subdirectories: same outputs, but categories,
+    years and cases are fetched concurrently within the given global/per-host
+    concurrency caps, paced and retried per host as described in AsyncCrawler.
+    """
+    log.info("==== BASE URL: %s", base_url)
+    log.info("==== Processing %d category links (async). ====", len(extracted))
+
+    async def _run():
+        crawler = AsyncCrawler(
+            base_url,
+            max_concurrency=max_concurrency,
+            per_host_concurrency=per_host_concurrency,
+            rate=rate,
+            burst=burst,
+            manifest=manifest,
+            listing_cache=listing_cache,
+            pipeline=pipeline,
+            output=output,
+            min_rate=min_rate,
+            adaptive=adaptive,
+            retries=retries,
+        )
+        start = time.perf_counter()
+        await crawler.run(extracted)
+        elapsed = time.perf_counter() - start
+        log.info(
+            "==== Downloaded %d RTF files in %.1fs ====",
+            crawler.cases_downloaded,
+            elapsed,
+        )
+        return crawler.cases_downloaded
+
+    return asyncio.run(_run())
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import queue
+import signal
+import threading
+from collections import namedtuple
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+from corpus_store import StoredCase
+from crawl_metrics import log, metrics
+from rtf_stream import convert_response, rtf_to_text
+
+# One downloaded case waiting for conversion and writing. `collection` is the
+# category title and `title` the case page title; `file_name` is where
+# CaseFileWriter puts it. `rtf_bytes` is the size of the RTF download, as
+# crawl_metrics.response_size measured it.
+CaseJob = namedtuple(
+    "CaseJob",
+    [
+        "category",
+        "case_id",
+        "rtf_url",
+        "file_name",
+        "title",
+        "collection",
+        "rtf_content",
+        "rtf_bytes",
+    ],
+    defaults=(0,),
+)
+
+_STOP = object()
+
+
+class PipelineAborted(Exception):
+    """
+    Raised by CasePipeline.submit once the pipeline is shutting down.
+    """
+
+
+def write_case_file(file_name, case_text, buffer_size=1024 * 1024):
+    """
+    Write a case file atomically: the text goes to a temporary file that is
+    renamed into place, so an interrupted write never leaves a truncated .txt
+    that a later run would mistake for a finished case.
+    """
+    _write_atomically(file_name, lambda f: f.write(case_text), buffer_size)
+
+
+def stream_case_file(file_name, rtf_response, buffer_size=1024 * 1024):
+    """
+    Convert an RTF response opened with stream=True straight into a case file,
+    chunk by chunk, with the same atomic rename as write_case_file. Neither the
+    RTF nor the text is ever held in memory whole.
+    """
+    try:
+        _write_atomically(
+            file_name, lambda f: convert_response(rtf_response, f), buffer_size
+        )
+    finally:
+        rtf_response.close()
+
+
+def _write_atomically(file_name, write, buffer_size):
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    tmp_name = f"{file_name}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(tmp_name, "w", encoding="utf-8", buffering=buffer_size) as f:
+            write(f)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _hash_file(file_name):
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+            size += len(block)
+    return StoredCase(file_name, size, digest.hexdigest())
+
+
+class CaseFileWriter:
+    """
+    The original output layout: one data/<category title>/<case title>.txt per
+    case. Same interface as corpus_store.CorpusWriter, so the crawlers and the
+    pipeline can write to either.
+    """
+
+    def find(self, category, case_id, file_name):
+        """
+        Return the StoredCase for a case file that already exists, or None.
+        """
+        if not os.path.exists(file_name):
+            return None
+        return _hash_file(file_name)
+
+    def save(self, job, case_text):
+        write_case_file(job.file_name, case_text)
+        data = case_text.encode("utf-8")
+        return StoredCase(job.file_name, len(data), hashlib.sha256(data).hexdigest())
+
+    def save_stream(self, job, rtf_response):
+        stream_case_file(job.file_name, rtf_response)
+        return _hash_file(job.file_name)
+
+    def close(self):
+        pass
+
+
+def _ignore_sigint():
+    # Ctrl-C is handled by the parent, which shuts the pool down itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class CasePipeline:
+    """
+    Fetch -> convert -> write, with bounded queues between the stages.
+
+    The crawler hands each downloaded RTF to `submit`, which blocks while the
+    convert queue is full (backpressure on fetching). Converter threads feed
+    rtf_to_text to a ProcessPoolExecutor so conversions use every core, and
+    writer threads hand the results to `output` (a CaseFileWriter or a
+    corpus_store.CorpusWriter) and update the manifest.
+
+    Use it as a context manager: a normal exit drains every queued case, while
+    KeyboardInterrupt aborts quickly; unfinished cases stay "in_progress" in the
+    manifest and are retried on the next run.
+    """
+
+    def __init__(
+        self,
+        manifest,
+        output=None,
+        convert_workers=None,
+        write_workers=2,
+        queue_size=64,
+    ):
+        self.manifest = manifest
+        self.output = output if output is not None else CaseFileWriter()
+        self.convert_workers = convert_workers or os.cpu_count() or 1
+        self.write_workers = write_workers
+        self.convert_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.cases_written = 0
+        self._count_lock = threading.Lock()
+        self._aborted = threading.Event()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.convert_workers, initializer=_ignore_sigint
+        )
+        self._converters = [
+            threading.Thread(target=self._convert_loop, daemon=True)
+            for _ in range(self.convert_workers)
+        ]
+        self._writers = [
+            threading.Thread(target=self._write_loop, daemon=True)
+            for _ in range(self.write_workers)
+        ]
+        for thread in self._converters + self._writers:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    # ---------------------------------------------------------------
+    def submit(self, job):
+        """
+        Queue a downloaded case, blocking while the convert stage is saturated.
+        """
+        while True:
+            if self._aborted.is_set():
+                raise PipelineAborted()
+            try:
+                self.convert_queue.put(job, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _next(self, q):
+        while not self._aborted.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _convert_loop(self):
+        while True:
+            job = self._next(self.convert_queue)
+            if job is _STOP:
+                return
+            try:
+                with metrics.span("convert", job.category):
+                    future = self._executor.submit(rtf_to_text, job.rtf_content)
+                    case_text = future.result()
+            except CancelledError:
+                return
+            except Exception as e:
+                log.warning("!!! Error converting RTF %s to text: %s", job.rtf_url, e)
+                self.manifest.mark_failed(job.category, job.case_id, e)
+                metrics.error(job.category, "convert")
+                metrics.case(job.category, "failed")
+                continue
+            self._put_for_writing((job, case_text))
+
+    def _put_for_writing(self, item):
+        while not self._aborted.is_set():
+            try:
+                self.write_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _write_loop(self):
+        while True:
+            item = self._next(self.write_queue)
+            if item is _STOP:
+                return
+            job, case_text = item
+            try:
+                with metrics.span("write", job.category):
+                    stored = self.output.save(job, case_text)
+                self.manifest.mark_stored(
+                    job.category, job.case_id, job.rtf_url, stored
+                )
+                with self._count_lock:
+                    self.cases_written += 1
+                metrics.case(job.category, "stored", job.rtf_bytes, stored.byte_size)
+                log.debug("✅ Written file: %s", stored.output_path)
+            except Exception as e:
+                log.warning("!!! Error writing file %s: %s", job.file_name, e)
+                self.manifest.mark_failed(job.category, job.case_id, e)
+                metrics.error(job.category, "write")
+                metrics.case(job.category, "failed")
+
+    # ---------------------------------------------------------------
+    def close(self):
+        """
+        Finish every queued case, then stop the workers.
+        """
+        for _ in self._converters:
+            self.convert_queue.put(_STOP)
+        for thread in self._converters:
+            thread.join()
+        for _ in self._writers:
+            self.write_queue.put(_STOP)
+        for thread in self._writers:
+            thread.join()
+        self._executor.shutdown(wait=True)
+
+    def abort(self):
+        """
+        Stop as soon as in-flight conversions and file writes have finished.
+        Queued cases are dropped; nothing half-written is left on disk.
+        """
+        log.warning("!!! Pipeline interrupted, finishing in-flight writes...")
+        self._aborted.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for thread in self._converters + self._writers:
+            thread.join()
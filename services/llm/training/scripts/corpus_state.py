@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+
+def get_default_state_path():
+    """
+    Return scripts/corpus/corpus_state.sqlite3, next to the vocabulary files
+    it keeps up to date.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "corpus", "corpus_state.sqlite3")
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pack_counts(counts):
+    # Pairs rather than an object, so the document's word order survives.
+    return zlib.compress(json.dumps(list(counts.items())).encode("utf-8"))
+
+
+def _unpack_counts(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class CorpusState:
+    """
+    What the last corpus run saw, for incremental reprocessing.
+
+    `documents` keeps each document's content hash and its own word counts;
+    `words` keeps the corpus-wide counts, with ids in order of first appearance.
+    A refresh only has to count new or modified documents: their old counts (if
+    any) are subtracted, the new ones added, and removed documents subtracted.
+    Words whose count falls to zero are dropped.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_default_state_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    key TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    file_size INTEGER,
+                    file_mtime REAL,
+                    num_tokens INTEGER NOT NULL,
+                    counts BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS words (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    word TEXT NOT NULL UNIQUE,
+                    count INTEGER NOT NULL
+                )
+                """
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def fingerprints(self):
+        """
+        Return {key: (sha256, file_size, file_mtime)} for every known document.
+        """
+        rows = self._conn.execute(
+            "SELECT key, sha256, file_size, file_mtime FROM documents"
+        )
+        return {key: (sha256, size, mtime) for key, sha256, size, mtime in rows}
+
+    def touch(self, key, file_size, file_mtime):
+        """
+        Record new file metadata for a document whose content is unchanged.
+        """
+        with self._conn:
+            self._conn.execute(
+                "UPDATE documents SET file_size = ?, file_mtime = ? WHERE key = ?",
+                (file_size, file_mtime, key),
+            )
+
+    def apply(self, updates, removed):
+        """
+        Merge one refresh in a single transaction. `updates` is a list of
+        (key, sha256, file_size, file_mtime, counts) for new or modified
+        documents, in corpus order; `removed` lists keys that disappeared.
+        """
+        delta = {}
+        with self._conn:
+            for key in removed:
+                self._subtract_document(key, delta)
+                self._conn.execute("DELETE FROM documents WHERE key = ?", (key,))
+            for key, sha256, file_size, file_mtime, counts in updates:
+                self._subtract_document(key, delta)
+                for word, count in counts.items():
+                    delta[word] = delta.get(word, 0) + count
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO documents (
+                        key, sha256, file_size, file_mtime,
+                        num_tokens, counts, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        key,
+                        sha256,
+                        file_size,
+                        file_mtime,
+                        sum(counts.values()),
+                        _pack_counts(counts),
+                        time.time(),
+                    ),
+                )
+            # delta preserves first-seen order, so new words get ids in the
+            # order they appear in the new documents.
+            for word, change in delta.items():
+                if change == 0:
+                    continue
+                self._conn.execute(
+                    """
+                    INSERT INTO words (word, count) VALUES (?, ?)
+                    ON CONFLICT (word) DO UPDATE SET count = count + excluded.count
+                    """,
+                    (word, change),
+                )
+            self._conn.execute("DELETE FROM words WHERE count <= 0")
+
+    def _subtract_document(self, key, delta):
+        row = self._conn.execute(
+            "SELECT counts FROM documents WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return
+        for word, count in _unpack_counts(row[0]):
+            delta[word] = delta.get(word, 0) - count
+
+    def word_counts(self):
+        """
+        Return [(word, count)] in vocabulary order.
+        """
+        return self._conn.execute(
+            "SELECT word, count FROM words ORDER BY id"
+        ).fetchall()
+
+    def close(self):
+        self._conn.close()
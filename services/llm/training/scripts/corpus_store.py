@@ -0,0 +1,483 @@
+import hashlib
+import io
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+
+# Where a case ended up: its manifest output_path plus the size and sha256 of
+# its UTF-8 text.
+StoredCase = namedtuple("StoredCase", ["output_path", "byte_size", "sha256"])
+
+# One row of the corpus index.
+CorpusDocument = namedtuple(
+    "CorpusDocument",
+    [
+        "category",
+        "case_id",
+        "year",
+        "title",
+        "collection",
+        "shard",
+        "offset",
+        "length",
+        "byte_size",
+        "sha256",
+    ],
+)
+
+_SELECT_DOCUMENTS = (
+    "SELECT category, case_id, year, title, collection, shard, offset,"
+    " length, byte_size, sha256 FROM documents"
+)
+
+SHARD_SIZE = 256 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+SHARD_NAME = "shard-{:05d}.bin"
+
+# SAFLII titles end in a neutral citation such as "[1995] ZACC 3", which gives
+# the same (category, case_id) pair the crawler derives from the case URL.
+CITATION_RE = re.compile(r"\[(\d{4})\]\s+([A-Za-z]+)\s+(\d+)\b")
+
+
+def get_default_store_path():
+    """
+    Return training/data/corpus_store, next to the scraped category folders.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    training_dir = os.path.dirname(script_dir)
+    return os.path.join(training_dir, "data", "corpus_store")
+
+
+def case_year(case_id):
+    """
+    "1995/3" -> 1995; case ids without a year segment give None.
+    """
+    year, sep, _ = case_id.partition("/")
+    return int(year) if sep and year.isdigit() else None
+
+
+def _connect_index(path):
+    conn = sqlite3.connect(
+        os.path.join(path, "index.sqlite3"), check_same_thread=False
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            category TEXT NOT NULL,
+            case_id TEXT NOT NULL,
+            year INTEGER,
+            title TEXT,
+            collection TEXT,
+            shard INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            byte_size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            stored_at REAL NOT NULL,
+            PRIMARY KEY (category, case_id)
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS documents_year ON documents (year)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS documents_position ON documents (shard, offset)"
+    )
+    return conn
+
+
+class _CompressingSink:
+    """
+    File-like target for the streaming RTF converter: text is compressed and
+    hashed as it arrives, so only the compressed bytes are kept.
+    """
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        self._hash = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self.byte_size = 0
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self.byte_size += len(data)
+        self._hash.update(data)
+        self._buffer.write(self._compressor.compress(data))
+
+    def finish(self):
+        self._buffer.write(self._compressor.flush())
+        return self._buffer.getvalue(), self.byte_size, self._hash.hexdigest()
+
+
+class CorpusWriter:
+    """
+    Append-only writer for the packed corpus store.
+
+    Every case is one zlib-compressed block appended to the current shard file
+    (shard-00000.bin, shard-00001.bin, ...; a new shard starts once the current
+    one passes `shard_size`). index.sqlite3 maps (category, case_id) to the
+    block's shard, offset and length, together with the year, title and
+    collection (the category title the crawler used as a folder name).
+
+    Blocks are written and fsynced before their index row is committed, so a
+    crash can at worst leave unreferenced bytes at the end of a shard. Storing
+    a case again appends a new block and repoints the index at it.
+    """
+
+    def __init__(self, path=None, shard_size=SHARD_SIZE):
+        self.path = path or get_default_store_path()
+        self.shard_size = shard_size
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = _connect_index(self.path)
+        self._shard = self._last_shard()
+        self._file = open(self._shard_path(self._shard), "ab")
+
+    def _shard_path(self, shard):
+        return os.path.join(self.path, SHARD_NAME.format(shard))
+
+    def _last_shard(self):
+        shard = 0
+        while os.path.exists(self._shard_path(shard + 1)):
+            shard += 1
+        return shard
+
+    # --- crawler output interface ---------------------------------------
+    def find(self, category, case_id, file_name=None):
+        """
+        Return the StoredCase for a case already in the store, or None.
+        """
+        document = self.document(category, case_id)
+        if document is None:
+            return None
+        return StoredCase(
+            self.location(category, case_id), document.byte_size, document.sha256
+        )
+
+    def save(self, job, case_text):
+        """
+        Store a converted case (a case_pipeline.CaseJob plus its text).
+        """
+        return self.add_text(
+            job.category,
+            job.case_id,
+            case_text,
+            title=job.title,
+            collection=job.collection,
+        )
+
+    def save_stream(self, job, rtf_response):
+        """
+        Convert an RTF response opened with stream=True straight into the store.
+        Only the compressed text is held in memory.
+        """
+        from rtf_stream import convert_response
+
+        sink = _CompressingSink()
+        try:
+            convert_response(rtf_response, sink)
+        finally:
+            rtf_response.close()
+        block, byte_size, sha256 = sink.finish()
+        return self.append(
+            job.category,
+            job.case_id,
+            block,
+            byte_size,
+            sha256,
+            title=job.title,
+            collection=job.collection,
+        )
+
+    # ---------------------------------------------------------------
+    def add_text(self, category, case_id, text, title=None, collection=None):
+        """
+        Compress and store one case's text. Returns a StoredCase.
+        """
+        data = text.encode("utf-8")
+        return self.append(
+            category,
+            case_id,
+            zlib.compress(data, COMPRESSION_LEVEL),
+            len(data),
+            hashlib.sha256(data).hexdigest(),
+            title=title,
+            collection=collection,
+        )
+
+    def append(
+        self, category, case_id, block, byte_size, sha256, title=None, collection=None
+    ):
+        """
+        Append one already-compressed block and index it. Returns a StoredCase.
+        """
+        with self._lock:
+            if self._file.tell() and self._file.tell() + len(block) > self.shard_size:
+                self._file.close()
+                self._shard += 1
+                self._file = open(self._shard_path(self._shard), "ab")
+            offset = self._file.tell()
+            self._file.write(block)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            with self._conn:
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO documents (
+                        category, case_id, year, title, collection,
+                        shard, offset, length, byte_size, sha256, stored_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        category,
+                        case_id,
+                        case_year(case_id),
+                        title,
+                        collection,
+                        self._shard,
+                        offset,
+                        len(block),
+                        byte_size,
+                        sha256,
+                        time.time(),
+                    ),
+                )
+        return StoredCase(self.location(category, case_id), byte_size, sha256)
+
+    def document(self, category, case_id):
+        with self._lock:
+            row = self._conn.execute(
+                _SELECT_DOCUMENTS + " WHERE category = ? AND case_id = ?",
+                (category, case_id),
+            ).fetchone()
+        return CorpusDocument(*row) if row else None
+
+    def location(self, category, case_id):
+        """
+        The output_path recorded in the crawl manifest for a stored case.
+        """
+        return f"{self.path}#{category}/{case_id}"
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._conn.close()
+
+
+class CorpusReader:
+    """
+    Random and sequential access to a corpus store. Shards are memory-mapped,
+    so reading a case touches only its own compressed block.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_default_store_path()
+        if not os.path.exists(os.path.join(self.path, "index.sqlite3")):
+            raise FileNotFoundError(f"No corpus store at {self.path}")
+        self._conn = _connect_index(self.path)
+        self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _map(self, shard, end):
+        mapped = self._maps.get(shard)
+        if mapped is None or len(mapped[1]) < end:
+            # First use, or the shard grew since it was mapped.
+            if mapped is not None:
+                mapped[1].close()
+                mapped[0].close()
+            f = open(os.path.join(self.path, SHARD_NAME.format(shard)), "rb")
+            mapped = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self._maps[shard] = mapped
+        return mapped[1]
+
+    def read(self, document):
+        """
+        Return the text of a CorpusDocument.
+        """
+        end = document.offset + document.length
+        block = self._map(document.shard, end)[document.offset : end]
+        return zlib.decompress(block).decode("utf-8")
+
+    def document(self, category, case_id):
+        row = self._conn.execute(
+            _SELECT_DOCUMENTS + " WHERE category = ? AND case_id = ?",
+            (category, case_id),
+        ).fetchone()
+        return CorpusDocument(*row) if row else None
+
+    def get(self, category, case_id):
+        """
+        Return the text of one case, or None if it is not in the store.
+        """
+        document = self.document(category, case_id)
+        return self.read(document) if document is not None else None
+
+    def find_title(self, title):
+        """
+        Return the first document whose title matches exactly, or None.
+        """
+        row = self._conn.execute(
+            _SELECT_DOCUMENTS + " WHERE title = ? LIMIT 1",
+            (title,),
+        ).fetchone()
+        return CorpusDocument(*row) if row else None
+
+    def documents(self, category=None, year=None, collection=None, stored_after=None):
+        """
+        Index rows matching the filters (`stored_after` is a timestamp), in
+        on-disk order so that reading them one after another scans each shard
+        front to back.
+        """
+        where = []
+        params = []
+        for column, value in (
+            ("category", category),
+            ("year", year),
+            ("collection", collection),
+        ):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if stored_after is not None:
+            where.append("stored_at > ?")
+            params.append(stored_after)
+        sql = _SELECT_DOCUMENTS
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY shard, offset"
+        return [CorpusDocument(*row) for row in self._conn.execute(sql, params)]
+
+    def iter_texts(self, category=None, year=None, collection=None):
+        """
+        Yield (CorpusDocument, text) for every matching case.
+        """
+        for document in self.documents(category, year, collection):
+            yield document, self.read(document)
+
+    def close(self):
+        for f, mapped in self._maps.values():
+            mapped.close()
+            f.close()
+        self._maps = {}
+        self._conn.close()
+
+
+# -------------------------------------------------------------------
+def loose_file_case(collection, file_name, manifest_keys=None):
+    """
+    Work out (category, case_id) for a loose data/<collection>/<title>.txt
+    file: from the crawl manifest when it recorded the file, else from the
+    neutral citation in the title, else (collection, title) as a last resort.
+    """
+    title = os.path.splitext(file_name)[0]
+    if manifest_keys and file_name in manifest_keys:
+        return manifest_keys[file_name]
+    match = CITATION_RE.search(title)
+    if match:
+        year, code, number = match.groups()
+        return code, f"{year}/{number}"
+    return collection, title
+
+
+def _manifest_keys(manifest_path):
+    """
+    Map output file names recorded in the crawl manifest to their keys.
+    """
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    conn = sqlite3.connect(manifest_path)
+    try:
+        rows = conn.execute(
+            "SELECT category, case_id, output_path FROM cases"
+            " WHERE output_path IS NOT NULL"
+        ).fetchall()
+    finally:
+        conn.close()
+    keys = {}
+    for category, case_id, output_path in rows:
+        if "#" not in output_path:
+            keys[os.path.basename(output_path)] = (category, case_id)
+    return keys
+
+
+def convert_data_folders(data_dir, store_path=None, manifest_path=None):
+    """
+    Pack every data/<category title>/<case title>.txt into the corpus store.
+    Files already stored with the same content are skipped, so the conversion
+    can be rerun after a partial run. The loose files are left in place.
+    """
+    from crawl_manifest import get_default_manifest_path
+
+    if manifest_path is None:
+        manifest_path = get_default_manifest_path()
+    manifest_keys = _manifest_keys(manifest_path)
+    writer = CorpusWriter(store_path)
+    added = skipped = 0
+    try:
+        for collection in sorted(os.listdir(data_dir)):
+            folder = os.path.join(data_dir, collection)
+            if not os.path.isdir(folder):
+                continue
+            for file_name in sorted(os.listdir(folder)):
+                if not file_name.endswith(".txt"):
+                    continue
+                with open(os.path.join(folder, file_name), "r", encoding="utf-8") as f:
+                    text = f.read()
+                category, case_id = loose_file_case(
+                    collection, file_name, manifest_keys
+                )
+                existing = writer.document(category, case_id)
+                digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                if existing is not None and existing.sha256 == digest:
+                    skipped += 1
+                    continue
+                writer.add_text(
+                    category,
+                    case_id,
+                    text,
+                    title=os.path.splitext(file_name)[0],
+                    collection=collection,
+                )
+                added += 1
+    finally:
+        writer.close()
+    print(
+        f"==== Packed {added} case files into {writer.path} "
+        f"({skipped} unchanged) ===="
+    )
+    return added
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Pack loose data/<category>/<case>.txt files into the corpus store."
+    )
+    parser.add_argument(
+        "data_dir",
+        nargs="?",
+        default=os.path.dirname(get_default_store_path()),
+        help="Folder holding the category folders (default: training/data).",
+    )
+    parser.add_argument("--store", default=None, help="Corpus store directory.")
+    parser.add_argument(
+        "--manifest", default=None, help="Crawl manifest used to look up case ids."
+    )
+    args = parser.parse_args()
+    convert_data_folders(args.data_dir, args.store, args.manifest)
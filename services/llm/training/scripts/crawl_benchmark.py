@@ -0,0 +1,395 @@
+"""
+Offline benchmark suite for the scraping pipeline: link extraction, RTF
+conversion and whole crawls (process_subdirectories, the async crawler and the
+pipeline) against a local replay_server.ReplayServer. Each benchmark runs in a
+fresh process and reports throughput, CPU time and peak RSS. Results can be
+saved as JSON and compared with an earlier run to catch regressions.
+
+    python crawl_benchmark.py                          (synthetic fixtures)
+    python crawl_benchmark.py --fixtures DIR --latency 0.05 --json now.json
+    python crawl_benchmark.py --baseline before.json   (exit 1 on regression)
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from replay_server import ReplayServer, read_categories, synthesize_fixtures
+
+
+BENCHMARKS = (
+    "extract",
+    "convert",
+    "convert_stream",
+    "sequential",
+    "async",
+    "pipeline",
+)
+
+
+def _usage():
+    import resource
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+    return cpu, max(usage.ru_maxrss, children.ru_maxrss)
+
+
+def _read_fixtures(fixture_dir, extension, mode):
+    paths = sorted(
+        glob.glob(os.path.join(fixture_dir, "**", f"*{extension}"), recursive=True)
+    )
+    contents = []
+    for path in paths:
+        if mode == "text":
+            with open(path, "r", encoding="cp1252", errors="replace") as f:
+                contents.append(f.read())
+        else:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+    return contents
+
+
+# -------------------------------------------------------------------
+def _bench_extract(fixture_dir, options):
+    from link_extractor import extract_page
+
+    pages = [
+        html.decode("utf-8", errors="replace")
+        for html in _read_fixtures(fixture_dir, ".html", "bytes")
+    ]
+    size = sum(len(page) for page in pages)
+    start = time.perf_counter()
+    for _ in range(options["extract_repeat"]):
+        for page in pages:
+            links = extract_page(page)
+            _ = links.year_links, links.month_links, links.rtf_link
+    seconds = time.perf_counter() - start
+    count = len(pages) * options["extract_repeat"]
+    return count, "pages", size * options["extract_repeat"], seconds, {}
+
+
+def _bench_convert(fixture_dir, options):
+    from rtf_stream import rtf_to_text
+
+    documents = _read_fixtures(fixture_dir, ".rtf", "text")
+    start = time.perf_counter()
+    for document in documents:
+        rtf_to_text(document, errors="replace")
+    seconds = time.perf_counter() - start
+    size = sum(len(document) for document in documents)
+    return len(documents), "files", size, seconds, {}
+
+
+def _bench_convert_stream(fixture_dir, options):
+    from rtf_stream import convert_chunks
+
+    class NullSink:
+        def write(self, text):
+            pass
+
+    documents = _read_fixtures(fixture_dir, ".rtf", "bytes")
+    chunk_size = 64 * 1024
+    start = time.perf_counter()
+    for data in documents:
+        chunks = (data[i : i + chunk_size] for i in range(0, len(data), chunk_size))
+        convert_chunks(chunks, NullSink(), errors="replace")
+    seconds = time.perf_counter() - start
+    size = sum(len(data) for data in documents)
+    return len(documents), "files", size, seconds, {}
+
+
+def _bench_crawl(fixture_dir, options, mode):
+    import logging
+
+    from case_pipeline import CasePipeline
+    from corpus_store import CorpusWriter
+    from crawl_manifest import CrawlManifest
+    from crawl_metrics import metrics
+    from http_cache import ListingCache
+    from pacing import HostPacers
+
+    # Injected faults would otherwise print a warning each.
+    logging.getLogger("crawler").setLevel(logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix="crawl_benchmark_")
+    try:
+        manifest = CrawlManifest(os.path.join(work_dir, "manifest.sqlite3"))
+        output = CorpusWriter(os.path.join(work_dir, "store"))
+        listing_cache = ListingCache(os.path.join(work_dir, "http_cache"))
+        pipeline = None
+        if mode == "pipeline":
+            pipeline = CasePipeline(
+                manifest, output=output, convert_workers=options["convert_workers"]
+            )
+        categories = read_categories(fixture_dir)
+        metrics.reset()
+        start = time.perf_counter()
+        if mode == "sequential":
+            from preprocess_data import process_subdirectories
+
+            process_subdirectories(
+                options["base_url"],
+                categories,
+                manifest=manifest,
+                listing_cache=listing_cache,
+                output=output,
+                pacers=HostPacers(
+                    max_rate=options["rate"], adaptive=options["adaptive"]
+                ),
+            )
+        else:
+            from async_crawler import process_subdirectories_async
+
+            process_subdirectories_async(
+                options["base_url"],
+                categories,
+                max_concurrency=options["concurrency"],
+                per_host_concurrency=options["concurrency"],
+                rate=options["rate"],
+                burst=options["concurrency"],
+                manifest=manifest,
+                listing_cache=listing_cache,
+                pipeline=pipeline,
+                output=output,
+                adaptive=options["adaptive"],
+            )
+        if pipeline is not None:
+            pipeline.close()
+        seconds = time.perf_counter() - start
+        output.close()
+        manifest.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = metrics.to_json()
+    stored = sum(c["count"] for c in report["cases"] if c["outcome"] == "stored")
+    stages = {
+        stage: round(s["p50_seconds"] * 1000, 2)
+        for stage, s in report["stages"].items()
+        if s["count"]
+    }
+    extra = {
+        "stage_p50_ms": stages,
+        "errors": sum(e["count"] for e in report["errors"]),
+        "retries": sum(r["count"] for r in report["retries"]),
+        "failed": sum(c["count"] for c in report["cases"] if c["outcome"] == "failed"),
+    }
+    return stored, "cases", report["rtf_bytes"], seconds, extra
+
+
+def _run(name, fixture_dir, options):
+    # Runs in a fresh process, so peak RSS and CPU time are this benchmark's.
+    benchmark = {
+        "extract": _bench_extract,
+        "convert": _bench_convert,
+        "convert_stream": _bench_convert_stream,
+    }.get(name)
+    cpu_before, _ = _usage()
+    if benchmark is not None:
+        count, unit, size, seconds, extra = benchmark(fixture_dir, options)
+    else:
+        count, unit, size, seconds, extra = _bench_crawl(fixture_dir, options, name)
+    cpu_after, peak_kb = _usage()
+    return dict(
+        count=count,
+        unit=unit,
+        seconds=seconds,
+        rate=count / seconds if seconds else 0.0,
+        mb_per_second=size / 1e6 / seconds if seconds else 0.0,
+        cpu_seconds=cpu_after - cpu_before,
+        peak_rss_mb=peak_kb / 1024,
+        **extra,
+    )
+
+
+# -------------------------------------------------------------------
+def run_benchmarks(
+    fixture_dir,
+    names=BENCHMARKS,
+    repeat=1,
+    latency=0.0,
+    jitter=0.0,
+    error_rate=0.0,
+    concurrency=16,
+    rate=1000.0,
+    adaptive=True,
+    convert_workers=None,
+    extract_repeat=5,
+):
+    """
+    Run each named benchmark `repeat` times in a fresh process and keep the
+    fastest run. The crawl benchmarks share one ReplayServer with the given
+    latency and error rate. Returns {name: result dict}.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    with ReplayServer(
+        fixture_dir, latency=latency, jitter=jitter, error_rate=error_rate
+    ) as server:
+        options = dict(
+            base_url=server.url,
+            concurrency=concurrency,
+            rate=rate,
+            adaptive=adaptive,
+            convert_workers=convert_workers,
+            extract_repeat=extract_repeat,
+        )
+        for name in names:
+            runs = []
+            for _ in range(repeat):
+                # A ProcessPoolExecutor worker (unlike a Pool worker) may start
+                # the pipeline's own conversion processes.
+                with ProcessPoolExecutor(1, mp_context=ctx) as executor:
+                    future = executor.submit(_run, name, fixture_dir, options)
+                    runs.append(future.result())
+            results[name] = max(runs, key=lambda r: r["rate"])
+            print(format_result(name, results[name]), flush=True)
+    return results
+
+
+def format_result(name, result):
+    line = (
+        f"{name:<15} {result['rate']:9.1f} {result['unit']}/s "
+        f"{result['mb_per_second']:8.2f} MB/s "
+        f"cpu {result['cpu_seconds']:7.2f}s "
+        f"wall {result['seconds']:7.2f}s "
+        f"peak RSS {result['peak_rss_mb']:7.1f} MB"
+    )
+    if "stage_p50_ms" in result:
+        stages = ", ".join(f"{k} {v}" for k, v in result["stage_p50_ms"].items())
+        line += (
+            f"  [p50 ms: {stages}; {result['retries']} retries, "
+            f"{result['failed']} failed]"
+        )
+    return line
+
+
+def compare(results, baseline, tolerance=0.15):
+    """
+    Return one message per regression against a baseline results dict: a
+    throughput drop, or a CPU time per unit or peak RSS rise, of more than
+    `tolerance` (a fraction).
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["rate"] < before["rate"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['rate']:.1f} {result['unit']}/s, "
+                f"was {before['rate']:.1f}"
+            )
+        if result["count"] and before["count"]:
+            cpu = result["cpu_seconds"] / result["count"]
+            cpu_before = before["cpu_seconds"] / before["count"]
+            if cpu > cpu_before * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {cpu * 1000:.2f} ms CPU per {result['unit'][:-1]}, "
+                    f"was {cpu_before * 1000:.2f}"
+                )
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak RSS {result['peak_rss_mb']:.1f} MB, "
+                f"was {before['peak_rss_mb']:.1f}"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scraping pipeline offline against replayed pages."
+    )
+    parser.add_argument(
+        "--fixtures",
+        default=None,
+        help="Recorded fixture directory (default: synthesize one in a temp dir).",
+    )
+    parser.add_argument(
+        "--only",
+        default=",".join(BENCHMARKS),
+        help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}.",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Keep the best of N.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Async crawler request slots."
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1000.0,
+        help="Requests per second per host (high: measure the crawler).",
+    )
+    parser.add_argument(
+        "--fixed-rate",
+        action="store_true",
+        help="Pace at --rate without adapting to errors.",
+    )
+    parser.add_argument("--convert-workers", type=int, default=None)
+    parser.add_argument(
+        "--categories", type=int, default=2, help="Synthetic fixture size."
+    )
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--cases-per-year", type=int, default=25)
+    parser.add_argument("--rtf-kb", type=int, default=40)
+    parser.add_argument("--json", default=None, help="Save the results here.")
+    parser.add_argument(
+        "--baseline", default=None, help="Results JSON of an earlier run."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Allowed fractional slowdown before a result counts as a regression.",
+    )
+    args = parser.parse_args()
+
+    temp_dir = None
+    fixture_dir = args.fixtures
+    if fixture_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="replay_fixtures_")
+        fixture_dir = synthesize_fixtures(
+            temp_dir,
+            args.categories,
+            args.years,
+            args.cases_per_year,
+            args.rtf_kb * 1024,
+        )
+    try:
+        results = run_benchmarks(
+            fixture_dir,
+            [name for name in args.only.split(",") if name],
+            repeat=args.repeat,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            adaptive=not args.fixed_rate,
+            convert_workers=args.convert_workers,
+        )
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,147 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+# Case states recorded in the manifest. DONE and NO_RTF are final; anything
+# else (including IN_PROGRESS rows left behind by a crash) is retried.
+IN_PROGRESS = "in_progress"
+DONE = "done"
+NO_RTF = "no_rtf"
+FAILED = "failed"
+FINAL_STATES = (DONE, NO_RTF)
+
+
+def get_default_manifest_path():
+    """
+    Return training/data/crawl_manifest.sqlite3, next to the scraped category folders.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    training_dir = os.path.dirname(script_dir)
+    return os.path.join(training_dir, "data", "crawl_manifest.sqlite3")
+
+
+def category_code(href):
+    """
+    Turn a category href such as "/za/cases/ZACC" or "/za/gaz/ZAKZPrGaz/" into
+    its SAFLII code ("ZACC", "ZAKZPrGaz").
+    """
+    return href.rstrip("/").rsplit("/", 1)[-1]
+
+
+def case_key(case_url):
+    """
+    Build the manifest case_id from a case page URL. SAFLII restarts case numbers
+    every year, so ".../ZACC/1995/3.html" becomes "1995/3"; URLs without a year
+    segment fall back to the bare number.
+    """
+    match = re.search(r"(?:(\d{4})/)?(\d+)\.html$", case_url)
+    if match is None:
+        raise ValueError(f"No case number in URL: {case_url}")
+    year, number = match.groups()
+    return f"{year}/{number}" if year else number
+
+
+class CrawlManifest:
+    """
+    On-disk record of every case the crawler has touched, keyed by
+    (category code, case_id). Lets resumed runs skip finished cases before any
+    network I/O and retry the ones that failed or were cut off mid-way.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_default_manifest_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # One connection shared by the crawler threads, serialised by a lock.
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cases (
+                    category TEXT NOT NULL,
+                    case_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    case_url TEXT,
+                    rtf_url TEXT,
+                    output_path TEXT,
+                    byte_size INTEGER,
+                    sha256 TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (category, case_id)
+                )
+                """
+            )
+
+    def status(self, category, case_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM cases WHERE category = ? AND case_id = ?",
+                (category, case_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def is_complete(self, category, case_id):
+        return self.status(category, case_id) in FINAL_STATES
+
+    def mark_started(self, category, case_id, case_url):
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO cases (category, case_id, status, case_url, attempts, updated_at)
+                VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT (category, case_id) DO UPDATE SET
+                    status = excluded.status,
+                    case_url = excluded.case_url,
+                    attempts = cases.attempts + 1,
+                    updated_at = excluded.updated_at
+                """,
+                (category, case_id, IN_PROGRESS, case_url, time.time()),
+            )
+
+    def mark_stored(self, category, case_id, rtf_url, stored):
+        """
+        Record a case saved by a case writer, given the StoredCase it returned.
+        """
+        self._update(
+            category,
+            case_id,
+            status=DONE,
+            rtf_url=rtf_url,
+            output_path=stored.output_path,
+            byte_size=stored.byte_size,
+            sha256=stored.sha256,
+            error=None,
+        )
+
+    def mark_no_rtf(self, category, case_id):
+        self._update(category, case_id, status=NO_RTF, error=None)
+
+    def mark_failed(self, category, case_id, error):
+        self._update(category, case_id, status=FAILED, error=str(error))
+
+    def _update(self, category, case_id, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE cases SET {columns} WHERE category = ? AND case_id = ?",
+                (*fields.values(), category, case_id),
+            )
+            if cursor.rowcount == 0:
+                fields.update(category=category, case_id=case_id)
+                names = ", ".join(fields)
+                marks = ", ".join("?" for _ in fields)
+                self._conn.execute(
+                    f"INSERT INTO cases ({names}) VALUES ({marks})",
+                    tuple(fields.values()),
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
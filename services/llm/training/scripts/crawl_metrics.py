@@ -0,0 +1,379 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+log = logging.getLogger("crawler")
+summary_log = logging.getLogger("crawler.summary")
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    float("inf"),
+)
+
+# What each stage histogram measures.
+STAGES = {
+    "wait": "waiting for the host's pacer (and a concurrency slot in async mode)",
+    "fetch": "HTTP request until the response headers (and body, unless streamed)",
+    "parse": "HTML link extraction of a listing or case page",
+    "convert": "RTF to text conversion (pipeline mode)",
+    "write": "storing the converted text (pipeline mode)",
+    "stream": "downloading, converting and storing an RTF in one pass "
+    "(streaming mode, without the pipeline)",
+}
+
+
+def configure_logging(verbosity=1):
+    """
+    Set up console logging for the crawler:
+
+        0  warnings and errors only
+        1  + the periodic metrics summary (default)
+        2  + category and year progress
+        3  + one line per case (the old print output)
+
+    Messages below the chosen level are dropped before they are formatted, so
+    the per-case hot path costs next to nothing at the default level.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%H:%M:%S"))
+    log.handlers[:] = [handler]
+    log.propagate = False
+    log.setLevel(
+        {0: logging.WARNING, 1: logging.WARNING, 2: logging.INFO}.get(
+            verbosity, logging.DEBUG
+        )
+    )
+    summary_log.setLevel(logging.INFO if verbosity >= 1 else logging.WARNING)
+
+
+# -------------------------------------------------------------------
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside its bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                if upper == float("inf"):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+
+class CrawlMetrics:
+    """
+    Thread-safe counters and latency histograms for one crawl.
+
+    - stage latency histograms: wait, fetch, parse, convert, write, stream
+      (see STAGES)
+    - http_responses per (category, status code)
+    - errors per (category, stage); stage "case" counts unexpected failures
+      while handling a case page
+    - retries per category: requests RetryPolicy sent again after a
+      connection error or a retryable status
+    - cases per (category, outcome): stored, skipped, no_rtf, failed
+    - rtf_bytes and text_bytes downloaded and written
+
+    `summary()` gives a one-line progress report with cases and bytes per
+    second; `to_json()` and `to_prometheus()` give machine-readable dumps.
+    After `start_trace(path)`, every timed span is also written as a Chrome trace
+    event (open the file in chrome://tracing or ui.perfetto.dev).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+        self._trace = None
+        self._trace_events = []
+
+    def start_trace(self, path):
+        self.close()
+        self._trace = open(path, "w", encoding="utf-8")
+        # The trace viewers accept an array without its closing bracket.
+        self._trace.write("[\n")
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._clock = time.perf_counter()
+            self.histograms = {stage: Histogram() for stage in STAGES}
+            self.http_responses = {}
+            self.errors = {}
+            self.retries = {}
+            self.cases = {}
+            self.rtf_bytes = 0
+            self.text_bytes = 0
+
+    # ---------------------------------------------------------------
+    def observe(self, stage, seconds, category=None, start=None):
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+            if self._trace is not None:
+                self._trace_events.append(
+                    {
+                        "name": stage,
+                        "cat": category or "",
+                        "ph": "X",
+                        "ts": round((start - self._clock) * 1e6),
+                        "dur": round(seconds * 1e6),
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                    }
+                )
+
+    @contextmanager
+    def span(self, stage, category=None):
+        """
+        Time the body of a `with` block into the stage's histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, category, start)
+
+    def response(self, category, status):
+        self._add(self.http_responses, (category, status))
+
+    def error(self, category, stage):
+        self._add(self.errors, (category, stage))
+
+    def retry(self, category):
+        self._add(self.retries, category)
+
+    def case(self, category, outcome, rtf_bytes=0, text_bytes=0):
+        with self._lock:
+            key = (category, outcome)
+            self.cases[key] = self.cases.get(key, 0) + 1
+            self.rtf_bytes += rtf_bytes or 0
+            self.text_bytes += text_bytes or 0
+
+    def _add(self, counter, key):
+        with self._lock:
+            counter[key] = counter.get(key, 0) + 1
+
+    # ---------------------------------------------------------------
+    def summary(self):
+        """
+        One line: cases stored and their rate, cases skipped, without an RTF
+        and failed, bytes and their rate, median and 95th percentile latency
+        of every stage seen so far, errors and retries.
+        """
+        with self._lock:
+            elapsed = max(time.perf_counter() - self._clock, 1e-9)
+            outcomes = {}
+            for (_, outcome), n in self.cases.items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + n
+            stored = outcomes.get("stored", 0)
+            parts = [
+                f"{stored} cases ({stored / elapsed:.2f}/s), "
+                f"{outcomes.get('skipped', 0)} skipped, "
+                f"{outcomes.get('no_rtf', 0)} no_rtf, "
+                f"{outcomes.get('failed', 0)} failed",
+                f"rtf {self.rtf_bytes / 1e6:.1f} MB "
+                f"({self.rtf_bytes / 1e6 / elapsed:.2f} MB/s)",
+            ]
+            for stage, histogram in self.histograms.items():
+                if histogram.count:
+                    parts.append(
+                        f"{stage} p50 {histogram.quantile(0.5) * 1000:.0f}ms "
+                        f"p95 {histogram.quantile(0.95) * 1000:.0f}ms"
+                    )
+            parts.append(f"{sum(self.errors.values())} errors")
+            parts.append(f"{sum(self.retries.values())} retries")
+        return " | ".join(parts)
+
+    def to_json(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self._clock
+            return {
+                "started": self.started,
+                "elapsed_seconds": elapsed,
+                "rtf_bytes": self.rtf_bytes,
+                "text_bytes": self.text_bytes,
+                "stages": {
+                    stage: {
+                        "count": h.count,
+                        "sum_seconds": h.sum,
+                        "p50_seconds": h.quantile(0.5),
+                        "p95_seconds": h.quantile(0.95),
+                        "buckets": {
+                            str(upper): count
+                            for upper, count in zip(h.buckets, h.counts)
+                        },
+                    }
+                    for stage, h in self.histograms.items()
+                },
+                "http_responses": [
+                    {"category": c, "status": s, "count": n}
+                    for (c, s), n in sorted(self.http_responses.items())
+                ],
+                "errors": [
+                    {"category": c, "stage": s, "count": n}
+                    for (c, s), n in sorted(self.errors.items())
+                ],
+                "retries": [
+                    {"category": c, "count": n}
+                    for c, n in sorted(self.retries.items())
+                ],
+                "cases": [
+                    {"category": c, "outcome": o, "count": n}
+                    for (c, o), n in sorted(self.cases.items())
+                ],
+            }
+
+    def to_prometheus(self):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            lines = ["# TYPE crawler_stage_seconds histogram"]
+            for stage, h in self.histograms.items():
+                cumulative = 0
+                for upper, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    le = "+Inf" if upper == float("inf") else repr(upper)
+                    lines.append(
+                        f'crawler_stage_seconds_bucket{{stage="{stage}",le="{le}"}} '
+                        f"{cumulative}"
+                    )
+                lines.append(f'crawler_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(
+                    f'crawler_stage_seconds_count{{stage="{stage}"}} {h.count}'
+                )
+            for name, counter, labels in (
+                ("crawler_http_responses_total", self.http_responses, "status"),
+                ("crawler_errors_total", self.errors, "stage"),
+                ("crawler_cases_total", self.cases, "outcome"),
+            ):
+                lines.append(f"# TYPE {name} counter")
+                for (category, value), count in sorted(counter.items()):
+                    lines.append(
+                        f'{name}{{category="{category}",{labels}="{value}"}} {count}'
+                    )
+            lines.append("# TYPE crawler_retries_total counter")
+            for category, count in sorted(self.retries.items()):
+                lines.append(f'crawler_retries_total{{category="{category}"}} {count}')
+            lines.append("# TYPE crawler_bytes_total counter")
+            lines.append(f'crawler_bytes_total{{kind="rtf"}} {self.rtf_bytes}')
+            lines.append(f'crawler_bytes_total{{kind="text"}} {self.text_bytes}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Write the metrics to `path`: JSON for a .json file, Prometheus text
+        otherwise. The file is replaced atomically, so a scraper (or the
+        node_exporter textfile collector) never reads half a dump.
+        """
+        if path.endswith(".json"):
+            text = json.dumps(self.to_json(), indent=2)
+        else:
+            text = self.to_prometheus()
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".part", path)
+
+    def flush_trace(self):
+        with self._lock:
+            events, self._trace_events = self._trace_events, []
+        if self._trace is not None and events:
+            self._trace.write("".join(json.dumps(e) + ",\n" for e in events))
+            self._trace.flush()
+
+    def close(self):
+        self.flush_trace()
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+
+def response_size(response):
+    """
+    Bytes read from the network for a `requests` response, streamed or not
+    (compressed size if the server used Content-Encoding). 0 if unknown.
+    """
+    try:
+        return response.raw.tell()
+    except (AttributeError, TypeError, ValueError):
+        return len(response.content) if response._content_consumed else 0
+
+
+# The metrics of the running crawl; the crawlers and the pipeline record into
+# it.
+metrics = CrawlMetrics()
+
+
+class MetricsReporter:
+    """
+    Background thread that logs metrics.summary() every `interval` seconds,
+    refreshes `metrics_path` (if given) and flushes the trace. A last report
+    is made on stop().
+    """
+
+    def __init__(self, interval=30.0, metrics_path=None):
+        self.interval = interval
+        self.metrics_path = metrics_path
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _loop(self):
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def report(self):
+        summary_log.info("[metrics] %s", metrics.summary())
+        metrics.flush_trace()
+        if self.metrics_path:
+            metrics.dump(self.metrics_path)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.report()
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# `headers` are those of the network response (None when served from disk), so
+# callers can read Retry-After off a refused request.
+CachedResponse = namedtuple(
+    "CachedResponse",
+    ["status_code", "text", "from_cache", "headers"],
+    defaults=(None,),
+)
+
+
+def create_session(headers=None, pool_size=16):
+    """
+    Return a requests.Session whose keep-alive connection pool is large enough
+    for `pool_size` concurrent requests per host.
+    """
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_default_cache_dir():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    training_dir = os.path.dirname(script_dir)
+    return os.path.join(training_dir, "data", "http_cache")
+
+
+class ListingCache:
+    """
+    On-disk HTTP cache for category and year listing pages.
+
+    Entries younger than `ttl` seconds are served without touching the network.
+    Older entries are revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged page costs a 304 instead of a full download. When the cache grows
+    past `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=None, ttl=6 * 3600, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # key -> {"meta": {...}, "size": int, "used_at": float}
+        self._entries = {}
+        self._total_bytes = 0
+        self._load_index()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".body", base + ".json"
+
+    def _load_index(self):
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[: -len(".json")]
+            body_path, meta_path = self._paths(key)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                stat = os.stat(body_path)
+            except (OSError, ValueError):
+                continue
+            self._entries[key] = {
+                "meta": meta,
+                "size": stat.st_size,
+                "used_at": stat.st_mtime,
+            }
+            self._total_bytes += stat.st_size
+
+    def get(self, session, url, **kwargs):
+        """
+        Fetch `url` through the cache. Returns a CachedResponse; non-200 answers
+        are passed through and never stored.
+        """
+        cached = self.fresh(url)
+        if cached is not None:
+            return cached
+        return self.fetch(session, url, **kwargs)
+
+    def fresh(self, url):
+        """
+        Return the cached page for `url` if it is younger than `ttl`, else None.
+        Never touches the network.
+        """
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            stored_at = entry["meta"]["stored_at"] if entry else None
+        if stored_at is not None and time.time() - stored_at < self.ttl:
+            text = self._read_body(key)
+            if text is not None:
+                return CachedResponse(200, text, True)
+        return None
+
+    def fetch(self, session, url, **kwargs):
+        """
+        Request `url` from the network, revalidating a cached copy if there is
+        one, and update the cache.
+        """
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            meta = dict(entry["meta"]) if entry else None
+
+        conditional = {}
+        if meta:
+            if meta.get("etag"):
+                conditional["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                conditional["If-Modified-Since"] = meta["last_modified"]
+
+        response = session.get(url, headers=conditional, **kwargs)
+
+        if response.status_code == 304 and meta:
+            text = self._read_body(key)
+            if text is not None:
+                meta["stored_at"] = time.time()
+                with self._lock:
+                    # Unless another thread replaced or evicted it meanwhile.
+                    if self._entries.get(key) is entry:
+                        entry["meta"] = meta
+                self._write_meta(key, meta)
+                return CachedResponse(200, text, True)
+            # Body vanished underneath us: fetch it again unconditionally.
+            response = session.get(url, **kwargs)
+
+        if response.status_code == 200:
+            self._store(key, url, response)
+        return CachedResponse(
+            response.status_code, response.text, False, response.headers
+        )
+
+    def _read_body(self, key):
+        body_path, _ = self._paths(key)
+        try:
+            with open(body_path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(body_path)
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]["used_at"] = time.time()
+        return text
+
+    def _write_meta(self, key, meta):
+        _, meta_path = self._paths(key)
+        tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _store(self, key, url, response):
+        body = response.text.encode("utf-8")
+        if len(body) > self.max_bytes:
+            return
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+        }
+        body_path, _ = self._paths(key)
+        tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, body_path)
+        self._write_meta(key, meta)
+
+        with self._lock:
+            old = self._entries.get(key)
+            if old:
+                self._total_bytes -= old["size"]
+            self._entries[key] = {
+                "meta": meta,
+                "size": len(body),
+                "used_at": time.time(),
+            }
+            self._total_bytes += len(body)
+            self._evict()
+
+    def _evict(self):
+        # Called with self._lock held.
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["used_at"]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            entry = self._entries.pop(key)
+            self._total_bytes -= entry["size"]
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,349 @@
+import os
+import re
+from html.entities import html5
+from html.parser import HTMLParser
+
+
+YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+MONTH_RE = re.compile(
+    r"\b(January|February|March|April|May|June|July|August|September|October|November|December)\b",
+    re.IGNORECASE,
+)
+CASE_CONTAINER_CLASS_RE = re.compile(r"case-list|results")
+CASE_HREF_RE = re.compile(r"\d{4}/\d+\.html")
+RTF_HREF_RE = re.compile(r"\.rtf$", re.IGNORECASE)
+RTF_TEXT_RE = re.compile(r"\bRTF\b", re.IGNORECASE)
+DOWNLOAD_HREF_RE = re.compile(r"download|document", re.IGNORECASE)
+
+CASE_CONTAINER_TAGS = {"div", "ul", "ol", "table"}
+
+# Tree-building rules copied from BeautifulSoup's html.parser builder, so the
+# single pass sees the same nesting (and therefore the same links) as the
+# BeautifulSoup-based extractors it replaces.
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+    "link", "menuitem", "meta", "param", "source", "track", "wbr", "basefont",
+    "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer",
+}
+# Text inside these is not part of an enclosing tag's .text.
+STRING_CONTAINER_TAGS = {"rt", "rp", "style", "script", "template"}
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+NAMED_ENTITIES = {
+    name[:-1]: char for name, char in html5.items() if name.endswith(";")
+}
+
+
+class _Element:
+    __slots__ = (
+        "name", "children", "only_child", "string", "text", "links", "month_index"
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.children = 0
+        self.only_child = None
+        self.string = None
+        self.text = None
+        self.links = None
+        self.month_index = None
+
+
+class _Anchor:
+    __slots__ = ("href", "element")
+
+    def __init__(self, href, element):
+        self.href = href
+        self.element = element
+
+    @property
+    def text(self):
+        return "".join(self.element.text)
+
+
+class PageLinks:
+    """
+    Everything the crawler needs from one page, gathered in a single parse.
+    Each property returns exactly what the matching BeautifulSoup-based helper
+    in preprocess_data returned before.
+    """
+
+    def __init__(self, anchors, month_items, case_containers, title):
+        self._anchors = anchors
+        self._month_items = month_items
+        self._case_containers = case_containers
+        self._title = title
+
+    @property
+    def year_links(self):
+        return [
+            a.href
+            for a in self._anchors
+            if a.href is not None
+            and (YEAR_RE.search(a.text) or YEAR_RE.search(a.href))
+        ]
+
+    @property
+    def month_links(self):
+        return [
+            anchor.href
+            for anchor in self._month_items
+            if anchor is not None and MONTH_RE.search(anchor.text)
+        ]
+
+    @property
+    def case_links(self):
+        return [href for links in self._case_containers for href in links]
+
+    @property
+    def rtf_link(self):
+        # Same three-tier preference as before: .rtf href, then "RTF" as the
+        # anchor's only string, then a download/document href.
+        for a in self._anchors:
+            if a.href is not None and RTF_HREF_RE.search(a.href):
+                return a.href
+        for a in self._anchors:
+            if a.element.string is not None and RTF_TEXT_RE.search(a.element.string):
+                return a.href
+        for a in self._anchors:
+            if a.href is not None and DOWNLOAD_HREF_RE.search(a.href):
+                return a.href
+        return None
+
+    @property
+    def has_title(self):
+        return self._title is not None
+
+    @property
+    def title(self):
+        """
+        The <title> element's string, or None if it has no single string child.
+        """
+        return self._title.string if self._title is not None else None
+
+
+class _PageScanner(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = [_Element("[document]")]
+        self.open_counts = {}
+        self.data = []
+        self.container_depth = 0
+        self.preserve_depth = 0
+        self.open_anchors = []
+        self.anchors = []
+        self.month_items = []
+        self.pending_month_items = []
+        self.case_containers = []
+        self.title = None
+        self.already_closed_empty_element = []
+
+    # --- tree bookkeeping -----------------------------------------------
+    def _add_child(self, parent, child):
+        parent.children += 1
+        parent.only_child = child if parent.children == 1 else None
+
+    def _flush_data(self, comment=False):
+        if not self.data:
+            return
+        text = "".join(self.data)
+        self.data = []
+        if not self.preserve_depth and not text.strip(ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        self._add_child(self.stack[-1], text)
+        if not comment and not self.container_depth:
+            for anchor in self.open_anchors:
+                anchor.text.append(text)
+
+    def _push(self, element, attrs):
+        self._add_child(self.stack[-1], element)
+        self.stack.append(element)
+        name = element.name
+        self.open_counts[name] = self.open_counts.get(name, 0) + 1
+        if name in STRING_CONTAINER_TAGS:
+            self.container_depth += 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+
+        if name == "a":
+            element.text = []
+            self.open_anchors.append(element)
+            href = attrs.get("href")
+            self.anchors.append(_Anchor(href, element))
+            if href is not None:
+                anchor = self.anchors[-1]
+                for index in self.pending_month_items:
+                    self.month_items[index] = anchor
+                self.pending_month_items = []
+                if CASE_HREF_RE.search(href):
+                    for open_element in self.stack:
+                        if open_element.links is not None:
+                            open_element.links.append(href)
+        elif name == "li" and "make-database" in attrs.get("class", "").split():
+            element.month_index = len(self.month_items)
+            self.pending_month_items.append(element.month_index)
+            self.month_items.append(None)
+        elif name == "title" and self.title is None:
+            self.title = element
+
+        if name in CASE_CONTAINER_TAGS and CASE_CONTAINER_CLASS_RE.search(
+            attrs.get("class", "")
+        ):
+            element.links = []
+            self.case_containers.append(element.links)
+
+    def _pop(self):
+        element = self.stack.pop()
+        name = element.name
+        self.open_counts[name] -= 1
+        if name in STRING_CONTAINER_TAGS:
+            self.container_depth -= 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth -= 1
+        if name == "a":
+            self.open_anchors.remove(element)
+        elif element.month_index in self.pending_month_items:
+            # The li closed without an href anchor inside it.
+            self.pending_month_items.remove(element.month_index)
+        child = element.only_child
+        if isinstance(child, str):
+            element.string = child
+        elif child is not None:
+            element.string = child.string
+
+    def _pop_to(self, name):
+        if not self.open_counts.get(name):
+            return
+        while len(self.stack) > 1:
+            element = self.stack[-1]
+            self._pop()
+            if element.name == name:
+                return
+
+    # --- HTMLParser callbacks -------------------------------------------
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush_data()
+        attr_dict = {}
+        for key, value in attrs:
+            attr_dict[key] = "" if value is None else value
+        self._push(_Element(tag), attr_dict)
+        if handle_empty_element and tag in VOID_ELEMENTS:
+            self._flush_data()
+            self._pop_to(tag)
+            self.already_closed_empty_element.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed_empty_element:
+            # The matching end tag of a void element we already closed.
+            self.already_closed_empty_element.remove(tag)
+            return
+        self._flush_data()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_charref(self, name):
+        if name.startswith(("x", "X")):
+            code = int(name.lstrip("xX"), 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytes([code]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self.data.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = NAMED_ENTITIES.get(name)
+        self.data.append(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._flush_data()
+        self.data.append(data)
+        self._flush_data(comment=True)
+
+    def unknown_decl(self, data):
+        self._flush_data()
+        if data.upper().startswith("CDATA["):
+            self.data.append(data[len("CDATA[") :])
+            self._flush_data()
+        else:
+            self.data.append(data)
+            self._flush_data(comment=True)
+
+    def handle_decl(self, data):
+        self._flush_data()
+        self.data.append(data[len("DOCTYPE ") :])
+        self._flush_data(comment=True)
+
+    def handle_pi(self, data):
+        self._flush_data()
+        self.data.append(data)
+        self._flush_data(comment=True)
+
+    def finish(self):
+        self.close()
+        self._flush_data()
+        while len(self.stack) > 1:
+            self._pop()
+        return PageLinks(
+            self.anchors, self.month_items, self.case_containers, self.title
+        )
+
+
+def extract_page(html):
+    """
+    Parse `html` once and return a PageLinks with its year, month and case
+    links, RTF link and title.
+    """
+    scanner = _PageScanner()
+    scanner.feed(html)
+    return scanner.finish()
+
+
+def benchmark(paths, repeat=20):
+    """
+    Time extract_page against a plain BeautifulSoup parse on saved pages,
+    such as the test fixtures in ../tests/fixtures/pages.
+    """
+    import time
+
+    from bs4 import BeautifulSoup
+
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        timings = {}
+        for label, parse in (
+            ("BeautifulSoup", lambda: BeautifulSoup(html, "html.parser")),
+            ("extract_page", lambda: extract_page(html)),
+        ):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                parse()
+            timings[label] = (time.perf_counter() - start) / repeat
+        print(
+            f"{os.path.basename(path)}: "
+            f"BeautifulSoup {timings['BeautifulSoup'] * 1000:.1f} ms, "
+            f"extract_page {timings['extract_page'] * 1000:.1f} ms "
+            f"({timings['BeautifulSoup'] / timings['extract_page']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    import sys
+
+    benchmark(sys.argv[1:])
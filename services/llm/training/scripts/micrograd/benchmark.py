@@ -0,0 +1,220 @@
+"""
+Compare the Tensor engine with a scalar Value engine (one Python object per
+number, as in micrograd.ipynb) on the same MLP: check that both compute the
+same loss and gradients, then time a training step of each on the CPU.
+
+    python -m micrograd.benchmark            (from the scripts folder)
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from micrograd.nn import MLP
+
+
+class Value:
+    """
+    Scalar reference engine: the notebook's Value, cut down to the operations
+    the benchmark MLP needs.
+    """
+
+    def __init__(self, data, _children=()):
+        self.data = data
+        self.grad = 0.0
+        self._backward = lambda: None
+        self._prev = _children
+
+    def __add__(self, other):
+        other = other if isinstance(other, Value) else Value(other)
+        out = Value(self.data + other.data, (self, other))
+
+        def _backward():
+            self.grad += out.grad
+            other.grad += out.grad
+
+        out._backward = _backward
+        return out
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        other = other if isinstance(other, Value) else Value(other)
+        out = Value(self.data * other.data, (self, other))
+
+        def _backward():
+            self.grad += other.data * out.grad
+            other.grad += self.data * out.grad
+
+        out._backward = _backward
+        return out
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return self * -1
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def tanh(self):
+        t = math.tanh(self.data)
+        out = Value(t, (self,))
+
+        def _backward():
+            self.grad += (1 - t**2) * out.grad
+
+        out._backward = _backward
+        return out
+
+    def exp(self):
+        out = Value(math.exp(self.data), (self,))
+
+        def _backward():
+            self.grad += out.data * out.grad
+
+        out._backward = _backward
+        return out
+
+    def log(self):
+        out = Value(math.log(self.data), (self,))
+
+        def _backward():
+            self.grad += out.grad / self.data
+
+        out._backward = _backward
+        return out
+
+    def backward(self):
+        topo = []
+        visited = set()
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                topo.append(node)
+            elif node not in visited:
+                visited.add(node)
+                stack.append((node, True))
+                stack.extend((child, False) for child in node._prev)
+        self.grad = 1.0
+        for node in reversed(topo):
+            node._backward()
+
+
+def scalar_mlp_loss(weights, biases, xs, targets):
+    """
+    The same forward pass as nn.MLP (tanh between layers) and
+    Tensor.cross_entropy, one Value at a time.
+    """
+    losses = []
+    for x, target in zip(xs, targets):
+        activations = x
+        for layer, (W, b) in enumerate(zip(weights, biases)):
+            activations = [
+                sum((W[i][j] * a for i, a in enumerate(activations)), b[j])
+                for j in range(len(b))
+            ]
+            if layer < len(weights) - 1:
+                activations = [a.tanh() for a in activations]
+        # Subtract the largest logit (a constant) for a stable softmax.
+        top = max(a.data for a in activations)
+        exps = [(a - top).exp() for a in activations]
+        losses.append(-((activations[target] - top) - sum(exps).log()))
+    return sum(losses) * (1 / len(losses))
+
+
+def scalar_parameters(model):
+    weights = [
+        [[Value(float(w)) for w in row] for row in layer.W.data]
+        for layer in model.layers
+    ]
+    biases = [[Value(float(b)) for b in layer.b.data] for layer in model.layers]
+    return weights, biases
+
+
+def check(model, x, y):
+    """
+    Return the largest absolute difference between the two engines' loss and
+    gradients for the same weights and batch.
+    """
+    model.zero_grad()
+    loss = model(x).cross_entropy(y)
+    loss.backward()
+
+    weights, biases = scalar_parameters(model)
+    xs = [[float(v) for v in row] for row in x]
+    scalar_loss = scalar_mlp_loss(weights, biases, xs, [int(t) for t in y])
+    scalar_loss.backward()
+
+    error = abs(loss.data - scalar_loss.data)
+    for layer, W, b in zip(model.layers, weights, biases):
+        W_grad = np.array([[w.grad for w in row] for row in W])
+        b_grad = np.array([v.grad for v in b])
+        error = max(error, np.abs(layer.W.grad - W_grad).max())
+        error = max(error, np.abs(layer.b.grad - b_grad).max())
+    return error
+
+
+def time_tensor_step(model, x, y, steps, lr=0.1):
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.zero_grad()
+        loss = model(x).cross_entropy(y)
+        loss.backward()
+        for p in model.parameters():
+            p.data -= lr * p.grad
+    return (time.perf_counter() - start) / steps
+
+
+def time_scalar_step(model, x, y, steps, lr=0.1):
+    weights, biases = scalar_parameters(model)
+    params = [v for W in weights for row in W for v in row]
+    params += [v for b in biases for v in b]
+    xs = [[float(v) for v in row] for row in x]
+    targets = [int(t) for t in y]
+    start = time.perf_counter()
+    for _ in range(steps):
+        for p in params:
+            p.grad = 0.0
+        loss = scalar_mlp_loss(weights, biases, xs, targets)
+        loss.backward()
+        for p in params:
+            p.data -= lr * p.grad
+    return (time.perf_counter() - start) / steps
+
+
+def benchmark(batch_size=32, nin=16, hidden=32, classes=8, steps=3, seed=0):
+    rng = np.random.default_rng(seed)
+    model = MLP(nin, [hidden, hidden, classes], rng=rng)
+    x = rng.standard_normal((batch_size, nin))
+    y = rng.integers(0, classes, size=batch_size)
+
+    error = check(model, x, y)
+    print(f"MLP {nin} -> {hidden} -> {hidden} -> {classes}, batch {batch_size}")
+    print(f"Max difference in loss and gradients: {error:.2e}")
+
+    scalar = time_scalar_step(model, x, y, steps)
+    tensor = time_tensor_step(model, x, y, max(steps, 100))
+    print(f"{'Engine':>8} {'ms / step':>12}")
+    print(f"{'Value':>8} {scalar * 1000:>12.2f}")
+    print(f"{'Tensor':>8} {tensor * 1000:>12.2f}")
+    print(f"Speed-up: {scalar / tensor:.0f}x")
+    return scalar, tensor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Tensor engine against scalar Values."
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--nin", type=int, default=16)
+    parser.add_argument("--hidden", type=int, default=32)
+    parser.add_argument("--classes", type=int, default=8)
+    parser.add_argument(
+        "--steps", type=int, default=3, help="Training steps timed for Value."
+    )
+    args = parser.parse_args()
+    benchmark(args.batch_size, args.nin, args.hidden, args.classes, args.steps)
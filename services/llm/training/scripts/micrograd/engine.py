@@ -0,0 +1,321 @@
+import numpy as np
+
+
+def _unbroadcast(grad, shape):
+    """
+    Sum `grad` down to `shape`, undoing NumPy broadcasting: leading axes that
+    were added and axes that were stretched from size 1.
+    """
+    while grad.ndim > len(shape):
+        grad = grad.sum(axis=0)
+    for axis, size in enumerate(shape):
+        if size == 1 and grad.shape[axis] != 1:
+            grad = grad.sum(axis=axis, keepdims=True)
+    return grad
+
+
+class Tensor:
+    """
+    An n-dimensional array that remembers how it was computed.
+
+    This is micrograd's Value with a NumPy array in place of the float: every
+    operation builds one graph node for the whole array, and its _backward
+    applies the chain rule with array operations. A forward pass through a
+    layer is a handful of nodes however large the batch or the layer is.
+
+    Only tensors with requires_grad (parameters, and anything computed from
+    them) are part of the graph that backward() walks; inputs and targets are
+    plain constants.
+    """
+
+    # Make NumPy hand `array @ tensor`, `array * tensor`, ... to the Tensor.
+    __array_ufunc__ = None
+
+    def __init__(self, data, _children=(), _op="", requires_grad=False, label=""):
+        data = np.asarray(data)
+        if not np.issubdtype(data.dtype, np.floating):
+            data = data.astype(np.float64)
+        self.data = data
+        self.grad = None  # Same shape as data once backward() reaches it
+        self.requires_grad = requires_grad or any(c.requires_grad for c in _children)
+        self._backward = lambda: None
+        self._prev = _children if self.requires_grad else ()
+        self._op = _op
+        self.label = label
+
+    def __repr__(self):
+        return f"Tensor(shape={self.shape}, op={self._op or 'leaf'})"
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def ndim(self):
+        return self.data.ndim
+
+    @property
+    def T(self):
+        return self.transpose()
+
+    def _accumulate(self, grad):
+        if not self.requires_grad:
+            return
+        if self.grad is None:
+            self.grad = np.zeros_like(self.data)
+        self.grad += grad
+
+    @staticmethod
+    def _wrap(other):
+        return other if isinstance(other, Tensor) else Tensor(other)
+
+    # Arithmetic (with broadcasting)
+    def __add__(self, other):
+        other = self._wrap(other)
+        out = Tensor(self.data + other.data, (self, other), "+")
+
+        def _backward():
+            if self.requires_grad:
+                self._accumulate(_unbroadcast(out.grad, self.shape))
+            if other.requires_grad:
+                other._accumulate(_unbroadcast(out.grad, other.shape))
+
+        out._backward = _backward
+        return out
+
+    def __radd__(self, other):
+        return self + other
+
+    def __neg__(self):
+        return self * -1.0
+
+    def __sub__(self, other):
+        return self + (-self._wrap(other))
+
+    def __rsub__(self, other):
+        return self._wrap(other) - self
+
+    def __mul__(self, other):
+        other = self._wrap(other)
+        out = Tensor(self.data * other.data, (self, other), "*")
+
+        def _backward():
+            if self.requires_grad:
+                self._accumulate(_unbroadcast(other.data * out.grad, self.shape))
+            if other.requires_grad:
+                other._accumulate(_unbroadcast(self.data * out.grad, other.shape))
+
+        out._backward = _backward
+        return out
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __truediv__(self, other):
+        return self * self._wrap(other) ** -1
+
+    def __rtruediv__(self, other):
+        return self._wrap(other) / self
+
+    def __pow__(self, other):
+        assert isinstance(other, (int, float)), "Only supports int or float exponents"
+        out = Tensor(self.data**other, (self,), f"**{other}")
+
+        def _backward():
+            self._accumulate(other * self.data ** (other - 1) * out.grad)
+
+        out._backward = _backward
+        return out
+
+    def __matmul__(self, other):
+        other = self._wrap(other)
+        out = Tensor(self.data @ other.data, (self, other), "@")
+
+        def _backward():
+            # Treat vectors as a 1 x n row (left) or n x 1 column (right), so
+            # the matrix rules cover every case NumPy's matmul accepts.
+            a = self.data[None, :] if self.ndim == 1 else self.data
+            b = other.data[:, None] if other.ndim == 1 else other.data
+            grad = out.grad.reshape((a @ b).shape)
+            if self.requires_grad:
+                grad_a = _unbroadcast(grad @ np.swapaxes(b, -1, -2), a.shape)
+                self._accumulate(grad_a.reshape(self.shape))
+            if other.requires_grad:
+                grad_b = _unbroadcast(np.swapaxes(a, -1, -2) @ grad, b.shape)
+                other._accumulate(grad_b.reshape(other.shape))
+
+        out._backward = _backward
+        return out
+
+    def __rmatmul__(self, other):
+        return self._wrap(other) @ self
+
+    # Element-wise functions
+    def tanh(self):
+        t = np.tanh(self.data)
+        out = Tensor(t, (self,), "tanh")
+
+        def _backward():
+            self._accumulate((1 - t**2) * out.grad)
+
+        out._backward = _backward
+        return out
+
+    def relu(self):
+        out = Tensor(np.maximum(self.data, 0), (self,), "ReLU")
+
+        def _backward():
+            self._accumulate((self.data > 0) * out.grad)
+
+        out._backward = _backward
+        return out
+
+    def sigmoid(self):
+        s = 1 / (1 + np.exp(-self.data))
+        out = Tensor(s, (self,), "sigmoid")
+
+        def _backward():
+            self._accumulate(s * (1 - s) * out.grad)
+
+        out._backward = _backward
+        return out
+
+    def exp(self):
+        out = Tensor(np.exp(self.data), (self,), "exp")
+
+        def _backward():
+            self._accumulate(out.data * out.grad)
+
+        out._backward = _backward
+        return out
+
+    def log(self):
+        out = Tensor(np.log(self.data), (self,), "log")
+
+        def _backward():
+            self._accumulate(out.grad / self.data)
+
+        out._backward = _backward
+        return out
+
+    # Reductions and shape changes
+    def sum(self, axis=None, keepdims=False):
+        out = Tensor(self.data.sum(axis=axis, keepdims=keepdims), (self,), "sum")
+
+        def _backward():
+            grad = out.grad
+            if axis is not None and not keepdims:
+                grad = np.expand_dims(grad, axis)
+            self._accumulate(np.broadcast_to(grad, self.shape))
+
+        out._backward = _backward
+        return out
+
+    def mean(self, axis=None, keepdims=False):
+        count = self.data.size if axis is None else np.prod(
+            [self.shape[a] for a in np.atleast_1d(axis)]
+        )
+        return self.sum(axis=axis, keepdims=keepdims) / count
+
+    def reshape(self, *shape):
+        out = Tensor(self.data.reshape(*shape), (self,), "reshape")
+
+        def _backward():
+            self._accumulate(out.grad.reshape(self.shape))
+
+        out._backward = _backward
+        return out
+
+    def transpose(self, *axes):
+        axes = axes or None
+        out = Tensor(self.data.transpose(axes), (self,), "T")
+
+        def _backward():
+            inverse = None if axes is None else np.argsort(axes)
+            self._accumulate(out.grad.transpose(inverse))
+
+        out._backward = _backward
+        return out
+
+    def __getitem__(self, index):
+        if isinstance(index, Tensor):
+            index = index.data.astype(np.int64)
+        out = Tensor(self.data[index], (self,), "[]")
+
+        def _backward():
+            # add.at, because an index array may pick the same row twice
+            # (the same token in an embedding lookup).
+            grad = np.zeros_like(self.data)
+            np.add.at(grad, index, out.grad)
+            self._accumulate(grad)
+
+        out._backward = _backward
+        return out
+
+    # Softmax and loss, with fused backward passes
+    def softmax(self, axis=-1):
+        shifted = self.data - self.data.max(axis=axis, keepdims=True)
+        e = np.exp(shifted)
+        s = e / e.sum(axis=axis, keepdims=True)
+        out = Tensor(s, (self,), "softmax")
+
+        def _backward():
+            dot = (out.grad * s).sum(axis=axis, keepdims=True)
+            self._accumulate(s * (out.grad - dot))
+
+        out._backward = _backward
+        return out
+
+    def cross_entropy(self, targets):
+        """
+        Mean negative log-likelihood of integer `targets` under softmax(self)
+        over the last axis. One graph node: the backward pass is simply
+        (softmax - one_hot(targets)) / N.
+        """
+        if isinstance(targets, Tensor):
+            targets = targets.data
+        targets = np.asarray(targets, dtype=np.int64).reshape(-1)
+        logits = self.data.reshape(-1, self.shape[-1])
+        rows = np.arange(len(targets))
+        shifted = logits - logits.max(axis=1, keepdims=True)
+        log_norm = np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+        log_probs = shifted - log_norm
+        out = Tensor(-log_probs[rows, targets].mean(), (self,), "cross_entropy")
+
+        def _backward():
+            grad = np.exp(log_probs)
+            grad[rows, targets] -= 1
+            grad *= out.grad / len(targets)
+            self._accumulate(grad.reshape(self.shape))
+
+        out._backward = _backward
+        return out
+
+    def backward(self):
+        """
+        Backpropagate from this tensor (usually a scalar loss) to every
+        tensor it was computed from that requires a gradient.
+        """
+        # Topological order, built iteratively so that deep graphs (an RNN
+        # unrolled over a long sequence) do not hit the recursion limit.
+        topo = []
+        visited = set()
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                topo.append(node)
+                continue
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            stack.append((node, True))
+            for child in node._prev:
+                if id(child) not in visited:
+                    stack.append((child, False))
+
+        self.grad = np.ones_like(self.data)
+        for node in reversed(topo):
+            # Constants computed from constants never receive a gradient.
+            if node.grad is not None:
+                node._backward()
@@ -1 +1,92 @@
+import numpy as np
 
+from micrograd.engine import Tensor
+
+
+class Module:
+    def zero_grad(self):
+        for p in self.parameters():
+            p.grad = None
+
+    def parameters(self):
+        return []
+
+
+class Linear(Module):
+    """
+    y = x @ W + b for a batch of inputs x of shape (..., nin).
+
+    The weights are drawn uniformly from +-1/sqrt(nin), which keeps the
+    activations of deep stacks in a sensible range.
+    """
+
+    def __init__(self, nin, nout, bias=True, rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        bound = 1 / np.sqrt(nin)
+        self.W = Tensor(rng.uniform(-bound, bound, (nin, nout)), requires_grad=True)
+        self.b = Tensor(np.zeros(nout), requires_grad=True) if bias else None
+
+    def __call__(self, x):
+        out = x @ self.W
+        return out + self.b if self.b is not None else out
+
+    def parameters(self):
+        return [self.W] + ([self.b] if self.b is not None else [])
+
+    def __repr__(self):
+        nin, nout = self.W.shape
+        return f"Linear({nin}, {nout})"
+
+
+class MLP(Module):
+    """
+    A Multi-Layer Perceptron: Linear layers of sizes [nin] + nouts with a
+    non-linearity between them. The last layer is left linear, so its
+    outputs can be fed straight to cross_entropy as logits.
+    """
+
+    def __init__(self, nin, nouts, activation="tanh", rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        sizes = [nin] + nouts
+        self.layers = [
+            Linear(sizes[i], sizes[i + 1], rng=rng) for i in range(len(nouts))
+        ]
+        self.activation = activation
+
+    def __call__(self, x):
+        for i, layer in enumerate(self.layers):
+            x = layer(x)
+            if i < len(self.layers) - 1:
+                x = getattr(x, self.activation)()
+        return x
+
+    def parameters(self):
+        return [p for layer in self.layers for p in layer.parameters()]
+
+    def __repr__(self):
+        return f"MLP of [{', '.join(str(layer) for layer in self.layers)}]"
+
+
+class Embedding(Module):
+    """
+    A lookup table of num_embeddings vectors of size dim. Calling it with an
+    integer array of token IDs of any shape returns their vectors, of shape
+    ids.shape + (dim,); the backward pass scatters the gradients back into
+    the rows that were used.
+    """
+
+    def __init__(self, num_embeddings, dim, rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        self.weight = Tensor(
+            rng.standard_normal((num_embeddings, dim)), requires_grad=True
+        )
+
+    def __call__(self, ids):
+        return self.weight[np.asarray(ids, dtype=np.int64)]
+
+    def parameters(self):
+        return [self.weight]
+
+    def __repr__(self):
+        num_embeddings, dim = self.weight.shape
+        return f"Embedding({num_embeddings}, {dim})"
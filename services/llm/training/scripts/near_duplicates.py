@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from process_text_file import (
+    clean_word,
+    document_key,
+    list_corpus_documents,
+    read_corpus_document,
+    split_batches,
+)
+
+
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_SIZE = 5
+THRESHOLD = 0.8
+SEED = 1995
+
+# Odd 64-bit multipliers for the rolling shingle hash.
+_ROLL = np.uint64(0x9E3779B97F4A7C15)
+_MAX_HASH = np.iinfo(np.uint64).max
+
+
+def get_default_output_dir():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "corpus")
+
+
+def permutations(num_perm=NUM_PERM, seed=SEED):
+    """
+    (a, b) parameters of the num_perm hash functions h(x) = a * x + b mod 2**64,
+    with odd a. Fixed by the seed, so signatures are comparable across runs.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MAX_HASH, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+_word_hashes = {}
+
+
+def shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    """
+    Distinct 64-bit hashes of the document's word shingles. Words are cleaned
+    as in process_text_file and lower-cased, so formatting differences between
+    courts' copies of a judgment do not matter.
+    """
+    ids = []
+    for word in text.split():
+        cleaned = clean_word(word)
+        if not cleaned:
+            continue
+        cleaned = cleaned.lower()
+        value = _word_hashes.get(cleaned)
+        if value is None:
+            # crc32 is stable across processes, unlike hash().
+            encoded = cleaned.encode("ascii")
+            value = zlib.crc32(encoded) | (zlib.crc32(encoded[::-1]) << 32)
+            _word_hashes[cleaned] = value
+        ids.append(value)
+    if not ids:
+        return np.zeros(0, dtype=np.uint64)
+    words = np.array(ids, dtype=np.uint64)
+    if len(words) < shingle_size:
+        shingle_size = len(words)
+    count = len(words) - shingle_size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for offset in range(shingle_size):
+            hashes = hashes * _ROLL + words[offset : offset + count]
+    return np.unique(hashes)
+
+
+def minhash(hashes, a, b, block=4096):
+    """
+    MinHash signature (len(a) uint64 values) of a set of shingle hashes.
+    """
+    signature = np.full(len(a), _MAX_HASH, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for start in range(0, len(hashes), block):
+            chunk = hashes[start : start + block]
+            values = np.multiply.outer(a, chunk) + b[:, None]
+            np.minimum(signature, values.min(axis=1), out=signature)
+    return signature
+
+
+_params = None
+
+
+def _init_worker(a, b, shingle_size):
+    global _params
+    _params = (a, b, shingle_size)
+
+
+def _signatures(batch):
+    # Runs in a worker: (signatures, shingle counts) for a batch of documents.
+    a, b, shingle_size = _params
+    signatures = np.empty((len(batch), len(a)), dtype=np.uint64)
+    sizes = []
+    for i, item in enumerate(batch):
+        hashes = shingle_hashes(read_corpus_document(item), shingle_size)
+        signatures[i] = minhash(hashes, a, b)
+        sizes.append(len(hashes))
+    return signatures, sizes
+
+
+def compute_signatures(
+    documents, workers=None, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE
+):
+    """
+    MinHash every document on a process pool. Returns (signatures, sizes):
+    a (len(documents), num_perm) uint64 array and each document's number of
+    distinct shingles.
+    """
+    workers = workers or os.cpu_count() or 1
+    a, b = permutations(num_perm)
+    signatures = np.empty((len(documents), num_perm), dtype=np.uint64)
+    sizes = np.empty(len(documents), dtype=np.int64)
+    row = 0
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(a, b, shingle_size)
+    ) as executor:
+        for batch_signatures, batch_sizes in executor.map(
+            _signatures, split_batches(documents, workers, max_size=64)
+        ):
+            signatures[row : row + len(batch_sizes)] = batch_signatures
+            sizes[row : row + len(batch_sizes)] = batch_sizes
+            row += len(batch_sizes)
+    return signatures, sizes
+
+
+# -------------------------------------------------------------------
+class _DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            self.parent[max(x, y)] = min(x, y)
+
+
+def similarity(signatures, i, j):
+    """
+    Estimated Jaccard similarity of documents i and j.
+    """
+    return float(np.mean(signatures[i] == signatures[j]))
+
+
+def find_clusters(signatures, sizes, bands=BANDS, threshold=THRESHOLD):
+    """
+    Group near-duplicates with LSH banding. Documents that share any band
+    bucket are candidates; a candidate joins the bucket's first document's
+    cluster when their estimated similarity reaches `threshold`. Each
+    document is hashed once per band, so the work grows linearly with the
+    corpus rather than with the number of pairs.
+
+    Returns the clusters (lists of document indexes, two or more each).
+    """
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    sets = _DisjointSet(count)
+    checked = set()
+    for band in range(bands):
+        band_values = np.ascontiguousarray(
+            signatures[:, band * rows : (band + 1) * rows]
+        )
+        buckets = {}
+        for i in range(count):
+            if sizes[i] == 0:
+                # Empty documents would all collide; they are not duplicates.
+                continue
+            key = band_values[i].tobytes()
+            head = buckets.setdefault(key, i)
+            if head == i or (head, i) in checked:
+                continue
+            checked.add((head, i))
+            if similarity(signatures, head, i) >= threshold:
+                sets.union(head, i)
+
+    groups = {}
+    for i in range(count):
+        groups.setdefault(sets.find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def deduplicate(
+    out_dir=None,
+    source="auto",
+    workers=None,
+    threshold=THRESHOLD,
+    bands=BANDS,
+    num_perm=NUM_PERM,
+    shingle_size=SHINGLE_SIZE,
+    data_dir=None,
+    store_path=None,
+):
+    """
+    Find near-duplicate judgments across the corpus and write:
+
+        near_duplicates.json   one entry per cluster: the document kept and
+                               the dropped copies with their estimated
+                               similarity to it
+        dedup_keep.txt         document keys to train on, one per line, in
+                               corpus order (see token_dataset --keep)
+
+    The copy with the most distinct shingles (usually the most complete
+    text) is kept from each cluster.
+    """
+    out_dir = out_dir or get_default_output_dir()
+    os.makedirs(out_dir, exist_ok=True)
+    documents = list_corpus_documents(source, data_dir, store_path)
+    keys = [document_key(item) for item in documents]
+    print(f"MinHashing {len(documents)} documents...")
+    signatures, sizes = compute_signatures(
+        documents, workers=workers, num_perm=num_perm, shingle_size=shingle_size
+    )
+    clusters = find_clusters(signatures, sizes, bands=bands, threshold=threshold)
+
+    dropped = set()
+    report = []
+    for members in clusters:
+        keep = max(members, key=lambda i: (sizes[i], -i))
+        copies = [i for i in members if i != keep]
+        dropped.update(copies)
+        report.append(
+            {
+                "keep": keys[keep],
+                "duplicates": [
+                    {
+                        "document": keys[i],
+                        "similarity": round(similarity(signatures, keep, i), 3),
+                    }
+                    for i in copies
+                ],
+            }
+        )
+
+    report_path = os.path.join(out_dir, "near_duplicates.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.join(out_dir, "dedup_keep.txt"), "w", encoding="utf-8") as f:
+        for i, key in enumerate(keys):
+            if i not in dropped:
+                f.write(key + "\n")
+    print(
+        f"Found {len(clusters)} duplicate clusters; keeping "
+        f"{len(documents) - len(dropped)} of {len(documents)} documents"
+    )
+    return report
+
+
+def read_keep_list(path):
+    """
+    The document keys in a dedup_keep.txt file, as a set.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find near-duplicate judgments with MinHash and LSH."
+    )
+    parser.add_argument("--out", default=None, help="Output directory.")
+    parser.add_argument(
+        "--source",
+        choices=("auto", "store", "files"),
+        default="auto",
+        help="Read the corpus store or the loose data/ files "
+        "(default: the store if it exists).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="Estimated Jaccard similarity at which two documents are duplicates.",
+    )
+    parser.add_argument(
+        "--bands",
+        type=int,
+        default=BANDS,
+        help=f"LSH bands ({NUM_PERM} // bands rows each).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="MinHash processes (default: one per CPU).",
+    )
+    args = parser.parse_args()
+    deduplicate(args.out, args.source, args.workers, args.threshold, args.bands)
@@ -0,0 +1,269 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from token_dataset import TokenDataset, get_default_dataset_dir
+
+
+CHUNK_TOKENS = 1 << 22
+
+
+def get_default_counts_path(n):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "corpus", f"ngram_{n}.npz")
+
+
+def _merge(codes, counts):
+    # Sum the counts of equal codes; returns sorted unique codes.
+    unique, inverse = np.unique(codes, return_inverse=True)
+    return unique, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def encode_ngrams(tokens, doc_ends, n, vocab_size):
+    """
+    Encode every n-gram of `tokens` that lies inside one document as the
+    integer w1 * V**(n-1) + ... + wn. doc_ends[i] is the end (exclusive) of
+    the document holding token i, so n-grams never span two judgments.
+    """
+    count = len(tokens) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64)
+    codes = np.zeros(count, dtype=np.int64)
+    for offset in range(n):
+        codes = codes * vocab_size + tokens[offset : offset + count]
+    valid = np.arange(count) + n <= doc_ends[:count]
+    return codes[valid]
+
+
+def _count_shard(path, n, first_doc, last_doc, chunk_tokens):
+    # Runs in a worker: count the n-grams of documents [first_doc, last_doc)
+    # chunk by chunk, keeping only the sorted (code, count) pairs in memory.
+    dataset = TokenDataset(path)
+    offsets = dataset.offsets
+    codes = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(0, dtype=np.int64)
+    doc = first_doc
+    while doc < last_doc:
+        # Whole documents up to about chunk_tokens (at least one).
+        end_doc = np.searchsorted(offsets, offsets[doc] + chunk_tokens, "right") - 1
+        end_doc = min(max(end_doc, doc + 1), last_doc)
+        start, end = offsets[doc], offsets[end_doc]
+        tokens = dataset.tokens[start:end].astype(np.int64)
+        lengths = np.diff(offsets[doc : end_doc + 1])
+        doc_ends = np.repeat(offsets[doc + 1 : end_doc + 1] - start, lengths)
+        chunk_codes, chunk_counts = np.unique(
+            encode_ngrams(tokens, doc_ends, n, dataset.vocab_size),
+            return_counts=True,
+        )
+        codes, counts = _merge(
+            np.concatenate([codes, chunk_codes]),
+            np.concatenate([counts, chunk_counts]),
+        )
+        doc = end_doc
+    return codes, counts
+
+
+def count_ngrams(n=2, dataset_path=None, workers=None, chunk_tokens=CHUNK_TOKENS):
+    """
+    Count the n-grams of a token dataset (see token_dataset.py) without a
+    dense V**n table. The documents are split into shards of about equal
+    token counts, each shard is streamed through a worker in chunks of
+    `chunk_tokens`, and the workers' sorted sparse counts are merged.
+    """
+    dataset_path = dataset_path or get_default_dataset_dir()
+    dataset = TokenDataset(dataset_path)
+    vocab_size = dataset.vocab_size
+    if vocab_size**n >= np.iinfo(np.int64).max:
+        raise ValueError(f"A {vocab_size} word vocabulary is too large for n={n}.")
+    workers = workers or os.cpu_count() or 1
+    offsets = dataset.offsets
+    bounds = np.searchsorted(
+        offsets, np.linspace(0, offsets[-1], workers * 4 + 1), "left"
+    )
+    bounds = np.unique(np.clip(bounds, 0, dataset.num_documents))
+    shards = list(zip(bounds[:-1], bounds[1:]))
+    print(f"Counting {n}-grams in {len(dataset)} tokens ({len(shards)} shards)...")
+
+    codes = []
+    counts = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _count_shard, dataset_path, n, int(a), int(b), chunk_tokens
+            )
+            for a, b in shards
+        ]
+        for future in futures:
+            shard_codes, shard_counts = future.result()
+            codes.append(shard_codes)
+            counts.append(shard_counts)
+    if codes:
+        codes, counts = _merge(np.concatenate(codes), np.concatenate(counts))
+    else:
+        codes = counts = np.zeros(0, dtype=np.int64)
+    return NGramCounts(n, vocab_size, codes, counts)
+
+
+# -------------------------------------------------------------------
+class NGramCounts:
+    """
+    Sparse n-gram counts in CSR form: a row per context (the first n - 1
+    words) that was seen, holding the next words seen after it and their
+    counts. Only observed n-grams are stored.
+
+        counts = NGramCounts.load()  # or count_ngrams(2)
+        counts.probability(contexts, words, k=1.0)
+        counts.sample(contexts, rng)
+
+    Contexts are arrays of shape (batch, n - 1) of word IDs, or (batch,) for
+    bigrams.
+    """
+
+    def __init__(self, n, vocab_size, codes, counts):
+        self.n = n
+        self.vocab_size = vocab_size
+        self.codes = codes
+        self.counts = counts
+        # CSR: row r is context contexts[r]; its next words are
+        # next_words[indptr[r]:indptr[r + 1]], sorted.
+        self.next_words = codes % vocab_size
+        self.contexts, starts = np.unique(codes // vocab_size, return_index=True)
+        self.indptr = np.append(starts, len(codes))
+        self.totals = np.add.reduceat(counts, starts) if len(codes) else counts
+        self._cumulative = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def save(self, path=None):
+        path = path or get_default_counts_path(self.n)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(
+            path,
+            n=self.n,
+            vocab_size=self.vocab_size,
+            codes=self.codes,
+            counts=self.counts,
+        )
+        return path
+
+    @classmethod
+    def load(cls, path=None, n=2):
+        with np.load(path or get_default_counts_path(n)) as f:
+            return cls(int(f["n"]), int(f["vocab_size"]), f["codes"], f["counts"])
+
+    def encode_contexts(self, contexts):
+        contexts = np.asarray(contexts, dtype=np.int64)
+        if contexts.ndim == 1 and self.n == 2:
+            return contexts
+        codes = np.zeros(contexts.shape[0], dtype=np.int64)
+        for i in range(self.n - 1):
+            codes = codes * self.vocab_size + contexts[:, i]
+        return codes
+
+    def _context_totals(self, contexts):
+        # (CSR row, total count) of each context; total 0 if never seen.
+        context_codes = self.encode_contexts(contexts)
+        if len(self.contexts) == 0:
+            zeros = np.zeros(len(context_codes), dtype=np.int64)
+            return zeros, zeros
+        rows = np.searchsorted(self.contexts, context_codes)
+        rows = np.minimum(rows, len(self.contexts) - 1)
+        found = self.contexts[rows] == context_codes
+        return rows, np.where(found, self.totals[rows], 0)
+
+    def count(self, contexts, words):
+        """
+        Observed counts of each (context, word) pair, vectorized.
+        """
+        words = np.asarray(words, dtype=np.int64)
+        codes = self.encode_contexts(contexts) * self.vocab_size + words
+        if len(self.codes) == 0:
+            return np.zeros(len(codes), dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        return np.where(self.codes[index] == codes, self.counts[index], 0)
+
+    def probability(self, contexts, words, k=1.0):
+        """
+        Add-k smoothed P(word | context) for each pair:
+        (count + k) / (context total + k * V). With k=0 unseen contexts get
+        a uniform distribution rather than 0/0.
+        """
+        _, totals = self._context_totals(contexts)
+        counts = self.count(contexts, words)
+        denominator = totals + k * self.vocab_size
+        uniform = 1 / self.vocab_size
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(denominator > 0, (counts + k) / denominator, uniform)
+
+    def sample(self, contexts, rng=None, k=1.0):
+        """
+        Draw one next word for each context from the add-k smoothed
+        distribution. The smoothed mass is a mix of the observed counts and
+        k for every word, so a draw either picks an observed n-gram in
+        proportion to its count or a uniformly random word.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        rows, totals = self._context_totals(contexts)
+        mass = totals + k * self.vocab_size
+        u = rng.random(len(rows)) * np.where(mass > 0, mass, self.vocab_size)
+        observed = u < totals
+        words = np.minimum(
+            ((u - totals) / (k if k > 0 else 1)).astype(np.int64),
+            self.vocab_size - 1,
+        )
+        words = np.where(mass > 0, words, u.astype(np.int64))
+        if observed.any():
+            targets = self._cumulative[self.indptr[rows[observed]]] + np.floor(
+                u[observed]
+            ).astype(np.int64)
+            index = np.searchsorted(self._cumulative, targets, "right") - 1
+            words[observed] = self.next_words[index]
+        return words
+
+    def generate(self, contexts, length, rng=None, k=1.0):
+        """
+        Extend a batch of starting contexts by `length` sampled words each.
+        Returns an int64 array of shape (batch, n - 1 + length).
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        contexts = np.asarray(contexts, dtype=np.int64).reshape(-1, self.n - 1)
+        out = [contexts]
+        window = contexts
+        for _ in range(length):
+            words = self.sample(window, rng, k)
+            out.append(words[:, None])
+            window = np.concatenate([window[:, 1:], words[:, None]], axis=1)
+        return np.concatenate(out, axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Count bigrams/trigrams of the token dataset."
+    )
+    parser.add_argument("-n", type=int, default=2, help="N-gram order.")
+    parser.add_argument("--dataset", default=None, help="Token dataset directory.")
+    parser.add_argument("--out", default=None, help="Output .npz file.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Counting processes (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=0,
+        help="Print this many words generated from the counts.",
+    )
+    args = parser.parse_args()
+    counts = count_ngrams(args.n, args.dataset, args.workers)
+    path = counts.save(args.out)
+    print(f"Saved {len(counts)} distinct {args.n}-grams to {path}")
+    if args.sample:
+        dataset = TokenDataset(args.dataset)
+        start = dataset.tokens[: args.n - 1].astype(np.int64)
+        words = counts.generate(start[None, :], args.sample)[0]
+        print(" ".join(dataset.decode(words)))
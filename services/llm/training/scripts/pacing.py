@@ -0,0 +1,272 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+from crawl_metrics import log, metrics
+
+
+# Answers worth retrying: the server is throttling us or briefly unwell.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Answers that mean "slow down"; other server errors are retried without
+# lowering the rate, since one failing page says little about the host's load.
+THROTTLE_STATUSES = frozenset({429, 503})
+# A body cut short after its headers raises ChunkedEncodingError.
+RETRY_EXCEPTIONS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def retry_after(response):
+    """
+    Seconds the server asked us to wait in a Retry-After header (either
+    delta-seconds or an HTTP date), or None.
+    """
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# -------------------------------------------------------------------
+class AdaptivePacer:
+    """
+    Per-host request pacing: a token bucket whose rate adapts AIMD-style.
+
+    Each success adds about `increase` requests/s per second of traffic (up
+    to `max_rate`). A throttling answer (429/503) or a failed connection cuts
+    the rate by `decrease` (down to `min_rate`), at most once per cool-down,
+    so a burst of concurrent failures counts as one signal.
+    While the smoothed latency is over `latency_factor` times the fastest seen,
+    the rate stops growing. A Retry-After header blocks the host until it
+    expires. With adaptive=False the bucket keeps its rate fixed.
+
+    The pacer starts at `max_rate`, the configured politeness ceiling, and
+    only backs off when the server pushes back. `wait()` paces a blocking
+    caller; `acquire()` paces a coroutine.
+    """
+
+    def __init__(
+        self,
+        max_rate=4.0,
+        min_rate=0.25,
+        burst=1,
+        adaptive=True,
+        increase=0.5,
+        decrease=0.5,
+        latency_factor=3.0,
+    ):
+        self.rate = max_rate
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.burst = burst
+        self.adaptive = adaptive
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency = None
+        self.fastest = None
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take the next request slot and return how long to wait for it.
+        Reservations queue up, so concurrent callers get successive slots.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(delay, self._blocked_until - now)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # ---------------------------------------------------------------
+    def record(self, status, latency=None, retry_after=None):
+        """
+        Feed back the outcome of one request: its HTTP status (None for a
+        failed connection), its latency and any Retry-After delay.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                self._tokens = min(self._tokens, 0)
+            if latency is not None:
+                self.latency = (
+                    latency
+                    if self.latency is None
+                    else 0.8 * self.latency + 0.2 * latency
+                )
+                self.fastest = min(self.fastest or latency, latency)
+            if not self.adaptive:
+                return
+            if status is None or status in THROTTLE_STATUSES:
+                cooldown = max(1.0, self.latency or 0.0)
+                if now - self._last_decrease >= cooldown:
+                    self._last_decrease = now
+                    old_rate = self.rate
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    log.info(
+                        "Pacing: %.2f -> %.2f requests/s after %s",
+                        old_rate,
+                        self.rate,
+                        f"HTTP {status}" if status else "a connection error",
+                    )
+            elif status not in RETRY_STATUSES and not self._congested():
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def _congested(self):
+        return (
+            self.latency is not None
+            and self.latency > 0.5
+            and self.latency > self.latency_factor * self.fastest
+        )
+
+
+class HostPacers:
+    """
+    One AdaptivePacer per host, created on first use with `settings`.
+    """
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._pacers = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._pacers:
+                self._pacers[host] = AdaptivePacer(**self.settings)
+            return self._pacers[host]
+
+
+class RetryPolicy:
+    """
+    Up to `retries` retries of a request that failed with a RETRY_STATUSES
+    answer or a connection error, after a "full jitter" exponential backoff:
+    a random delay of up to base_delay * 2**attempt, capped at max_delay.
+    A Retry-After header sets the least delay (capped at max_retry_after, as
+    is the time the host's pacer stays blocked).
+    """
+
+    def __init__(self, retries=4, base_delay=1.0, max_delay=60.0, max_retry_after=600):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, retry_after=None):
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after) + backoff / 4
+        return backoff
+
+    def outcome(self, pacer, url, attempt, latency, response=None, category=None):
+        """
+        Record one attempt (a response, or None for a connection error) with
+        the host's pacer and the crawl metrics. Returns the seconds to wait
+        before retrying, or None if the response should be returned (or the
+        error raised) as it is.
+        """
+        if response is None:
+            pacer.record(None, latency)
+            if attempt >= self.retries:
+                return None
+            delay = self.delay(attempt)
+            reason = "a connection error"
+        else:
+            wait = retry_after(response)
+            if wait is not None:
+                # Also bounds how long the pacer blocks the whole host.
+                wait = min(wait, self.max_retry_after)
+            pacer.record(response.status_code, latency, wait)
+            metrics.response(category, response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                return None
+            delay = self.delay(attempt, wait)
+            reason = f"HTTP {response.status_code}"
+        log.info("Retrying %s in %.1fs after %s", url, delay, reason)
+        metrics.retry(category)
+        return delay
+
+
+# -------------------------------------------------------------------
+class PacedSession:
+    """
+    Wraps a requests.Session so every GET waits for its host's pacer and is
+    retried per `policy`. Anything else is passed through to the session, so
+    it can be handed to ListingCache.get like a plain session.
+
+    get() takes an optional `category` that labels the crawl metrics (the
+    "wait" and "fetch" stages and the responses, per attempt). After
+    the last retry the final response is returned (or the last connection
+    error raised) so the caller can record the failure as before.
+    """
+
+    def __init__(self, session, pacers=None, policy=None):
+        self.session = session
+        self.pacers = pacers if pacers is not None else HostPacers()
+        self.policy = policy if policy is not None else RetryPolicy()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def get(self, url, category=None, **kwargs):
+        pacer = self.pacers.for_url(url)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            pacer.wait()
+            fetch_start = time.perf_counter()
+            metrics.observe("wait", fetch_start - start, category, start)
+            try:
+                with metrics.span("fetch", category):
+                    response = self.session.get(url, **kwargs)
+            except RETRY_EXCEPTIONS:
+                latency = time.perf_counter() - fetch_start
+                delay = self.policy.outcome(
+                    pacer, url, attempt, latency, None, category
+                )
+                if delay is None:
+                    raise
+            else:
+                latency = time.perf_counter() - fetch_start
+                delay = self.policy.outcome(
+                    pacer, url, attempt, latency, response, category
+                )
+                if delay is None:
+                    return response
+                response.close()
+            attempt += 1
+            time.sleep(delay)
@@ -1,9 +1,21 @@
+import argparse
 import os
 import re
 import time
-import requests
 from bs4 import BeautifulSoup
-from striprtf.striprtf import rtf_to_text
+from case_pipeline import CaseFileWriter, CaseJob, CasePipeline
+from corpus_store import CorpusWriter
+from crawl_metrics import (
+    MetricsReporter,
+    configure_logging,
+    log,
+    metrics,
+    response_size,
+)
+from crawl_manifest import CrawlManifest, case_key, category_code
+from http_cache import ListingCache, create_session
+from link_extractor import extract_page
+from pacing import HostPacers, PacedSession, RetryPolicy
 from urllib.parse import urljoin
 import random
 
@@ -23,7 +35,7 @@ def extrude_href(target_HTML=""):
     """
     Extract hrefs and category titles from <a> elements with class "link-secondary".
     """
-    print("==== ExtractING HREFS and TITLES FROM PROVIDED HTML ====")
+    log.info("==== ExtractING HREFS and TITLES FROM PROVIDED HTML ====")
     soup = BeautifulSoup(target_HTML, "html.parser")
     links = soup.find_all("a", class_="link-secondary")
     results = []
@@ -31,21 +43,13 @@ def extrude_href(target_HTML=""):
         href = link.get("href")
         title = link.text.strip()
         results.append((href, title))
-        print(f"  -> Extracted: href='{href}' | title='{title}'")
+        log.debug("  -> Extracted: href='%s' | title='%s'", href, title)
     return results
 
 
 # -------------------------------------------------------------------
 def get_year_links(html):
-    soup = BeautifulSoup(html, "html.parser")
-    year_links = []
-    for link in soup.find_all("a", href=True):
-        # Check both text and href for year patterns
-        if re.search(r"\b(19|20)\d{2}\b", link.text) or re.search(
-            r"\b(19|20)\d{2}\b", link["href"]
-        ):
-            year_links.append(link.get("href"))
-    return year_links
+    return extract_page(html).year_links
 
 
 def get_month_links(html):
@@ -53,91 +57,96 @@ def get_month_links(html):
     Parse the given HTML and return a list of month links.
     This example uses a regex that matches month names.
     """
-    print("==== ExtractING MONTH LINKS ====")
-    soup = BeautifulSoup(html, "html.parser")
-    month_links = []
-    for li in soup.find_all("li", class_="make-database"):
-        link = li.find("a", href=True)
-        if link and re.search(
-            r"\b(January|February|March|April|May|June|July|August|September|October|November|December)\b",
-            link.text,
-            re.IGNORECASE,
-        ):
-            month_links.append(link.get("href"))
-    return month_links
+    log.debug("==== ExtractING MONTH LINKS ====")
+    return extract_page(html).month_links
 
 
 def get_case_links(html):
-    soup = BeautifulSoup(html, "html.parser")
-    case_links = []
-    # Look for any element that could logically contain case links
-    containers = soup.find_all(
-        ["div", "ul", "ol", "table"], class_=re.compile(r"case-list|results")
-    )
-    for container in containers:
-        for link in container.find_all("a", href=True):
-            href = link["href"]
-            if re.search(r"\d{4}/\d+\.html", href):
-                case_links.append(href)
-    return case_links
+    return extract_page(html).case_links
 
 
 def get_rtf_link(html):
-    soup = BeautifulSoup(html, "html.parser")
-    # First, check for hrefs ending with .rtf
-    rtf_anchor = soup.find("a", href=re.compile(r"\.rtf$", re.IGNORECASE))
-    # If not found, check for "RTF" in link text
-    if not rtf_anchor:
-        rtf_anchor = soup.find("a", string=re.compile(r"\bRTF\b", re.IGNORECASE))
-    # If still not found, check for "Download" or "Document" links
-    if not rtf_anchor:
-        rtf_anchor = soup.find(
-            "a", href=re.compile(r"download|document", re.IGNORECASE)
-        )
-    return rtf_anchor.get("href") if rtf_anchor else None
+    # Prefers an href ending in .rtf, then an "RTF" link text, then a
+    # download/document href (see PageLinks.rtf_link).
+    return extract_page(html).rtf_link
 
 
 # -------------------------------------------------------------------
-def process_subdirectories(base_url="", extracted=None):
+def get_target_folder(title):
     """
-    Process each category using the order given by the extracted (href, title) pairs.
+    Return the data/<category title> folder that a category's cases are written to.
     """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    training_dir = os.path.dirname(script_dir)
+    return os.path.join(training_dir, "data", title)
+
 
-    print("==== BASE URL:", base_url)
-    print(f"==== Processing {len(extracted)} category links (by order). ====")
+# -------------------------------------------------------------------
+def process_subdirectories(
+    base_url="",
+    extracted=None,
+    manifest=None,
+    session=None,
+    listing_cache=None,
+    pipeline=None,
+    output=None,
+    delay=None,
+    pacers=None,
+    policy=None,
+):
+    """
+    Process each category using the order given by the extracted (href, title) pairs.
+    Cases the manifest already records as finished are skipped before any request.
+    All requests share one keep-alive session; category and year listing pages
+    go through the on-disk conditional-request cache. With a CasePipeline, RTF
+    conversion and writing run on its workers instead of inline. Cases go to
+    `output`: loose .txt files by default, or a corpus_store.CorpusWriter.
+    Progress goes to the "crawler" logger and timings and counts to
+    crawl_metrics.metrics, labelled with the category code.
+
+    Requests are paced per host by `pacers` (a pacing.HostPacers), which slows
+    down when the site answers 429/5xx and speeds back up on success, and
+    transient failures are retried per `policy` (a pacing.RetryPolicy), so a
+    brief outage no longer costs cases. A `delay` (min, max) range adds a
+    random pause after each case on top of the pacing.
+    """
+    if manifest is None:
+        manifest = CrawlManifest()
+    if session is None:
+        session = create_session(HEADERS)
+    if not isinstance(session, PacedSession):
+        session = PacedSession(session, pacers, policy)
+    if listing_cache is None:
+        listing_cache = ListingCache()
+    if output is None:
+        output = CaseFileWriter()
+
+    log.info("==== BASE URL: %s", base_url)
+    log.info("==== Processing %d category links (by order). ====", len(extracted))
     for idx, (href, title) in enumerate(extracted):
         category_url = urljoin(base_url, href)
-        print("\n############################################################")
-        print(f"### Processing Category URL: {category_url}")
-        print(f"### Category Title: {title}")
-        print("############################################################")
-
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        training_dir = os.path.dirname(script_dir)
-        target_folder = os.path.join(training_dir, "data", title)
-        os.makedirs(target_folder, exist_ok=True)
-
-        if not os.path.exists(target_folder):
-            print(f"!!! Subdirectory does not exist: {target_folder}")
-            continue
+        code = category_code(href)
+        log.info("### Processing Category URL: %s (%s)", category_url, title)
+
+        target_folder = get_target_folder(title)
 
         try:
-            cat_response = requests.get(
-                category_url, headers=HEADERS, allow_redirects=True
+            cat_response = listing_cache.get(
+                session, category_url, allow_redirects=True, category=code
             )
-            print(f"Response status: {cat_response.status_code}")
             if cat_response.status_code != 200:
-                print(f"Failed to fetch category page: {category_url}")
+                log.warning("Failed to fetch category page: %s", category_url)
                 continue
             cat_html = cat_response.text
-            print(f"+++ Category page HTML snippet: {cat_html[:10]} +++")
         except Exception as e:
-            print(f"!!! Error processing {category_url}: {e}")
+            metrics.error(code, "fetch")
+            log.warning("!!! Error processing %s: %s", category_url, e)
             continue
 
-        year_links = get_year_links(cat_html)
+        with metrics.span("parse", code):
+            year_links = get_year_links(cat_html)
         if not year_links:
-            print("!!! No year links found on category page.")
+            log.warning("!!! No year links found on category page %s", category_url)
             continue
 
         for y_href in year_links:
@@ -148,99 +157,146 @@ def process_subdirectories(base_url="", extracted=None):
                 else y_href
             )
             try:
-                year_response = requests.get(year_url, headers=HEADERS)
+                year_response = listing_cache.get(session, year_url, category=code)
                 if year_response.status_code != 200:
-                    print(f"!!! Failed to fetch year page: {year_url}")
+                    log.warning("!!! Failed to fetch year page: %s", year_url)
                     continue
                 year_html = year_response.text
             except Exception as e:
-                print(f"!!! Error fetching year page {year_url}: {e}")
+                metrics.error(code, "fetch")
+                log.warning("!!! Error fetching year page %s: %s", year_url, e)
                 continue
 
-            month_links = get_month_links(year_html)
+            with metrics.span("parse", code):
+                month_links = get_month_links(year_html)
             if not month_links:
-                print("❌  No month links found on year page.")
+                log.warning("❌  No month links found on year page %s", year_url)
                 continue
 
             total_files_year = len(month_links)
             remaining_files_year = total_files_year
-            print("\n****************************************************")
-            print(f"*** Processing Year Page: {year_url}")
-            print(f"*** {total_files_year} case files found for this year")
-            print("****************************************************\n")
+            log.info(
+                "*** %d case files found for year page %s", total_files_year, year_url
+            )
 
             for file_href in month_links:
-                print(
-                    f"+++ {remaining_files_year} case files remaining for year page {year_url} +++"
-                )
                 file_url = urljoin(year_url + "/", file_href)
+                case_id = None
                 try:
-                    file_response = requests.get(file_url, headers=HEADERS)
+                    case_id = case_key(file_url)
+                    if manifest.is_complete(code, case_id):
+                        log.debug("❌ Case %s/%s already in manifest", code, case_id)
+                        metrics.case(code, "skipped")
+                        remaining_files_year -= 1
+                        continue
+                    manifest.mark_started(code, case_id, file_url)
+
+                    file_response = session.get(file_url, category=code)
                     if file_response.status_code != 200:
-                        print(f"!!! Failed to fetch case url: {file_url}")
+                        log.warning("!!! Failed to fetch case url: %s", file_url)
+                        manifest.mark_failed(
+                            code, case_id, f"HTTP {file_response.status_code}"
+                        )
+                        metrics.case(code, "failed")
                         remaining_files_year -= 1
                         continue
                     file_html = file_response.text
-                    soup = BeautifulSoup(file_html, "html.parser")
-                    case_name = soup.title.string if soup.title else f"case_{idx}"
-                    case_name = re.sub(r'[\/:*?"<>|]', "_", case_name)
+                    with metrics.span("parse", code):
+                        page = extract_page(file_html)
+                    case_title = page.title if page.has_title else f"case_{idx}"
+                    case_name = re.sub(r'[\/:*?"<>|]', "_", case_title)
 
                     # Check if output file already exists before proceeding.
-                    case_id = (
-                        re.search(r"\d+\.html$", file_url).group().replace(".html", "")
-                    )
-                    safe_case_id = f"case_{case_id}"
                     file_name = os.path.join(target_folder, f"{case_name}.txt")
-                    if os.path.exists(file_name):
-                        print(f"❌ File {file_name} already exists, skipping...")
+                    stored = output.find(code, case_id, file_name)
+                    if stored is not None:
+                        log.debug("❌ %s already exists, skipping", stored.output_path)
+                        manifest.mark_stored(code, case_id, None, stored)
+                        metrics.case(code, "skipped")
                         remaining_files_year -= 1
                         continue
 
-                    rtf_href = get_rtf_link(file_html)
+                    rtf_href = page.rtf_link
                     if not rtf_href:
-                        print("❌      No RTF link found on case page.")
+                        log.debug("❌ No RTF link found on case page %s", file_url)
+                        manifest.mark_no_rtf(code, case_id)
+                        metrics.case(code, "no_rtf")
                         remaining_files_year -= 1
                         continue
 
                     rtf_url = urljoin(file_url, rtf_href)
-                    print(f"+++ Downloading RTF file: {rtf_url} +++")
+                    log.debug("+++ Downloading RTF file: %s +++", rtf_url)
                     try:
-                        rtf_response = requests.get(rtf_url, headers=HEADERS)
-                        print(
-                            f"+++ RTF Response Status: {rtf_response.status_code} +++"
+                        # Without the pipeline the RTF is converted while it
+                        # downloads, so it is never held in memory whole.
+                        rtf_response = session.get(
+                            rtf_url, category=code, stream=pipeline is None
                         )
+                        if pipeline is not None:
+                            rtf_content = rtf_response.text
                         if rtf_response.status_code != 200:
-                            print(f"!!! Failed to download RTF file: {rtf_url}")
+                            log.warning("!!! Failed to download RTF file: %s", rtf_url)
+                            rtf_response.close()
+                            manifest.mark_failed(
+                                code, case_id, f"RTF HTTP {rtf_response.status_code}"
+                            )
+                            metrics.case(code, "failed")
                             remaining_files_year -= 1
                             continue
-                        rtf_content = rtf_response.text
-                        print(f"        RTF Content Length: {len(rtf_content)}")
                     except Exception as e:
-                        print(f"!!! Error downloading RTF file {rtf_url}: {e}")
+                        log.warning("!!! Error downloading RTF file %s: %s", rtf_url, e)
+                        manifest.mark_failed(code, case_id, e)
+                        metrics.error(code, "fetch")
+                        metrics.case(code, "failed")
                         remaining_files_year -= 1
                         continue
 
-                    try:
-                        case_text = rtf_to_text(rtf_content)
-                    except Exception as e:
-                        print(f"        Error converting RTF to text: {e}")
-                        continue
-
-                    try:
-                        with open(file_name, "w", encoding="utf-8") as f:
-                            f.write(case_text)
-                        print(f"✅✅✅+++ Written file: {file_name} +++")
-                    except Exception as e:
-                        print(f"!!! Error writing file {file_name}: {e}")
+                    job = CaseJob(
+                        code, case_id, rtf_url, file_name, case_title, title, None
+                    )
+                    if pipeline is not None:
+                        # Conversion and writing happen on the pipeline's workers.
+                        pipeline.submit(
+                            job._replace(
+                                rtf_content=rtf_content,
+                                rtf_bytes=response_size(rtf_response),
+                            )
+                        )
+                    else:
+                        try:
+                            with metrics.span("stream", code):
+                                stored = output.save_stream(job, rtf_response)
+                            manifest.mark_stored(code, case_id, rtf_url, stored)
+                            metrics.case(
+                                code,
+                                "stored",
+                                response_size(rtf_response),
+                                stored.byte_size,
+                            )
+                            log.debug("✅ Written file: %s", stored.output_path)
+                        except Exception as e:
+                            log.warning(
+                                "!!! Error converting RTF file %s: %s", rtf_url, e
+                            )
+                            manifest.mark_failed(code, case_id, e)
+                            metrics.error(code, "stream")
+                            metrics.case(code, "failed")
 
                     remaining_files_year -= 1
-                    print(
-                        f"=== {remaining_files_year} case files remaining for year page {year_url} ==="
+                    log.debug(
+                        "=== %d case files remaining for year page %s ===",
+                        remaining_files_year,
+                        year_url,
                     )
-                    time.sleep(random.uniform(1, 3))
+                    if delay:
+                        time.sleep(random.uniform(*delay))
 
                 except Exception as e:
-                    print(f"!!! Error fetching file page {file_url}: {e}")
+                    log.warning("!!! Error fetching file page %s: %s", file_url, e)
+                    metrics.error(code, "case")
+                    if case_id is not None:
+                        manifest.mark_failed(code, case_id, e)
+                        metrics.case(code, "failed")
                     remaining_files_year -= 1
                     continue
 
@@ -289,9 +345,138 @@ def process_subdirectories(base_url="", extracted=None):
 #                     <tr><td><a href="/za/cases/ZAKZPHC" class="link-secondary">South Africa: Kwazulu-Natal High Court, Pietermaritzburg</a></td></tr>
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape SAFLII judgments to text.")
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="Use the original one-request-at-a-time crawler.",
+    )
+    parser.add_argument(
+        "--base-url",
+        default="https://www.saflii.org",
+        help="Site to crawl, e.g. a local replay_server.py for offline runs.",
+    )
+    parser.add_argument(
+        "--delay",
+        type=float,
+        nargs=2,
+        metavar=("MIN", "MAX"),
+        default=None,
+        help="Extra random pause in seconds after each case, on top of the "
+        "adaptive pacing (sequential mode).",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=16,
+        help="Maximum requests in flight across all hosts (async mode).",
+    )
+    parser.add_argument(
+        "--per-host-concurrency",
+        type=int,
+        default=4,
+        help="Maximum requests in flight per host (async mode).",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=4.0,
+        help="Highest sustained requests per second per host; the pacing starts "
+        "here and backs off when the site answers 429/5xx.",
+    )
+    parser.add_argument(
+        "--min-rate",
+        type=float,
+        default=0.25,
+        help="Lowest requests per second per host the pacing backs off to.",
+    )
+    parser.add_argument(
+        "--fixed-rate",
+        action="store_true",
+        help="Keep the request rate at --rate instead of adapting it.",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=8,
+        help="Token bucket size, i.e. the largest burst per host (async mode).",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=4,
+        help="Retries of a request that got 429/5xx or failed to connect.",
+    )
+    parser.add_argument(
+        "--output",
+        choices=("store", "files"),
+        default="store",
+        help="Write cases to the packed corpus store, or as one .txt file per case.",
+    )
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="Corpus store directory (default: training/data/corpus_store).",
+    )
+    parser.add_argument(
+        "--no-pipeline",
+        action="store_true",
+        help="Convert and write each case inline instead of on pipeline workers.",
+    )
+    parser.add_argument(
+        "--convert-workers",
+        type=int,
+        default=None,
+        help="RTF conversion processes (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--write-workers",
+        type=int,
+        default=2,
+        help="Threads writing converted cases to disk.",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=64,
+        help="Cases buffered between pipeline stages before fetching pauses.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbosity",
+        type=int,
+        choices=(0, 1, 2, 3),
+        default=1,
+        help="0: warnings and errors, 1: + periodic metrics summary, 2: + category and "
+        "year progress, 3: + one line per case.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Keep crawl metrics in this file: JSON if it ends in .json, "
+        "Prometheus text format otherwise.",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=30.0,
+        help="Seconds between metrics summaries and metrics file updates.",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="Write every fetch/parse/convert/write span to this Chrome "
+        "trace-event JSON file (chrome://tracing, ui.perfetto.dev).",
+    )
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     # Base URL for building absolute URLs
-    base_url = "https://www.saflii.org"
+    base_url = args.base_url
 
     target_HTML = """<table class="table table-striped table-bordered rounded">
                     <tbody> 
@@ -345,9 +530,75 @@ def main():
                     </tbody>
                   </table>"""
 
-    print("=== Starting extraction of HREFs from provided table ===")
+    configure_logging(args.verbosity)
+    if args.trace:
+        metrics.start_trace(args.trace)
+    log.info("=== Starting extraction of HREFs from provided table ===")
     extracted = extrude_href(target_HTML)
-    process_subdirectories(base_url, extracted)
+    manifest = CrawlManifest()
+    if args.output == "store":
+        output = CorpusWriter(args.store)
+    else:
+        output = CaseFileWriter()
+    pipeline = None
+    if not args.no_pipeline:
+        pipeline = CasePipeline(
+            manifest,
+            output=output,
+            convert_workers=args.convert_workers,
+            write_workers=args.write_workers,
+            queue_size=args.queue_size,
+        )
+
+    try:
+        with MetricsReporter(args.metrics_interval, args.metrics_file):
+            if args.sequential:
+                process_subdirectories(
+                    base_url,
+                    extracted,
+                    manifest=manifest,
+                    pipeline=pipeline,
+                    output=output,
+                    delay=args.delay,
+                    pacers=HostPacers(
+                        max_rate=args.rate,
+                        min_rate=args.min_rate,
+                        adaptive=not args.fixed_rate,
+                    ),
+                    policy=RetryPolicy(args.retries),
+                )
+            else:
+                from async_crawler import process_subdirectories_async
+
+                process_subdirectories_async(
+                    base_url,
+                    extracted,
+                    max_concurrency=args.max_concurrency,
+                    per_host_concurrency=args.per_host_concurrency,
+                    rate=args.rate,
+                    burst=args.burst,
+                    manifest=manifest,
+                    pipeline=pipeline,
+                    output=output,
+                    min_rate=args.min_rate,
+                    adaptive=not args.fixed_rate,
+                    retries=args.retries,
+                )
+            if pipeline is not None:
+                # Inside the reporter, so the last summary includes the drain.
+                pipeline.close()
+                log.info(
+                    "==== Pipeline wrote %d case files ====", pipeline.cases_written
+                )
+    except KeyboardInterrupt:
+        if pipeline is not None:
+            pipeline.abort()
+        output.close()
+        raise
+    finally:
+        metrics.close()
+    output.close()
+    manifest.close()
 
 
 if __name__ == "__main__":
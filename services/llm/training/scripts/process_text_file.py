@@ -1,6 +1,18 @@
+import argparse
+import functools
 import os
 import re
 import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus_state import CorpusState, hash_file
+from corpus_store import CorpusReader, get_default_store_path
+
+# The same judgment's key in the corpus store (SAFLII's [1995] ZACC 3).
+INPUT_CASE_KEY = ("ZACC", "1995/3")
+
+NON_LETTERS = re.compile(r"[^a-zA-Z]")
 
 
 def get_input_file_path():
@@ -20,62 +32,73 @@ def get_input_file_path():
     return file_path
 
 
+def get_data_dir():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), "data")
+
+
+def read_input_text():
+    """
+    Return the document's text: the loose .txt file if it exists, otherwise the
+    copy in the packed corpus store.
+    """
+    input_file = get_input_file_path()
+    if os.path.exists(input_file):
+        with open(input_file, "r", encoding="utf-8") as f:
+            return f.read()
+    with CorpusReader() as reader:
+        text = reader.get(*INPUT_CASE_KEY)
+    if text is None:
+        raise FileNotFoundError(input_file)
+    return text
+
+
+# Judgments reuse a small vocabulary over and over, so each distinct raw word
+# is cleaned once per process.
+@functools.lru_cache(maxsize=1 << 20)
 def clean_word(word):
     """
     Removes ALL types of punctuation and special characters from a word.
     Keeps only letters (no numbers) and discards single-letter words.
     """
-    # First, normalize unicode characters
-    word = unicodedata.normalize("NFKD", word)
+    # First, normalize unicode characters (a no-op for plain ASCII)
+    if not word.isascii():
+        word = unicodedata.normalize("NFKD", word)
 
     # Remove any non-letter characters (keeps only a-z and A-Z)
-    cleaned = re.sub(r"[^a-zA-Z]", "", word)
+    cleaned = NON_LETTERS.sub("", word)
 
     # Return cleaned word only if it's longer than 1 character
-    cleaned = cleaned.strip()
     return cleaned if len(cleaned) > 1 else ""
 
 
+def count_words(text):
+    """
+    Return a Counter of the cleaned words in `text`. Like every dict it keeps
+    first-occurrence order, so its keys are the document's unique words in order.
+    """
+    counts = Counter(map(clean_word, text.split()))
+    # Words that cleaned away to nothing.
+    counts.pop("", None)
+    return counts
+
+
 def process_text_file():
     """
-    Reads the document, writes all words to lines, then removes duplicates.
-    Excludes single-letter words.
+    Reads the document and writes its unique words, one per line, in order of
+    first appearance. Excludes single-letter words.
     """
     input_file = get_input_file_path()
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    temp_file = os.path.join(script_dir, "corpus", "temp.txt")
     final_file = os.path.join(script_dir, "corpus", "processed_makwanyane.txt")
 
     try:
-        # Read the input file and process each word
-        with open(input_file, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        # Write all words to temporary file
-        with open(temp_file, "w", encoding="utf-8") as f:
-            for word in text.split():
-                cleaned_word = clean_word(word)
-                if (
-                    cleaned_word
-                ):  # Only write non-empty words (and longer than 1 letter)
-                    f.write(cleaned_word + "\n")
-
-        # Read all words, remove duplicates, and write to final file
-        seen_words = set()
-        with open(temp_file, "r", encoding="utf-8") as infile, open(
-            final_file, "w", encoding="utf-8"
-        ) as outfile:
-            for line in infile:
-                word = line.strip()
-                if word not in seen_words:
-                    outfile.write(line)
-                    seen_words.add(word)
-
-        # Remove temporary file
-        os.remove(temp_file)
+        # Read the input file and count its cleaned words in one pass
+        counts = count_words(read_input_text())
+        write_vocabulary(counts, final_file)
 
         print(
-            f"Processing complete. {len(seen_words)} unique words written to {final_file}"
+            f"Processing complete. {len(counts)} unique words written to {final_file}"
         )
         print("All punctuation, special characters, and numbers have been removed.")
         print("Single-letter words have been discarded.")
@@ -88,5 +111,230 @@ def process_text_file():
         print(f"An error occurred: {str(e)}")
 
 
+def write_vocabulary(counts, vocab_file, freq_file=None):
+    """
+    Write the unique words one per line (the format of the corpus/*.txt files
+    used by the notebooks) and, optionally, "word<TAB>count" lines.
+    """
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        for word in counts:
+            f.write(word + "\n")
+    if freq_file:
+        with open(freq_file, "w", encoding="utf-8") as f:
+            for word, count in counts.items():
+                f.write(f"{word}\t{count}\n")
+
+
+# -------------------------------------------------------------------
+# Corpus mode
+def list_corpus_documents(source="auto", data_dir=None, store_path=None):
+    """
+    Return the documents to process, in a fixed order, as (kind, store path,
+    reference) items: ("store", path, CorpusDocument) for the corpus store or
+    ("file", None, path) for data/<category>/<case>.txt files. With
+    source="auto" the store is used when it exists.
+    """
+    data_dir = data_dir or get_data_dir()
+    store_path = store_path or get_default_store_path()
+    if source == "auto":
+        has_store = os.path.exists(os.path.join(store_path, "index.sqlite3"))
+        source = "store" if has_store else "files"
+    if source == "store":
+        with CorpusReader(store_path) as reader:
+            documents = reader.documents()
+        return [("store", store_path, document) for document in documents]
+
+    paths = []
+    for collection in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, collection)
+        if not os.path.isdir(folder):
+            continue
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith(".txt"):
+                paths.append(("file", None, os.path.join(folder, file_name)))
+    return paths
+
+
+def document_key(item):
+    """
+    A stable name for a list_corpus_documents item: "category/case_id" for
+    the corpus store, "<category title>/<case title>.txt" for loose files.
+    """
+    kind, _, ref = item
+    if kind == "store":
+        return f"{ref.category}/{ref.case_id}"
+    return os.path.relpath(ref, os.path.dirname(os.path.dirname(ref)))
+
+
+_reader = None
+
+
+def read_corpus_document(item):
+    """
+    Return the text of one item from list_corpus_documents. Store reads go
+    through a per-process CorpusReader, so this is cheap to call in workers.
+    """
+    global _reader
+    kind, store_path, ref = item
+    if kind == "store":
+        if _reader is None or _reader.path != store_path:
+            _reader = CorpusReader(store_path)
+        return _reader.read(ref)
+    with open(ref, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _count_documents(batch):
+    # Runs in a worker: the documents are read there and counted into one
+    # Counter, so only a single merged Counter per batch travels back.
+    counts = Counter()
+    for item in batch:
+        counts.update(count_words(read_corpus_document(item)))
+    return counts
+
+
+def split_batches(documents, workers, batches_per_worker=4, max_size=None):
+    """
+    Split `documents` into runs of consecutive items, about
+    `batches_per_worker` runs per worker and at most `max_size` items each.
+    """
+    size = max(1, -(-len(documents) // (workers * batches_per_worker)))
+    if max_size:
+        size = min(size, max_size)
+    return [documents[i : i + size] for i in range(0, len(documents), size)]
+
+
+def count_corpus(documents, workers=None, batches_per_worker=4):
+    """
+    Count cleaned words over every document on a process pool. Each worker
+    counts a run of consecutive documents and the runs are merged in order, so
+    the returned Counter's keys are the corpus-wide unique words in order of
+    first appearance.
+    """
+    workers = workers or os.cpu_count() or 1
+    batches = split_batches(documents, workers, batches_per_worker)
+    totals = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for counts in executor.map(_count_documents, batches):
+            totals.update(counts)
+    return totals
+
+
+def _count_each(batch):
+    # Runs in a worker: one Counter per document, for the incremental state.
+    return [count_words(read_corpus_document(item)) for item in batch]
+
+
+def refresh_corpus(documents, state, workers=None):
+    """
+    Bring a CorpusState up to date with `documents`, counting only documents
+    that are new or whose content hash changed. Loose files whose size and
+    mtime are unchanged are not even hashed; store documents carry their hash
+    in the store index. Returns (changed, removed) document counts.
+    """
+    known = state.fingerprints()
+    changed = []
+    seen = set()
+    for item in documents:
+        key = document_key(item)
+        seen.add(key)
+        kind, _, ref = item
+        old = known.get(key)
+        if kind == "store":
+            file_size = file_mtime = None
+            sha256 = ref.sha256
+        else:
+            stat = os.stat(ref)
+            file_size, file_mtime = stat.st_size, stat.st_mtime
+            if old and old[1:] == (file_size, file_mtime):
+                continue
+            sha256 = hash_file(ref)
+        if old and old[0] == sha256:
+            if kind != "store":
+                state.touch(key, file_size, file_mtime)
+            continue
+        changed.append((item, key, sha256, file_size, file_mtime))
+    removed = [key for key in known if key not in seen]
+
+    updates = []
+    if changed:
+        workers = workers or os.cpu_count() or 1
+        batches = split_batches(changed, workers, max_size=64)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                _count_each, [[entry[0] for entry in batch] for batch in batches]
+            )
+            for batch, batch_counts in zip(batches, results):
+                for (_, key, sha256, size, mtime), counts in zip(batch, batch_counts):
+                    updates.append((key, sha256, size, mtime, counts))
+    state.apply(updates, removed)
+    return len(changed), len(removed)
+
+
+def process_corpus(
+    source="auto",
+    workers=None,
+    data_dir=None,
+    store_path=None,
+    incremental=False,
+    state_path=None,
+):
+    """
+    Corpus-wide counterpart of process_text_file: every scraped judgment,
+    tokenized in parallel, written as corpus/processed_corpus.txt (unique words)
+    and corpus/word_frequencies.tsv. With `incremental`, only documents that
+    changed since the last incremental run are tokenized (see CorpusState).
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    vocab_file = os.path.join(script_dir, "corpus", "processed_corpus.txt")
+    freq_file = os.path.join(script_dir, "corpus", "word_frequencies.tsv")
+
+    documents = list_corpus_documents(source, data_dir, store_path)
+    print(f"Processing {len(documents)} documents...")
+    if incremental:
+        with CorpusState(state_path) as state:
+            changed, removed = refresh_corpus(documents, state, workers=workers)
+            counts = Counter(dict(state.word_counts()))
+        print(f"{changed} new or modified documents, {removed} removed")
+    else:
+        counts = count_corpus(documents, workers=workers)
+    write_vocabulary(counts, vocab_file, freq_file)
+    print(
+        f"Processing complete. {len(counts)} unique words "
+        f"({sum(counts.values())} total) written to {vocab_file}"
+    )
+    print(f"Word frequencies written to {freq_file}")
+    return counts
+
+
 if __name__ == "__main__":
-    process_text_file()
+    parser = argparse.ArgumentParser(description="Clean and deduplicate judgment text.")
+    parser.add_argument(
+        "--corpus",
+        action="store_true",
+        help="Process every scraped document instead of the Makwanyane judgment.",
+    )
+    parser.add_argument(
+        "--source",
+        choices=("auto", "store", "files"),
+        default="auto",
+        help="Read the corpus store or the loose data/ files "
+        "(default: the store if it exists).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Tokenizer processes (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only tokenize documents added or changed since the last "
+        "incremental run (state in corpus/corpus_state.sqlite3).",
+    )
+    args = parser.parse_args()
+    if args.corpus:
+        process_corpus(args.source, args.workers, incremental=args.incremental)
+    else:
+        process_text_file()
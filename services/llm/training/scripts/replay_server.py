@@ -0,0 +1,515 @@
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlparse
+
+
+# Statuses injected by default; 429 and 503 carry a Retry-After header, and
+# "reset" closes the connection without a response. "truncate" (not injected
+# by default) promises the whole page but hangs up halfway through its body.
+ERROR_STATUSES = (500, 503, 429, "reset")
+
+
+def get_default_fixture_dir():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    training_dir = os.path.dirname(script_dir)
+    return os.path.join(training_dir, "data", "replay_fixtures")
+
+
+def fixture_path(fixture_dir, url_path):
+    """
+    Map a URL path to its file in the fixture tree: "/za/cases/ZACC/2023/1.rtf"
+    is stored as-is, and directory-like paths ("/za/cases/ZACC/", or ones
+    without an extension) as their index.html. Duplicate slashes, "." and ".."
+    are normalized away, so the crawler's joined URLs all land on one file.
+    """
+    path = posixpath.normpath("/" + urlparse(url_path).path).lstrip("/")
+    if path in ("", "."):
+        path = "index.html"
+    elif not posixpath.splitext(path)[1]:
+        path = posixpath.join(path, "index.html")
+    return os.path.join(fixture_dir, *path.split("/"))
+
+
+def read_categories(fixture_dir):
+    """
+    The (href, title) category pairs a fixture tree was recorded for, in the
+    shape preprocess_data.extrude_href returns.
+    """
+    with open(os.path.join(fixture_dir, "categories.json"), encoding="utf-8") as f:
+        return [tuple(pair) for pair in json.load(f)]
+
+
+# -------------------------------------------------------------------
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, each response
+    # would stall ~40 ms on the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        replay = self.server.replay
+        replay._begin()
+        try:
+            self._serve(replay)
+        finally:
+            replay._end()
+
+    def _serve(self, replay):
+        delay, error = replay._next_fault()
+        if delay:
+            time.sleep(delay)
+        if error == "reset":
+            replay._count("reset")
+            self.close_connection = True
+            return
+        if error is not None and error != "truncate":
+            replay._count(error)
+            self.send_response(error)
+            if error in (429, 503):
+                self.send_header("Retry-After", str(replay.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        path = fixture_path(replay.fixture_dir, self.path)
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            replay._count(404)
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            replay._count(304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if error == "truncate":
+            replay._count(error)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+
+        replay._count(200)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type == "text/html":
+            content_type += "; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        if not replay.bandwidth:
+            self.wfile.write(body)
+            return
+        chunk_size = 64 * 1024
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start : start + chunk_size]
+            time.sleep(len(chunk) / replay.bandwidth)
+            self.wfile.write(chunk)
+
+
+class ReplayServer:
+    """
+    Local stand-in for saflii.org that serves a recorded (or synthesized)
+    fixture tree over HTTP, so the crawlers can be run and benchmarked offline.
+
+    Every request waits `latency` plus up to `jitter` seconds. With
+    `error_rate`, that fraction of requests gets a status from
+    `error_statuses` instead of the page. `bandwidth` (bytes per second)
+    throttles bodies, and `peak_concurrency` records the most requests served
+    at once. Pages carry ETags and answer If-None-Match with a 304,
+    like the real site, so the listing cache behaves as it does in production.
+    Faults are drawn from a generator seeded with `seed`, so a run can be
+    repeated exactly.
+
+        with ReplayServer(fixture_dir, latency=0.05) as server:
+            process_subdirectories(server.url, read_categories(fixture_dir))
+    """
+
+    def __init__(
+        self,
+        fixture_dir=None,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        error_statuses=ERROR_STATUSES,
+        retry_after=1,
+        bandwidth=None,
+        seed=0,
+    ):
+        self.fixture_dir = fixture_dir or get_default_fixture_dir()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.bandwidth = bandwidth
+        self.counts = {}
+        self.peak_concurrency = 0
+        self._in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _ReplayHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.replay = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _next_fault(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            error = None
+            if self.error_rate and self._random.random() < self.error_rate:
+                error = self._random.choice(self.error_statuses)
+        return delay, error
+
+    def _begin(self):
+        with self._lock:
+            self._in_flight += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._in_flight)
+
+    def _end(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _count(self, status):
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+# -------------------------------------------------------------------
+def record_fixtures(
+    base_url,
+    categories,
+    fixture_dir=None,
+    max_years=1,
+    max_cases=5,
+    delay=(1, 3),
+):
+    """
+    Capture a small slice of the live site into a fixture tree: for each
+    (href, title) category, its listing page, the first `max_years` year
+    pages and the first `max_cases` case pages and RTFs of each year, following
+    links exactly as process_subdirectories does. Sleeps a random `delay`
+    between requests, like the sequential crawler.
+    """
+    from http_cache import create_session
+    from link_extractor import extract_page
+    from preprocess_data import HEADERS
+
+    fixture_dir = fixture_dir or get_default_fixture_dir()
+    session = create_session(HEADERS)
+
+    def fetch(url):
+        if delay:
+            time.sleep(random.uniform(*delay))
+        response = session.get(url)
+        if response.status_code != 200:
+            print(f"!!! HTTP {response.status_code} for {url}")
+            return None
+        path = fixture_path(fixture_dir, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(response.content)
+        return response.text
+
+    recorded = []
+    for href, title in categories:
+        category_url = urljoin(base_url, href)
+        html = fetch(category_url)
+        if html is None:
+            continue
+        recorded.append((href, title))
+        for y_href in extract_page(html).year_links[:max_years]:
+            year_url = (
+                urljoin(category_url + "/", y_href)
+                if not y_href.startswith("http")
+                else y_href
+            )
+            year_html = fetch(year_url)
+            if year_html is None:
+                continue
+            for file_href in extract_page(year_html).month_links[:max_cases]:
+                file_url = urljoin(year_url + "/", file_href)
+                case_html = fetch(file_url)
+                if case_html is None:
+                    continue
+                rtf_href = extract_page(case_html).rtf_link
+                if rtf_href:
+                    fetch(urljoin(file_url, rtf_href))
+                print(f"Recorded {file_url}")
+    _write_categories(fixture_dir, recorded)
+    return fixture_dir
+
+
+def _write_categories(fixture_dir, categories):
+    os.makedirs(fixture_dir, exist_ok=True)
+    with open(os.path.join(fixture_dir, "categories.json"), "w", encoding="utf-8") as f:
+        json.dump([list(pair) for pair in categories], f, indent=1)
+
+
+# -------------------------------------------------------------------
+MONTHS = (
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+)
+
+WORDS = (
+    "the court held that applicant respondent appeal judgment order section act "
+    "constitution evidence accused trial magistrate high supreme counsel costs "
+    "application dismissed granted paragraph regard finding submission matter "
+    "contract damages claim liability review decision tribunal labour unfair "
+    "dismissal employer employee statutory interpretation reasonable of in and "
+    "to a is was be not this by with on for as it"
+).split()
+
+
+def synthetic_rtf(rng, size):
+    """
+    An RTF judgment of about `size` bytes with the constructs real SAFLII
+    RTFs use: a font and colour table, groups, bold runs, tabs, hex escapes
+    (\\'e9) and \\u escapes.
+    """
+    parts = [
+        r"{\rtf1\ansi\ansicpg1252\deff0{\fonttbl{\f0\froman Times New Roman;}"
+        r"{\f1\fswiss Arial;}}{\colortbl;\red0\green0\blue0;}"
+        "\n" r"\pard\plain\f0\fs24 "
+    ]
+    length = len(parts[0])
+    number = 1
+    while length < size:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(40, 120))]
+        words[0] = words[0].capitalize()
+        if rng.random() < 0.3:
+            words[rng.randrange(len(words))] = r"caf\'e9"
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] = r"court\u8217?s"
+        if rng.random() < 0.3:
+            i = rng.randrange(len(words))
+            words[i] = r"{\b " + words[i] + "}"
+        paragraph = rf"[{number}]\tab " + " ".join(words) + ".\\par\n"
+        parts.append(paragraph)
+        length += len(paragraph)
+        number += 1
+    parts.append("}")
+    return "".join(parts)
+
+
+def synthesize_fixtures(
+    fixture_dir=None,
+    categories=2,
+    years=2,
+    cases_per_year=10,
+    rtf_size=40 * 1024,
+    seed=0,
+):
+    """
+    Write a fixture tree shaped like SAFLII's (category -> year -> case page ->
+    RTF) without touching the network, for CI and for benchmarks at a chosen
+    scale. Case hrefs are absolute, as on the live site.
+    """
+    fixture_dir = fixture_dir or get_default_fixture_dir()
+    rng = random.Random(seed)
+
+    def write(url_path, text):
+        path = fixture_path(fixture_dir, url_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+
+    pairs = []
+    for c in range(categories):
+        code = f"ZASYN{c}"
+        href = f"/za/cases/{code}"
+        title = f"South Africa: Synthetic Court {c}"
+        pairs.append((href, title))
+        year_list = [str(2024 - y) for y in range(years)]
+        write(
+            href + "/",
+            f"<html><head><title>{title}</title></head><body><h1>{title}</h1>"
+            '<div class="year-list">'
+            + "".join(f'<a href="{year}/">{year}</a> ' for year in year_list)
+            + "</div></body></html>",
+        )
+        for year in year_list:
+            items = []
+            for number in range(1, cases_per_year + 1):
+                month = MONTHS[(number - 1) % 12]
+                name = f"S v Synthetic {number} [{year}] {code} {number}"
+                items.append(
+                    f'<li class="make-database"><a href="{href}/{year}/{number}.html">'
+                    f"{name} ({rng.randint(1, 28)} {month} {year})</a></li>"
+                )
+                write(
+                    f"{href}/{year}/{number}.html",
+                    f"<html><head><title>{name}</title></head><body>"
+                    f"<h2>{name}</h2><p>Download: "
+                    f'<a href="{href}/{year}/{number}.rtf">RTF format</a> '
+                    f'<a href="{href}/{year}/{number}.pdf">PDF format</a></p>'
+                    "</body></html>",
+                )
+                write(
+                    f"{href}/{year}/{number}.rtf",
+                    synthetic_rtf(rng, int(rng.uniform(0.5, 1.5) * rtf_size)),
+                )
+            write(
+                f"{href}/{year}/",
+                f"<html><head><title>{title} {year}</title></head><body>"
+                f'<ul class="results">{"".join(items)}</ul></body></html>',
+            )
+    _write_categories(fixture_dir, pairs)
+    return fixture_dir
+
+
+# -------------------------------------------------------------------
+def _parse_error_statuses(value):
+    return tuple(
+        int(s) if re.fullmatch(r"\d+", s) else s for s in value.split(",") if s
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Record, synthesize or serve SAFLII fixtures for offline crawls."
+    )
+    parser.add_argument("--fixtures", default=None, help="Fixture directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Serve a fixture tree over HTTP.")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0, help="Seconds.")
+    serve.add_argument("--jitter", type=float, default=0.0, help="Seconds.")
+    serve.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of failed requests."
+    )
+    serve.add_argument(
+        "--error-statuses",
+        type=_parse_error_statuses,
+        default=ERROR_STATUSES,
+        help='Comma-separated statuses to inject, e.g. "500,503,429,reset".',
+    )
+    serve.add_argument(
+        "--bandwidth", type=float, default=None, help="Bytes per second per body."
+    )
+    serve.add_argument("--seed", type=int, default=0)
+
+    record = commands.add_parser("record", help="Capture pages from the live site.")
+    record.add_argument("--base-url", default="https://www.saflii.org")
+    record.add_argument(
+        "--category",
+        action="append",
+        required=True,
+        help='Category href such as "/za/cases/ZACC" (repeatable).',
+    )
+    record.add_argument("--max-years", type=int, default=1)
+    record.add_argument("--max-cases", type=int, default=5)
+
+    synthesize = commands.add_parser(
+        "synthesize", help="Generate SAFLII-shaped fixtures without the network."
+    )
+    synthesize.add_argument("--categories", type=int, default=2)
+    synthesize.add_argument("--years", type=int, default=2)
+    synthesize.add_argument("--cases-per-year", type=int, default=10)
+    synthesize.add_argument(
+        "--rtf-kb", type=int, default=40, help="Average RTF size in KB."
+    )
+    synthesize.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        server = ReplayServer(
+            args.fixtures,
+            port=args.port,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            error_statuses=args.error_statuses,
+            bandwidth=args.bandwidth,
+            seed=args.seed,
+        )
+        print(f"Serving {server.fixture_dir} at {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"Responses: {server.counts}")
+    elif args.command == "record":
+        from crawl_manifest import category_code
+
+        path = record_fixtures(
+            args.base_url,
+            [(href, category_code(href)) for href in args.category],
+            args.fixtures,
+            args.max_years,
+            args.max_cases,
+        )
+        print(f"Recorded fixtures in {path}")
+    else:
+        path = synthesize_fixtures(
+            args.fixtures,
+            args.categories,
+            args.years,
+            args.cases_per_year,
+            args.rtf_kb * 1024,
+            args.seed,
+        )
+        print(f"Synthesized fixtures in {path}")
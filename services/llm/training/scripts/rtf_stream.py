@@ -0,0 +1,436 @@
+import codecs
+import io
+import os
+import re
+
+from striprtf.striprtf import (
+    FONTTABLE,
+    HYPERLINKS,
+    charset_map,
+    destinations,
+    sectionchars,
+    specialchars,
+)
+
+
+# striprtf's tokenizer, except that runs of plain text are one token instead
+# of one token per character. The control word alternative is the longest
+# token (1 + 32 + 11 + 1 characters), so keeping TOKEN_LOOKAHEAD characters
+# back at a chunk boundary guarantees every token is seen whole.
+TOKEN = re.compile(
+    r"\\([a-z]{1,32})(-?\d{1,10})?[ ]?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|([^\\{}\r\n]+)|(.)",
+    re.IGNORECASE,
+)
+TOKEN_LOOKAHEAD = 64
+
+FIELD_START = re.compile(r"\{\\field\{", re.IGNORECASE)
+FONT_START = re.compile(r"\\f\d")
+# A HYPERLINK field spans at most this many non-blank lines, so a match
+# attempt is settled once that many further non-blank lines have arrived.
+HYPERLINK_MAX_LINES = 6
+# striprtf's regexes only stop at newlines, so on RTF without line breaks a
+# match attempt could run to the end of the document. Fields and font table
+# entries must instead end within this many characters of their start, which
+# bounds the look-ahead (and the rescanning) however the RTF is laid out.
+FIELD_LOOKAHEAD = 4096
+FONT_LOOKAHEAD = 4096
+
+
+class StreamingRtfConverter:
+    """
+    Incremental RTF-to-text converter producing the same text as striprtf's
+    rtf_to_text (the version pinned in requirements.txt).
+
+    Feed it decoded RTF in chunks of any size; converted text is written to
+    `out` as it becomes available. Ignorable destinations such as fonttbl,
+    colortbl, pict and info are skipped as they stream past, and at most a few
+    lines (or FIELD_LOOKAHEAD characters) of look-ahead are held in memory.
+    """
+
+    def __init__(self, out, encoding="cp1252", errors="strict"):
+        self.out = out
+        self.errors = errors
+        self.encoding = encoding
+        # Font encodings are derived from the initial encoding, not \ansicpg.
+        self._initial_encoding = encoding
+        self._link_pending = ""
+        self._font_pending = ""
+        self._font_waiting = False
+        self._token_pending = ""
+
+        self.fonttbl = {}
+        self.stack = []
+        self.default_font = None
+        self.current_font = None
+        self.ignorable = False
+        self.suppress_output = False
+        self.ucskip = 1
+        self.curskip = 0
+        self.hexes = None
+
+    # ---------------------------------------------------------------
+    def feed(self, text):
+        released = self._release_hyperlinks(self._link_pending + text, final=False)
+        self._process(released, final=False)
+
+    def close(self):
+        released = self._release_hyperlinks(self._link_pending, final=True)
+        self._process(released, final=True)
+
+    def _process(self, text, final):
+        if not text and not final:
+            return
+        self._scan_fonts(text, final)
+        # Text behind an undecided font table entry is held back as well, so a
+        # font is always registered before the tokenizer reaches its use.
+        hold = max(TOKEN_LOOKAHEAD, len(self._font_pending))
+        parts = []
+        self._tokenize(self._token_pending + text, final, hold, parts)
+        if parts:
+            self.out.write("".join(parts))
+
+    # ---------------------------------------------------------------
+    def _release_hyperlinks(self, text, final):
+        """
+        Apply striprtf's HYPERLINKS rewrite to the part of `text` where it can
+        no longer change, keeping the rest pending. A match attempt is settled
+        once HYPERLINK_MAX_LINES further lines or FIELD_LOOKAHEAD characters
+        have arrived, whichever comes first.
+        """
+        pieces = []
+        cut = pos = 0
+        settled = None
+        while True:
+            field = FIELD_START.search(text, pos)
+            if field is None:
+                # No match can start before the last few characters.
+                end = len(text) if final else max(cut, len(text) - 7)
+                break
+            begin = field.start()
+            window_end = begin + FIELD_LOOKAHEAD
+            if not final and window_end > len(text):
+                if settled is None:
+                    settled = _settled_prefix(text)
+                if begin >= settled:
+                    end = begin
+                    break
+            match = HYPERLINKS.match(text, begin, window_end)
+            if match is None:
+                pos = begin + 1
+                continue
+            pieces.append(text[cut:begin])
+            pieces.append(match.expand("\\1(\\2)"))
+            cut = pos = match.end()
+        pieces.append(text[cut:end])
+        self._link_pending = text[end:]
+        return "".join(pieces)
+
+    def _scan_fonts(self, text, final):
+        """
+        Collect font table entries the way striprtf's FONTTABLE.findall does,
+        for entries that end within FONT_LOOKAHEAD characters of their \\f.
+        """
+        if self._font_waiting and not final:
+            # An entry is waiting for more text; only rescan once something
+            # that can complete or break it (a newline, ";" or \fcharset) shows
+            # up, or once its look-ahead is used up.
+            if (
+                "\n" not in text
+                and ";" not in text
+                and "fcharset" not in text
+                and len(self._font_pending) + len(text) < FONT_LOOKAHEAD
+            ):
+                self._font_pending += text
+                return
+        buf = self._font_pending + text
+        self._font_pending = ""
+        self._font_waiting = False
+        pos = 0
+        # Next newline and \fcharset at or after the current \f, or len(buf).
+        newline = charset = -1
+        while True:
+            start = FONT_START.search(buf, pos)
+            if start is None:
+                break
+            begin = start.start()
+            window_end = begin + FONT_LOOKAHEAD
+            if newline < begin:
+                newline = _find(buf, "\n", begin)
+            if charset < begin:
+                charset = _find(buf, "\\fcharset", begin)
+            complete = final or window_end <= len(buf)
+            if charset < min(newline, window_end):
+                match = FONTTABLE.match(buf, begin, window_end)
+                if match is not None:
+                    font_id, fcharset, font_name = match.groups()
+                    self.fonttbl[font_id] = {
+                        "name": font_name.strip(),
+                        "charset": fcharset,
+                        "encoding": charset_map.get(
+                            int(fcharset), self._initial_encoding
+                        ),
+                    }
+                    pos = match.end()
+                    continue
+                undecided = not complete
+            else:
+                # No \fcharset before the end of the line: no entry starts here.
+                undecided = not complete and newline == len(buf)
+            if undecided:
+                self._font_pending = buf[begin:]
+                self._font_waiting = True
+                return
+            pos = begin + 1
+        if final:
+            return
+        # A "\f" split from its digit by the chunk boundary.
+        tail = buf.rfind("\\", max(pos, len(buf) - 2))
+        if tail >= 0:
+            self._font_pending = buf[tail:]
+
+    # ---------------------------------------------------------------
+    def _tokenize(self, text, final, hold, out):
+        limit = len(text) if final else len(text) - hold
+        pos = 0
+        specials = specialchars
+        for match in TOKEN.finditer(text):
+            if match.start() > limit:
+                break
+            pos = match.end()
+            word, arg, _hex, char, brace, run, tchar = match.groups()
+            if run is None:
+                run = tchar
+
+            if self.hexes and not _hex:
+                # Decode accumulated hexes
+                font = self.fonttbl.get(self.current_font, {"encoding": self.encoding})
+                out.append(
+                    bytes.fromhex(self.hexes).decode(
+                        encoding=font.get("encoding", self.encoding),
+                        errors=self.errors,
+                    )
+                )
+                self.hexes = None
+
+            if brace:
+                self.curskip = 0
+                if brace == "{":
+                    self.stack.append((self.ucskip, self.ignorable, self.suppress_output))
+                elif self.stack:
+                    self.ucskip, self.ignorable, self.suppress_output = self.stack.pop()
+                else:
+                    self.ucskip = 0
+                    self.ignorable = True
+            elif char:  # \x (not a letter)
+                self.curskip = 0
+                if char in specials:
+                    if char in sectionchars:
+                        self.current_font = self.default_font
+                    if not self.ignorable:
+                        out.append(specials[char])
+                elif char == "*":
+                    self.ignorable = True
+            elif word:  # \foo
+                self._control_word(word, arg, out)
+            elif _hex:  # \'xx
+                if self.curskip > 0:
+                    self.curskip -= 1
+                elif not self.ignorable:
+                    self.hexes = _hex if not self.hexes else self.hexes + _hex
+            elif run:
+                if self.curskip > 0:
+                    skipped = min(self.curskip, len(run))
+                    self.curskip -= skipped
+                    run = run[skipped:]
+                if run and not self.ignorable and not self.suppress_output:
+                    out.append(run)
+        self._token_pending = text[pos:] if not final else ""
+
+    def _control_word(self, word, arg, out):
+        self.curskip = 0
+        if word in destinations:
+            self.ignorable = True
+        elif word == "ansicpg":
+            self.encoding = f"cp{arg}"
+            try:
+                codecs.lookup(self.encoding)
+            except LookupError:
+                self.encoding = "utf8"
+        if self.ignorable or self.suppress_output:
+            return
+        if word in specialchars:
+            out.append(specialchars[word])
+        elif word == "uc":
+            self.ucskip = int(arg)
+        elif word == "u":
+            if arg is None:
+                self.curskip = self.ucskip
+            else:
+                c = int(arg)
+                if c < 0:
+                    c += 0x10000
+                out.append(chr(c))
+                self.curskip = self.ucskip
+        elif word == "f":
+            self.current_font = arg
+        elif word == "deff":
+            self.default_font = arg
+        elif word in ("fonttbl", "colortbl"):
+            self.suppress_output = True
+
+
+def _settled_prefix(text):
+    """
+    Return the offset before which every HYPERLINKS match attempt can be
+    decided from `text` alone: the start of the HYPERLINK_MAX_LINES-th
+    non-blank complete line counted from the end.
+    """
+    end = text.rfind("\n")
+    if end < 0:
+        return 0
+    seen = 0
+    while end > 0:
+        start = text.rfind("\n", 0, end) + 1
+        if text[start:end].strip():
+            seen += 1
+            if seen == HYPERLINK_MAX_LINES:
+                return start
+        end = start - 1
+    return 0
+
+
+def _find(text, sub, start):
+    index = text.find(sub, start)
+    return len(text) if index < 0 else index
+
+
+# -------------------------------------------------------------------
+def rtf_to_text(text, encoding="cp1252", errors="strict"):
+    """
+    Drop-in replacement for striprtf's rtf_to_text built on the streaming
+    converter.
+    """
+    out = io.StringIO()
+    converter = StreamingRtfConverter(out, encoding=encoding, errors=errors)
+    converter.feed(text)
+    converter.close()
+    return out.getvalue()
+
+
+def convert_chunks(chunks, out, text_encoding="cp1252", encoding="cp1252", errors="strict"):
+    """
+    Convert an iterable of raw RTF byte chunks, writing text to `out`.
+    `text_encoding` decodes the bytes themselves; `encoding` and `errors` are
+    passed through as in rtf_to_text. Returns the number of bytes read.
+    """
+    decoder = codecs.getincrementaldecoder(text_encoding)(errors="replace")
+    converter = StreamingRtfConverter(out, encoding=encoding, errors=errors)
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        converter.feed(decoder.decode(chunk))
+    converter.feed(decoder.decode(b"", final=True))
+    converter.close()
+    return size
+
+
+def convert_response(response, out, chunk_size=64 * 1024):
+    """
+    Stream a requests response opened with stream=True through the converter.
+    """
+    return convert_chunks(
+        response.iter_content(chunk_size=chunk_size),
+        out,
+        text_encoding=response.encoding or "cp1252",
+    )
+
+
+# -------------------------------------------------------------------
+def benchmark(paths, chunk_size=64 * 1024):
+    """
+    Report throughput (MB/s) and peak memory of striprtf versus the streaming
+    converter for each RTF file. Each converter runs in a fresh child process
+    so that its peak RSS is measured on its own.
+    """
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    for path in paths:
+        size = os.path.getsize(path)
+        results = {}
+        for mode in ("striprtf", "stream"):
+            with ctx.Pool(1) as pool:
+                results[mode] = pool.apply(_benchmark_one, (path, mode, chunk_size))
+        same = results["striprtf"][2] == results["stream"][2]
+        print(f"{os.path.basename(path)} ({size / 1e6:.1f} MB), output identical: {same}")
+        for mode, (seconds, peak_kb, _) in results.items():
+            print(
+                f"  {mode:<8} {size / 1e6 / seconds:8.2f} MB/s  "
+                f"peak RSS {peak_kb / 1024:8.1f} MB"
+            )
+
+
+def check(paths, chunk_sizes=(13, 4096, 64 * 1024)):
+    """
+    Compare the streaming converter with striprtf on sample RTF files (such
+    as ../tests/fixtures/rtf), feeding each file in several chunk sizes.
+    Returns the number of mismatches.
+    """
+    from striprtf.striprtf import rtf_to_text as reference
+
+    mismatches = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        expected = reference(data.decode("cp1252", errors="replace"), errors="replace")
+        for chunk_size in chunk_sizes:
+            out = io.StringIO()
+            chunks = (data[i : i + chunk_size] for i in range(0, len(data), chunk_size))
+            convert_chunks(chunks, out, errors="replace")
+            if out.getvalue() != expected:
+                mismatches += 1
+                print(f"MISMATCH {path} (chunk size {chunk_size})")
+    print(f"Checked {len(paths)} files, {mismatches} mismatches")
+    return mismatches
+
+
+def _benchmark_one(path, mode, chunk_size):
+    import hashlib
+    import resource
+    import time
+
+    start = time.perf_counter()
+    if mode == "striprtf":
+        from striprtf.striprtf import rtf_to_text as reference
+
+        with open(path, "r", encoding="cp1252", errors="replace") as f:
+            text = reference(f.read())
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    else:
+        # Hash the text as it streams out instead of keeping it.
+        sink = _HashingSink()
+        with open(path, "rb") as f:
+            convert_chunks(iter(lambda: f.read(chunk_size), b""), sink)
+        digest = sink.hash.hexdigest()
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return seconds, peak_kb, digest
+
+
+class _HashingSink:
+    def __init__(self):
+        import hashlib
+
+        self.hash = hashlib.sha256()
+
+    def write(self, text):
+        self.hash.update(text.encode("utf-8"))
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python rtf_stream.py [--check] file.rtf ...
+    if sys.argv[1:2] == ["--check"]:
+        sys.exit(1 if check(sys.argv[2:]) else 0)
+    benchmark(sys.argv[1:])
@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from near_duplicates import read_keep_list
+from process_text_file import (
+    clean_word,
+    count_corpus,
+    document_key,
+    list_corpus_documents,
+    read_corpus_document,
+    split_batches,
+)
+
+
+UNK = "<unk>"
+
+
+def get_default_dataset_dir():
+    """
+    Return scripts/corpus/token_dataset, next to the notebooks that use it.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "corpus", "token_dataset")
+
+
+# -------------------------------------------------------------------
+_stoi = None
+_dtype = None
+
+
+def _init_encoder(stoi, dtype):
+    global _stoi, _dtype
+    _stoi = stoi
+    _dtype = dtype
+
+
+def _encode_documents(batch):
+    # Runs in a worker: returns the batch's token IDs as one array plus the
+    # length of each document in it.
+    ids = []
+    lengths = []
+    get = _stoi.get
+    for item in batch:
+        words = [clean_word(word) for word in read_corpus_document(item).split()]
+        doc_ids = [get(word, 0) for word in words if word]
+        ids.extend(doc_ids)
+        lengths.append(len(doc_ids))
+    return np.array(ids, dtype=_dtype), lengths
+
+
+def build_token_dataset(
+    out_dir=None,
+    source="auto",
+    workers=None,
+    min_count=1,
+    data_dir=None,
+    store_path=None,
+    keep_file=None,
+):
+    """
+    Turn the cleaned corpus into a token-ID dataset in `out_dir`:
+
+        vocab.txt       one word per line; a word's ID is its line number, and
+                        ID 0 is <unk> for words seen fewer than min_count times
+        tokens.bin      every document's word IDs back to back, uint16 when the
+                        vocabulary fits and uint32 otherwise
+        offsets.npy     int64 array of len(documents) + 1; document i is
+                        tokens[offsets[i]:offsets[i + 1]]
+        documents.txt   the name of each document, in order
+        meta.json       dtype, sizes and build settings
+
+    With `keep_file` (near_duplicates' dedup_keep.txt) only the listed
+    documents are used. Words are cleaned exactly as in process_text_file.
+    Documents are encoded on a process pool and appended to tokens.bin in
+    order, so neither the text nor the token list of the whole corpus is held
+    in memory at once. Raises ValueError if the documents hold no tokens,
+    since there would be nothing to sample from.
+    """
+    out_dir = out_dir or get_default_dataset_dir()
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    documents = list_corpus_documents(source, data_dir, store_path)
+    if keep_file:
+        keep = read_keep_list(keep_file)
+        documents = [item for item in documents if document_key(item) in keep]
+    if not documents:
+        raise ValueError(f"No documents to build a token dataset from ({source}).")
+    print(f"Counting words in {len(documents)} documents...")
+    counts = count_corpus(documents, workers=workers)
+
+    itos = [UNK] + [word for word, count in counts.items() if count >= min_count]
+    stoi = {word: i for i, word in enumerate(itos)}
+    dtype = np.uint16 if len(itos) <= np.iinfo(np.uint16).max + 1 else np.uint32
+    with open(os.path.join(out_dir, "vocab.txt"), "w", encoding="utf-8") as f:
+        for word in itos:
+            f.write(word + "\n")
+
+    print(f"Encoding with a {len(itos)} word vocabulary ({np.dtype(dtype).name})...")
+    lengths = []
+    tokens_path = os.path.join(out_dir, "tokens.bin")
+    with open(tokens_path + ".part", "wb") as f, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_encoder, initargs=(stoi, dtype)
+    ) as executor:
+        for ids, batch_lengths in executor.map(
+            _encode_documents, split_batches(documents, workers, max_size=64)
+        ):
+            ids.tofile(f)
+            lengths.extend(batch_lengths)
+    if not sum(lengths):
+        os.remove(tokens_path + ".part")
+        raise ValueError(f"The {len(documents)} documents hold no words.")
+    os.replace(tokens_path + ".part", tokens_path)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    with open(os.path.join(out_dir, "documents.txt"), "w", encoding="utf-8") as f:
+        for item in documents:
+            f.write(document_key(item) + "\n")
+
+    meta = {
+        "dtype": np.dtype(dtype).name,
+        "vocab_size": len(itos),
+        "num_tokens": int(offsets[-1]),
+        "num_documents": len(documents),
+        "longest_document": max(lengths),
+        "min_count": min_count,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(
+        f"Wrote {meta['num_tokens']} tokens from {meta['num_documents']} "
+        f"documents to {out_dir}"
+    )
+    return meta
+
+
+# -------------------------------------------------------------------
+class TokenDataset:
+    """
+    Read-only view of a dataset written by build_token_dataset. The token
+    array is an np.memmap, so opening it is instant and batches only touch
+    the pages they read.
+
+        ds = TokenDataset(block_size=8)
+        x, y = ds.sample_batch(32, block_size=8)  # (32, 8) int64 arrays
+
+    Opening a dataset with no tokens raises ValueError, and so does passing
+    a `block_size` that no document is long enough to sample a window of.
+    """
+
+    def __init__(self, path=None, block_size=None, cross_documents=False):
+        self.path = path or get_default_dataset_dir()
+        with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if not self.meta["num_tokens"]:
+            raise ValueError(f"Token dataset {self.path} is empty.")
+        with open(os.path.join(self.path, "vocab.txt"), "r", encoding="utf-8") as f:
+            self.itos = f.read().split("\n")[: self.meta["vocab_size"]]
+        self.stoi = {word: i for i, word in enumerate(self.itos)}
+        self.tokens = np.memmap(
+            os.path.join(self.path, "tokens.bin"),
+            dtype=self.meta["dtype"],
+            mode="r",
+            shape=(self.meta["num_tokens"],),
+        )
+        self.offsets = np.load(os.path.join(self.path, "offsets.npy"))
+        self.longest_document = int(np.diff(self.offsets).max())
+        if block_size is not None:
+            self._check_block_size(block_size, cross_documents)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @property
+    def vocab_size(self):
+        return len(self.itos)
+
+    @property
+    def num_documents(self):
+        return len(self.offsets) - 1
+
+    def document(self, i):
+        """
+        Token IDs of document i, as a zero-copy slice of the memmap.
+        """
+        return self.tokens[self.offsets[i] : self.offsets[i + 1]]
+
+    def encode(self, words):
+        """
+        Clean and map words to IDs the same way the dataset was built.
+        """
+        cleaned = (clean_word(word) for word in words)
+        return [self.stoi.get(word, 0) for word in cleaned if word]
+
+    def decode(self, ids):
+        return [self.itos[i] for i in ids]
+
+    def _check_block_size(self, block_size, cross_documents):
+        span = block_size + 1
+        if cross_documents and len(self.tokens) < span:
+            raise ValueError(
+                f"Token dataset {self.path} has {len(self.tokens)} tokens, "
+                f"fewer than one window of {span}."
+            )
+        if not cross_documents and self.longest_document < span:
+            raise ValueError(
+                f"The longest document in {self.path} has "
+                f"{self.longest_document} tokens, fewer than one window of "
+                f"{span}; use a smaller block_size or cross_documents=True."
+            )
+
+    def sample_batch(
+        self, batch_size, block_size, rng=None, cross_documents=False
+    ):
+        """
+        Draw `batch_size` random windows of block_size + 1 tokens and return
+        (x, y) with y shifted one token to the right of x. Windows stay inside
+        a single document unless cross_documents is True; documents are
+        picked in proportion to the number of windows they hold, so every
+        window in the corpus is equally likely.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        self._check_block_size(block_size, cross_documents)
+        span = block_size + 1
+        if cross_documents:
+            starts = rng.integers(0, len(self.tokens) - span + 1, size=batch_size)
+        else:
+            windows = np.diff(self.offsets) - span + 1
+            windows = np.maximum(windows, 0)
+            total = windows.sum()
+            # Pick a window uniformly over all documents, then map it back to
+            # its document and position.
+            picks = rng.integers(0, total, size=batch_size)
+            ends = np.cumsum(windows)
+            docs = np.searchsorted(ends, picks, side="right")
+            starts = self.offsets[docs] + picks - (ends[docs] - windows[docs])
+        index = starts[:, None] + np.arange(span)
+        window = self.tokens[index].astype(np.int64)
+        return window[:, :-1], window[:, 1:]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the memory-mapped token-ID dataset for the notebooks."
+    )
+    parser.add_argument("--out", default=None, help="Output directory.")
+    parser.add_argument(
+        "--source",
+        choices=("auto", "store", "files"),
+        default="auto",
+        help="Read the corpus store or the loose data/ files "
+        "(default: the store if it exists).",
+    )
+    parser.add_argument(
+        "--min-count",
+        type=int,
+        default=1,
+        help="Words seen fewer times than this map to <unk>.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Processes used for counting and encoding (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--keep",
+        default=None,
+        help="Only use the documents listed in this file "
+        "(near_duplicates.py writes corpus/dedup_keep.txt).",
+    )
+    args = parser.parse_args()
+    build_token_dataset(
+        args.out, args.source, args.workers, args.min_count, keep_file=args.keep
+    )
@@ -0,0 +1,5 @@
+import os
+import sys
+
+TRAINING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(TRAINING_DIR, "scripts"))
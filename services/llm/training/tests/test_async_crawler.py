@@ -0,0 +1,232 @@
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import async_crawler
+import preprocess_data
+from case_pipeline import CaseFileWriter
+from crawl_manifest import CrawlManifest
+from http_cache import ListingCache
+from pacing import HostPacers
+from replay_server import ReplayServer, read_categories, synthesize_fixtures
+
+LATENCY = 0.05
+
+
+@pytest.fixture(scope="module")
+def fixture_dir(tmp_path_factory):
+    return synthesize_fixtures(
+        str(tmp_path_factory.mktemp("fixtures")),
+        categories=2,
+        years=2,
+        cases_per_year=6,
+        rtf_size=4 * 1024,
+    )
+
+
+def read_tree(folder):
+    tree = {}
+    for root, _, files in os.walk(folder):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            with open(path, "r", encoding="utf-8") as f:
+                tree[os.path.relpath(path, folder)] = f.read()
+    return tree
+
+
+def crawl(crawler, fixture_dir, work_dir, monkeypatch):
+    """
+    Crawl the fixtures through a ReplayServer with LATENCY per request into
+    work_dir/data/<category title>/; return the elapsed seconds.
+    """
+    data_dir = os.path.join(work_dir, "data")
+    for module in (preprocess_data, async_crawler):
+        monkeypatch.setattr(
+            module, "get_target_folder", lambda title: os.path.join(data_dir, title)
+        )
+    manifest = CrawlManifest(os.path.join(work_dir, "manifest.sqlite3"))
+    listing_cache = ListingCache(os.path.join(work_dir, "http_cache"))
+    with ReplayServer(fixture_dir, latency=LATENCY) as server:
+        start = time.perf_counter()
+        if crawler == "sequential":
+            preprocess_data.process_subdirectories(
+                server.url,
+                read_categories(fixture_dir),
+                manifest=manifest,
+                listing_cache=listing_cache,
+                pacers=HostPacers(max_rate=1000),
+            )
+        else:
+            async_crawler.process_subdirectories_async(
+                server.url,
+                read_categories(fixture_dir),
+                max_concurrency=8,
+                per_host_concurrency=8,
+                rate=1000,
+                burst=8,
+                manifest=manifest,
+                listing_cache=listing_cache,
+            )
+        elapsed = time.perf_counter() - start
+    manifest.close()
+    return elapsed
+
+
+def test_async_crawl_is_faster_with_the_same_output(
+    fixture_dir, tmp_path, monkeypatch
+):
+    sequential = crawl("sequential", fixture_dir, str(tmp_path / "seq"), monkeypatch)
+    concurrent = crawl("async", fixture_dir, str(tmp_path / "async"), monkeypatch)
+
+    expected = read_tree(str(tmp_path / "seq" / "data"))
+    # 2 categories x 2 years x 6 cases, one folder per category.
+    assert len(expected) == 24
+    assert len({os.path.dirname(name) for name in expected}) == 2
+    assert read_tree(str(tmp_path / "async" / "data")) == expected
+    # Every case costs two round trips in turn sequentially; with 8 requests
+    # in flight the async crawl should be several times faster.
+    assert concurrent * 3 < sequential
+
+
+def crawl_async(
+    server,
+    fixture_dir,
+    work_dir,
+    monkeypatch,
+    per_host_concurrency=8,
+    categories=None,
+    output=None,
+):
+    """
+    Crawl `server` with an AsyncCrawler that retries quickly; return the tree
+    of case files written.
+    """
+    data_dir = os.path.join(work_dir, "data")
+    monkeypatch.setattr(
+        async_crawler, "get_target_folder", lambda title: os.path.join(data_dir, title)
+    )
+    manifest = CrawlManifest(os.path.join(work_dir, "manifest.sqlite3"))
+
+    async def run():
+        crawler = async_crawler.AsyncCrawler(
+            server.url,
+            max_concurrency=8,
+            per_host_concurrency=per_host_concurrency,
+            rate=1000,
+            manifest=manifest,
+            listing_cache=ListingCache(os.path.join(work_dir, "http_cache")),
+            retries=8,
+            output=output,
+        )
+        crawler.policy.base_delay = 0.01
+        await crawler.run(categories or read_categories(fixture_dir))
+
+    asyncio.run(run())
+    manifest.close()
+    return read_tree(data_dir)
+
+
+def test_streamed_downloads_hold_their_slots(fixture_dir, tmp_path, monkeypatch):
+    # Throttled bodies keep each RTF download going for a while; the server
+    # must never see more of them at once than the per-host limit.
+    with ReplayServer(fixture_dir, bandwidth=32 * 1024) as server:
+        tree = crawl_async(
+            server, fixture_dir, str(tmp_path), monkeypatch, per_host_concurrency=2
+        )
+        peak = server.peak_concurrency
+    assert len(tree) == 24
+    assert peak <= 2
+
+
+def test_truncated_bodies_are_retried(fixture_dir, tmp_path, monkeypatch):
+    with ReplayServer(fixture_dir) as server:
+        expected = crawl_async(
+            server, fixture_dir, str(tmp_path / "clean"), monkeypatch
+        )
+    with ReplayServer(
+        fixture_dir, error_rate=0.3, error_statuses=("truncate",), seed=1
+    ) as server:
+        tree = crawl_async(server, fixture_dir, str(tmp_path / "faulty"), monkeypatch)
+        truncated = server.counts.get("truncate", 0)
+    assert len(expected) == 24
+    assert tree == expected
+    assert truncated > 0
+
+
+class CountingWriter(CaseFileWriter):
+    """
+    CaseFileWriter that counts saves per case and how many are running.
+    """
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+        self.saves = Counter()
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def save_stream(self, job, rtf_response):
+        with self._lock:
+            self.saves[job.category, job.case_id] += 1
+            self.running += 1
+        try:
+            time.sleep(self.delay)
+            return super().save_stream(job, rtf_response)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def test_cases_listed_twice_are_crawled_once(fixture_dir, tmp_path, monkeypatch):
+    # Like SAFLII's two ZANWHC categories: one code under two titles.
+    categories = read_categories(fixture_dir)
+    href, title = categories[0]
+    output = CountingWriter()
+    with ReplayServer(fixture_dir) as server:
+        tree = crawl_async(
+            server,
+            fixture_dir,
+            str(tmp_path),
+            monkeypatch,
+            categories=categories + [(href, title + " (duplicate)")],
+            output=output,
+        )
+    assert len(tree) == 24
+    assert len(output.saves) == 24
+    assert set(output.saves.values()) == {1}
+
+
+def test_cancelled_run_waits_for_running_saves(fixture_dir, tmp_path, monkeypatch):
+    # Ctrl-C cancels the run; the caller then closes the output and manifest,
+    # so no save may still be running once run() has returned.
+    data_dir = str(tmp_path / "data")
+    monkeypatch.setattr(
+        async_crawler, "get_target_folder", lambda title: os.path.join(data_dir, title)
+    )
+    manifest = CrawlManifest(str(tmp_path / "manifest.sqlite3"))
+    output = CountingWriter(delay=0.3)
+
+    async def run():
+        crawler = async_crawler.AsyncCrawler(
+            server.url,
+            rate=1000,
+            manifest=manifest,
+            listing_cache=ListingCache(str(tmp_path / "http_cache")),
+            output=output,
+        )
+        task = asyncio.create_task(crawler.run(read_categories(fixture_dir)))
+        while not output.running:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return output.running
+
+    with ReplayServer(fixture_dir) as server:
+        assert asyncio.run(run()) == 0
+    manifest.close()
+    assert 0 < sum(output.saves.values()) < 24
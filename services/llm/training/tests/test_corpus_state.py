@@ -0,0 +1,105 @@
+"""
+An incremental refresh of the corpus word counts must end up exactly where a
+full recount of the same documents does.
+"""
+
+import os
+
+from corpus_state import CorpusState
+from corpus_store import CorpusWriter
+from process_text_file import count_corpus, list_corpus_documents, refresh_corpus
+
+TEXTS = {
+    "Constitutional Court/S v Makwanyane.txt": (
+        "The death penalty is unconstitutional. S v Makwanyane 1995 (3) SA 391."
+    ),
+    "Constitutional Court/Grootboom.txt": (
+        "Government of the RSA v Grootboom: the right of access to housing."
+    ),
+    "Supreme Court of Appeal/Fraser v ABSA.txt": (
+        "An appeal on the forfeiture of property; the appeal is dismissed."
+    ),
+    "Labour Court/NUMSA v Bader Bop.txt": (
+        "Minority unions and the right to strike, s 64 of the LRA."
+    ),
+}
+
+
+def write_texts(data_dir, texts):
+    for name, text in texts.items():
+        path = os.path.join(data_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def refresh_and_recount(state, source, **paths):
+    documents = list_corpus_documents(source, **paths)
+    result = refresh_corpus(documents, state, workers=2)
+    return result, state.word_counts(), count_corpus(documents, workers=2)
+
+
+def test_refresh_matches_recount_for_files(tmp_path):
+    data_dir = str(tmp_path / "data")
+    write_texts(data_dir, TEXTS)
+    with CorpusState(str(tmp_path / "state.sqlite3")) as state:
+        result, counts, expected = refresh_and_recount(
+            state, "files", data_dir=data_dir
+        )
+        assert result == (4, 0)
+        # Built from scratch, even the vocabulary order agrees.
+        assert counts == list(expected.items())
+
+        # Nothing changed: nothing is counted again.
+        result, counts, expected = refresh_and_recount(
+            state, "files", data_dir=data_dir
+        )
+        assert result == (0, 0)
+        assert dict(counts) == expected
+
+        # Change one judgment, add one and remove the only one with "strike".
+        changed = os.path.join(data_dir, "Constitutional Court/Grootboom.txt")
+        write_texts(
+            data_dir,
+            {
+                "Constitutional Court/Grootboom.txt": (
+                    "Grootboom: the state must devise a housing programme."
+                ),
+                "Labour Court/SACCAWU v Woolworths.txt": (
+                    "Retrenchment of part-time workers; the appeal succeeds."
+                ),
+            },
+        )
+        # A new mtime even if the rewrite lands within the same clock tick.
+        os.utime(changed, (1, 1))
+        os.remove(os.path.join(data_dir, "Labour Court/NUMSA v Bader Bop.txt"))
+        result, counts, expected = refresh_and_recount(
+            state, "files", data_dir=data_dir
+        )
+        assert result == (2, 1)
+        assert dict(counts) == expected
+        assert "strike" not in dict(counts) and "programme" in dict(counts)
+
+
+def test_refresh_matches_recount_for_the_store(tmp_path):
+    store_path = str(tmp_path / "store")
+    store = CorpusWriter(store_path)
+    for n, text in enumerate(TEXTS.values()):
+        store.add_text("ZACC", f"1995/{n}", text)
+    store.close()
+    with CorpusState(str(tmp_path / "state.sqlite3")) as state:
+        result, counts, expected = refresh_and_recount(
+            state, "store", store_path=store_path
+        )
+        assert result == (4, 0)
+        assert counts == list(expected.items())
+
+        store = CorpusWriter(store_path)
+        store.add_text("ZACC", "1995/1", "A new judgment replaces the old text.")
+        store.add_text("ZASCA", "2001/1", "Unfair dismissal; the appeal fails.")
+        store.close()
+        result, counts, expected = refresh_and_recount(
+            state, "store", store_path=store_path
+        )
+        assert result == (2, 0)
+        assert dict(counts) == expected
@@ -0,0 +1,143 @@
+"""
+extract_page must return exactly what the BeautifulSoup helpers it replaced
+returned. They are kept here, unchanged, as the reference.
+"""
+
+import glob
+import os
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from link_extractor import extract_page
+from preprocess_data import (
+    get_case_links,
+    get_month_links,
+    get_rtf_link,
+    get_year_links,
+)
+from replay_server import synthesize_fixtures
+
+PAGES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages"
+)
+PAGES = sorted(glob.glob(os.path.join(PAGES_DIR, "*.html")))
+
+
+# -------------------------------------------------------------------
+# The BeautifulSoup-based helpers as they were in preprocess_data
+def bs4_year_links(html):
+    soup = BeautifulSoup(html, "html.parser")
+    year_links = []
+    for link in soup.find_all("a", href=True):
+        # Check both text and href for year patterns
+        if re.search(r"\b(19|20)\d{2}\b", link.text) or re.search(
+            r"\b(19|20)\d{2}\b", link["href"]
+        ):
+            year_links.append(link.get("href"))
+    return year_links
+
+
+def bs4_month_links(html):
+    soup = BeautifulSoup(html, "html.parser")
+    month_links = []
+    for li in soup.find_all("li", class_="make-database"):
+        link = li.find("a", href=True)
+        if link and re.search(
+            r"\b(January|February|March|April|May|June|July|August|September"
+            r"|October|November|December)\b",
+            link.text,
+            re.IGNORECASE,
+        ):
+            month_links.append(link.get("href"))
+    return month_links
+
+
+def bs4_case_links(html):
+    soup = BeautifulSoup(html, "html.parser")
+    case_links = []
+    # Look for any element that could logically contain case links
+    containers = soup.find_all(
+        ["div", "ul", "ol", "table"], class_=re.compile(r"case-list|results")
+    )
+    for container in containers:
+        for link in container.find_all("a", href=True):
+            href = link["href"]
+            if re.search(r"\d{4}/\d+\.html", href):
+                case_links.append(href)
+    return case_links
+
+
+def bs4_rtf_link(html):
+    soup = BeautifulSoup(html, "html.parser")
+    # First, check for hrefs ending with .rtf
+    rtf_anchor = soup.find("a", href=re.compile(r"\.rtf$", re.IGNORECASE))
+    # If not found, check for "RTF" in link text
+    if not rtf_anchor:
+        rtf_anchor = soup.find("a", string=re.compile(r"\bRTF\b", re.IGNORECASE))
+    # If still not found, check for "Download" or "Document" links
+    if not rtf_anchor:
+        rtf_anchor = soup.find(
+            "a", href=re.compile(r"download|document", re.IGNORECASE)
+        )
+    return rtf_anchor.get("href") if rtf_anchor else None
+
+
+def bs4_title(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return (soup.title is not None, soup.title.string if soup.title else None)
+
+
+# -------------------------------------------------------------------
+def assert_equivalent(html):
+    page = extract_page(html)
+    assert page.year_links == bs4_year_links(html)
+    assert page.month_links == bs4_month_links(html)
+    assert page.case_links == bs4_case_links(html)
+    assert page.rtf_link == bs4_rtf_link(html)
+    assert (page.has_title, page.title) == bs4_title(html)
+
+
+def read_page(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_fixture_pages(path):
+    assert_equivalent(read_page(path))
+
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_preprocess_helpers(path):
+    html = read_page(path)
+    assert get_year_links(html) == bs4_year_links(html)
+    assert get_month_links(html) == bs4_month_links(html)
+    assert get_case_links(html) == bs4_case_links(html)
+    assert get_rtf_link(html) == bs4_rtf_link(html)
+
+
+def test_fixture_pages_are_not_trivial():
+    # Each extraction path is exercised by at least one saved page.
+    pages = [extract_page(read_page(path)) for path in PAGES]
+    assert any(page.year_links for page in pages)
+    assert any(page.month_links for page in pages)
+    assert any(page.case_links for page in pages)
+    assert {page.rtf_link for page in pages} >= {
+        "/za/cases/ZACC/2023/1.rtf",
+        "/cgi-bin/format.cgi?doc=/za/cases/ZACC/2023/3.html&format=rtf",
+        "/download/za/cases/ZACC/2023/4",
+        None,
+    }
+    assert any(not page.has_title for page in pages)
+
+
+def test_synthesized_pages(tmp_path):
+    fixture_dir = synthesize_fixtures(
+        str(tmp_path), categories=2, years=2, cases_per_year=3, rtf_size=1024
+    )
+    paths = glob.glob(os.path.join(fixture_dir, "**", "*.html"), recursive=True)
+    assert len(paths) == 2 + 4 + 12
+    for path in paths:
+        assert_equivalent(read_page(path))
@@ -0,0 +1,119 @@
+"""
+Every Tensor operation's backward pass must agree with finite differences,
+and an MLP built from Tensors with the scalar Value engine.
+"""
+
+import numpy as np
+import pytest
+
+from micrograd.benchmark import check
+from micrograd.engine import Tensor
+from micrograd.nn import MLP
+
+RNG = np.random.default_rng(0)
+
+
+def positive(*shape):
+    return RNG.uniform(0.5, 2.0, shape)
+
+
+def away_from_zero(*shape):
+    # ReLU's kink at 0 has no derivative to check.
+    return RNG.choice([-1.0, 1.0], shape) * RNG.uniform(0.1, 1.0, shape)
+
+
+# (op, input arrays): op maps the input Tensors to one output Tensor.
+OPS = {
+    "add broadcast": (lambda a, b: a + b, [(3, 4), (4,)]),
+    "radd": (lambda a: 2.0 + a, [(3,)]),
+    "sub broadcast": (lambda a, b: a - b, [(3, 1), (1, 4)]),
+    "rsub": (lambda a: 1.0 - a, [(2, 3)]),
+    "neg": (lambda a: -a, [(2, 3)]),
+    "mul broadcast": (lambda a, b: a * b, [(2, 3, 4), (3, 1)]),
+    "div": (lambda a, b: a / b, [(3, 4), positive(3, 4)]),
+    "rdiv": (lambda a: 1.0 / a, [positive(5)]),
+    "pow": (lambda a: a**3, [(2, 3)]),
+    "sqrt": (lambda a: a**0.5, [positive(4)]),
+    "matmul": (lambda a, b: a @ b, [(3, 4), (4, 5)]),
+    "matmul vector left": (lambda a, b: a @ b, [(4,), (4, 5)]),
+    "matmul vector right": (lambda a, b: a @ b, [(3, 4), (4,)]),
+    "matmul vector dot": (lambda a, b: a @ b, [(4,), (4,)]),
+    "matmul batched": (lambda a, b: a @ b, [(2, 3, 4), (4, 5)]),
+    "rmatmul": (lambda a: np.ones((2, 3)) @ a, [(3, 4)]),
+    "tanh": (lambda a: a.tanh(), [(3, 4)]),
+    "relu": (lambda a: a.relu(), [away_from_zero(3, 4)]),
+    "sigmoid": (lambda a: a.sigmoid(), [(3, 4)]),
+    "exp": (lambda a: a.exp(), [(3, 4)]),
+    "log": (lambda a: a.log(), [positive(3, 4)]),
+    "sum": (lambda a: a.sum(), [(3, 4)]),
+    "sum axis": (lambda a: a.sum(axis=1), [(2, 3, 4)]),
+    "sum keepdims": (lambda a: a.sum(axis=0, keepdims=True), [(3, 4)]),
+    "mean axes": (lambda a: a.mean(axis=(0, 2)), [(2, 3, 4)]),
+    "reshape": (lambda a: a.reshape(4, 3), [(2, 6)]),
+    "transpose": (lambda a: a.T, [(3, 4)]),
+    "transpose axes": (lambda a: a.transpose(2, 0, 1), [(2, 3, 4)]),
+    "getitem rows": (lambda a: a[np.array([0, 2, 0, 0])], [(3, 4)]),
+    "getitem tensor": (lambda a: a[Tensor([[1, 1], [2, 0]])], [(3, 4)]),
+    "getitem slice": (lambda a: a[:, 1:3], [(3, 4)]),
+    "softmax": (lambda a: a.softmax(), [(3, 5)]),
+    "softmax axis": (lambda a: a.softmax(axis=0), [(3, 5)]),
+    "cross_entropy": (lambda a: a.cross_entropy([4, 0, 2]), [(3, 5)]),
+    "cross_entropy 3d": (lambda a: a.cross_entropy([[1, 0], [3, 3]]), [(2, 2, 4)]),
+}
+
+
+def numeric_grad(f, x, eps=1e-6):
+    grad = np.zeros_like(x)
+    for index in np.ndindex(x.shape):
+        saved = x[index]
+        x[index] = saved + eps
+        up = f()
+        x[index] = saved - eps
+        down = f()
+        x[index] = saved
+        grad[index] = (up - down) / (2 * eps)
+    return grad
+
+
+@pytest.mark.parametrize("name", OPS)
+def test_backward_matches_finite_differences(name):
+    op, specs = OPS[name]
+    arrays = [
+        RNG.standard_normal(spec) if isinstance(spec, tuple) else spec.copy()
+        for spec in specs
+    ]
+    inputs = [Tensor(array, requires_grad=True) for array in arrays]
+    out = op(*inputs)
+    # A random weighting, so every output element sends back its own gradient.
+    weights = RNG.standard_normal(out.shape)
+    (out * weights).sum().backward()
+
+    def loss():
+        return float((op(*[Tensor(a) for a in arrays]).data * weights).sum())
+
+    for tensor, array in zip(inputs, arrays):
+        assert tensor.grad.shape == array.shape
+        np.testing.assert_allclose(
+            tensor.grad, numeric_grad(loss, array), rtol=1e-5, atol=1e-7
+        )
+
+
+def test_gradients_accumulate_over_reused_tensors():
+    a = Tensor(RNG.standard_normal((3,)), requires_grad=True)
+    (a * a + a).sum().backward()
+    np.testing.assert_allclose(a.grad, 2 * a.data + 1)
+
+
+def test_constants_get_no_gradient():
+    a = Tensor(RNG.standard_normal((3,)), requires_grad=True)
+    b = Tensor(RNG.standard_normal((3,)))
+    (a * b).sum().backward()
+    assert b.grad is None and not b.requires_grad
+
+
+def test_mlp_matches_scalar_value_engine():
+    rng = np.random.default_rng(1)
+    model = MLP(5, [8, 8, 4], rng=rng)
+    x = rng.standard_normal((6, 5))
+    y = rng.integers(0, 4, size=6)
+    assert check(model, x, y) < 1e-10
@@ -0,0 +1,89 @@
+"""
+Planted near-duplicate judgments must be clustered together, and distinct
+judgments left alone.
+"""
+
+import json
+import os
+import random
+
+from near_duplicates import compute_signatures, deduplicate, find_clusters
+from process_text_file import document_key, list_corpus_documents
+
+RNG = random.Random(7)
+VOCABULARY = [
+    "".join(RNG.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(RNG.randint(3, 9)))
+    for _ in range(3000)
+]
+
+
+def judgment(words=300):
+    return " ".join(RNG.choice(VOCABULARY) for _ in range(words))
+
+
+def edit(text, changes):
+    words = text.split()
+    for position in RNG.sample(range(len(words)), changes):
+        words[position] = RNG.choice(VOCABULARY)
+    return " ".join(words)
+
+
+BASE = [judgment() for _ in range(6)]
+TEXTS = {f"Court {n % 2}/Judgment {n}.txt": text for n, text in enumerate(BASE)}
+# The same judgment as reported by other courts: two words changed, shouted
+# with punctuation, and with a postscript (the most complete copy).
+TEXTS["Court 2/Judgment 0 edited.txt"] = edit(BASE[0], 2)
+TEXTS["Court 2/Judgment 0 shouted.txt"] = BASE[0].upper().replace(" ", ", ")
+TEXTS["Court 2/Judgment 3 with postscript.txt"] = BASE[3] + " " + judgment(15)
+
+
+def write_texts(data_dir, texts):
+    for name, text in texts.items():
+        path = os.path.join(data_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def test_planted_duplicates_share_a_cluster(tmp_path):
+    data_dir = str(tmp_path / "data")
+    write_texts(data_dir, TEXTS)
+    documents = list_corpus_documents("files", data_dir=data_dir)
+    keys = [document_key(item) for item in documents]
+
+    signatures, sizes = compute_signatures(documents, workers=2)
+    clusters = find_clusters(signatures, sizes)
+
+    found = sorted(sorted(keys[i] for i in members) for members in clusters)
+    assert found == [
+        [
+            "Court 0/Judgment 0.txt",
+            "Court 2/Judgment 0 edited.txt",
+            "Court 2/Judgment 0 shouted.txt",
+        ],
+        ["Court 1/Judgment 3.txt", "Court 2/Judgment 3 with postscript.txt"],
+    ]
+
+
+def test_deduplicate_keeps_one_copy_per_cluster(tmp_path):
+    data_dir = str(tmp_path / "data")
+    out_dir = str(tmp_path / "out")
+    write_texts(data_dir, TEXTS)
+
+    report = deduplicate(out_dir, source="files", workers=2, data_dir=data_dir)
+
+    keeps = {entry["keep"] for entry in report}
+    assert "Court 2/Judgment 3 with postscript.txt" in keeps
+    for entry in report:
+        assert all(copy["similarity"] >= 0.8 for copy in entry["duplicates"])
+    with open(os.path.join(out_dir, "near_duplicates.json"), encoding="utf-8") as f:
+        assert json.load(f) == report
+    with open(os.path.join(out_dir, "dedup_keep.txt"), encoding="utf-8") as f:
+        kept = f.read().split("\n")[:-1]
+    # One copy of each of the six judgments, in corpus order.
+    assert len(kept) == 6
+    assert [key for key in sorted(TEXTS) if key in kept] == kept
+    assert len([key for key in kept if "Judgment 0" in key]) == 1
+    assert "Court 1/Judgment 3.txt" not in kept
+    for n in (1, 2, 4, 5):
+        assert f"Court {n % 2}/Judgment {n}.txt" in kept
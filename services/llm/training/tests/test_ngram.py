@@ -0,0 +1,103 @@
+"""
+Sparse n-gram counts must equal a plain Counter over each document, however
+the counting is sharded, and every context's probabilities must sum to 1.
+"""
+
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from ngram import NGramCounts, count_ngrams
+from token_dataset import TokenDataset, build_token_dataset
+
+TEXTS = {
+    "Constitutional Court/Makwanyane.txt": (
+        "the death penalty is cruel the death penalty is inhuman and the "
+        "death penalty is degrading so the death penalty is unconstitutional"
+    ),
+    "Constitutional Court/Grootboom.txt": (
+        "the state must take reasonable measures the state must act and "
+        "the measures must be reasonable"
+    ),
+    "Labour Court/Strike.txt": "the strike is protected and the strike is lawful",
+    "Labour Court/Short.txt": "the court",
+}
+
+
+def write_texts(data_dir, texts):
+    for name, text in texts.items():
+        path = os.path.join(data_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+@pytest.fixture(scope="module")
+def dataset_path(tmp_path_factory):
+    root = tmp_path_factory.mktemp("ngram")
+    write_texts(str(root / "data"), TEXTS)
+    out_dir = str(root / "dataset")
+    build_token_dataset(out_dir, source="files", workers=2, data_dir=str(root / "data"))
+    return out_dir
+
+
+def expected_counts(dataset_path, n):
+    # n-grams within each document, never across two.
+    dataset = TokenDataset(dataset_path)
+    counts = Counter()
+    for i in range(dataset.num_documents):
+        ids = [int(token) for token in dataset.document(i)]
+        counts.update(tuple(ids[j : j + n]) for j in range(len(ids) - n + 1))
+    return counts
+
+
+def as_counter(ngrams):
+    counter = Counter()
+    for code, count in zip(ngrams.codes, ngrams.counts):
+        words = []
+        for _ in range(ngrams.n):
+            code, word = divmod(int(code), ngrams.vocab_size)
+            words.append(word)
+        counter[tuple(reversed(words))] = int(count)
+    return counter
+
+
+@pytest.mark.parametrize("n", [2, 3])
+@pytest.mark.parametrize("workers, chunk_tokens", [(1, 1 << 22), (2, 5)])
+def test_counts_match_counter(dataset_path, n, workers, chunk_tokens):
+    ngrams = count_ngrams(n, dataset_path, workers=workers, chunk_tokens=chunk_tokens)
+    expected = expected_counts(dataset_path, n)
+    assert as_counter(ngrams) == expected
+    assert len(ngrams) == len(expected)
+
+    grams = np.array(list(expected), dtype=np.int64)
+    contexts = grams[:, 0] if n == 2 else grams[:, :-1]
+    assert list(ngrams.count(contexts, grams[:, -1])) == list(expected.values())
+
+
+@pytest.mark.parametrize("n", [2, 3])
+@pytest.mark.parametrize("k", [0.0, 0.5, 1.0])
+def test_probabilities_sum_to_one(dataset_path, n, k):
+    ngrams = count_ngrams(n, dataset_path, workers=1)
+    vocab = ngrams.vocab_size
+    seen = [
+        [int(code) // vocab ** (n - 2 - i) % vocab for i in range(n - 1)]
+        for code in ngrams.contexts
+    ]
+    # A context that never occurs: the word after "court" ends its document.
+    court = TokenDataset(dataset_path).stoi["court"]
+    for context in seen + [[court] * (n - 1)]:
+        contexts = np.array([context] * vocab, dtype=np.int64)
+        if n == 2:
+            contexts = contexts[:, 0]
+        probabilities = ngrams.probability(contexts, np.arange(vocab), k=k)
+        assert probabilities.sum() == pytest.approx(1.0)
+
+
+def test_save_and_load_round_trip(dataset_path, tmp_path):
+    ngrams = count_ngrams(2, dataset_path, workers=1)
+    loaded = NGramCounts.load(ngrams.save(str(tmp_path / "ngram_2.npz")))
+    assert as_counter(loaded) == as_counter(ngrams)
+    assert np.array_equal(loaded.indptr, ngrams.indptr)
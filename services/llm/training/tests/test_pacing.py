@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+from async_crawler import AsyncCrawler
+from crawl_manifest import CrawlManifest
+from crawl_metrics import metrics
+from http_cache import CachedResponse, ListingCache
+from pacing import AdaptivePacer, RetryPolicy
+from replay_server import ReplayServer, read_categories, synthesize_fixtures
+
+
+def test_retry_after_is_capped_for_the_pacer():
+    # A day-long (or hostile) Retry-After must not block the host for a day.
+    response = CachedResponse(503, "", False, {"Retry-After": "86400"})
+    pacer = AdaptivePacer(max_rate=100)
+    policy = RetryPolicy(max_retry_after=5)
+    delay = policy.outcome(pacer, "http://example.test/", 0, 0.01, response)
+    assert 5 <= delay <= 5 + policy.base_delay / 4
+    assert 4 < pacer.reserve() <= 5
+
+
+def test_retries_are_reported_apart_from_errors():
+    metrics.reset()
+    response = CachedResponse(503, "", False, {})
+    policy = RetryPolicy()
+    policy.outcome(AdaptivePacer(), "http://example.test/", 0, 0.01, response, "c1")
+    report = metrics.to_json()
+    assert report["errors"] == []
+    assert report["retries"] == [{"category": "c1", "count": 1}]
+    assert "0 errors | 1 retries" in metrics.summary()
+    assert 'crawler_retries_total{category="c1"} 1' in metrics.to_prometheus()
+    metrics.reset()
+
+
+def test_summary_reports_each_case_outcome():
+    metrics.reset()
+    for outcome in ("stored", "stored", "skipped", "no_rtf", "failed", "failed"):
+        metrics.case("c1", outcome)
+    metrics.case("c2", "failed")
+    assert "2 cases" in metrics.summary()
+    assert "1 skipped, 1 no_rtf, 3 failed" in metrics.summary()
+    metrics.reset()
+
+
+def test_fresh_listing_pages_skip_slots_and_pacing(tmp_path):
+    fixture_dir = synthesize_fixtures(
+        str(tmp_path / "fixtures"), categories=1, years=1, cases_per_year=1
+    )
+    href, _ = read_categories(fixture_dir)[0]
+    manifest = CrawlManifest(os.path.join(tmp_path, "manifest.sqlite3"))
+    cache = ListingCache(os.path.join(tmp_path, "http_cache"))
+
+    async def fetch_twice(url):
+        crawler = AsyncCrawler(url, manifest=manifest, listing_cache=cache)
+        pacer = crawler.pacers.for_url(url)
+        recorded = []
+        pacer.record = lambda *args, **kwargs: recorded.append(args)
+        first = await crawler.fetch(url + href, listing=True)
+        second = await crawler.fetch(url + href, listing=True)
+        crawler._executor.shutdown()
+        crawler.session.close()
+        return first, second, recorded
+
+    with ReplayServer(fixture_dir) as server:
+        first, second, recorded = asyncio.run(fetch_twice(server.url))
+        requests_made = sum(server.counts.values())
+    manifest.close()
+
+    assert not first.from_cache and second.from_cache
+    assert second.text == first.text
+    # Only the first fetch went to the network and fed the pacer.
+    assert requests_made == 1
+    assert len(recorded) == 1
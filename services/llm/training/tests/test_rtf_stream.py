@@ -0,0 +1,143 @@
+"""
+The streaming converter must produce exactly striprtf's output, however the
+RTF is split into chunks.
+"""
+
+import glob
+import io
+import os
+import random
+
+import pytest
+from striprtf.striprtf import rtf_to_text as reference
+
+from replay_server import synthetic_rtf
+from rtf_stream import (
+    FIELD_LOOKAHEAD,
+    FONT_LOOKAHEAD,
+    StreamingRtfConverter,
+    check,
+    convert_chunks,
+    rtf_to_text,
+)
+
+RTF_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "rtf")
+SAMPLES = sorted(glob.glob(os.path.join(RTF_DIR, "*.rtf")))
+CHUNK_SIZES = (1, 7, 13, 64, 4096, 64 * 1024)
+
+
+def read_sample(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def expected_text(data):
+    return reference(data.decode("cp1252", errors="replace"), errors="replace")
+
+
+def stream(data, chunk_size):
+    out = io.StringIO()
+    chunks = (data[i : i + chunk_size] for i in range(0, len(data), chunk_size))
+    assert convert_chunks(chunks, out, errors="replace") == len(data)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_sample_matches_striprtf(path, chunk_size):
+    data = read_sample(path)
+    assert stream(data, chunk_size) == expected_text(data)
+
+
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_rtf_to_text_matches_striprtf(path):
+    text = read_sample(path).decode("cp1252", errors="replace")
+    assert rtf_to_text(text, errors="replace") == reference(text, errors="replace")
+
+
+def test_check_reports_no_mismatches():
+    assert len(SAMPLES) >= 4
+    assert check(SAMPLES) == 0
+
+
+def test_large_synthetic_judgment():
+    data = synthetic_rtf(random.Random(1), 512 * 1024).encode("ascii")
+    expected = expected_text(data)
+    assert len(expected) > 256 * 1024
+    for chunk_size in (1000, 64 * 1024):
+        assert stream(data, chunk_size) == expected
+
+
+def newline_free_rtf(paragraphs):
+    # Some writers put a whole document on one line: a font table with a
+    # Cyrillic font, font switches in every paragraph, and a PAGE field and a
+    # hyperlink in the body.
+    body = []
+    for n in range(paragraphs):
+        body.append(
+            rf"\pard\f0 Paragraph {n}; the court held\par"
+            rf"\f1 \'cf\'f0\'e8\'e2\'e5\'f2\f0  back to Latin.\par"
+        )
+        if n == 10:
+            body.append(r"{\field{\*\fldinst{ PAGE }}{\fldrslt{1}}}\par")
+        if n == paragraphs // 2:
+            body.append(
+                r'{\field{\*\fldinst{HYPERLINK "https://example.test/"}}'
+                r"{\fldrslt{\ul Judgment}}}\par"
+            )
+    return (
+        r"{\rtf1\ansi\ansicpg1252\deff0{\fonttbl{\f0\froman\fcharset0 Times New"
+        r" Roman;}{\f1\fswiss\fcharset204 Arial Cyr;}}"
+        + "".join(body)
+        + "}"
+    ).encode("cp1252")
+
+
+def test_newline_free_rtf_is_not_buffered():
+    data = newline_free_rtf(800)
+    assert b"\n" not in data and len(data) > 8 * (FIELD_LOOKAHEAD + FONT_LOOKAHEAD)
+    expected = expected_text(data)
+    assert "https://example.test/" in expected and "\u041f" in expected
+
+    for chunk_size in (1, 1000, 64 * 1024):
+        out = io.StringIO()
+        converter = StreamingRtfConverter(out, errors="replace")
+        held = 0
+        for i in range(0, len(data), chunk_size):
+            converter.feed(data[i : i + chunk_size].decode("cp1252"))
+            # The font table look-ahead is held back by the tokenizer as well.
+            held = max(
+                held, len(converter._token_pending) + len(converter._link_pending)
+            )
+        converter.close()
+        assert out.getvalue() == expected
+        assert held < FIELD_LOOKAHEAD + FONT_LOOKAHEAD
+    text = data.decode("cp1252")
+    assert rtf_to_text(text, errors="replace") == expected
+
+
+def test_ignorable_destinations_are_not_buffered():
+    # A 4 MB picture, its hex wrapped at 128 characters a line as RTF
+    # writers do, streams past with only a few lines held back.
+    head = (
+        rb"{\rtf1\ansi{\fonttbl{\f0 Arial;}}{\info{\title T}}\pard\f0 Before."
+        rb"\par{\pict\pngblip"
+    )
+    picture = (b"\r\n" + b"89504e470d0a1a0a" * 8) * (4 * 1024 * 1024 // 128)
+    tail = rb"}After.\par}"
+    data = head + picture + tail
+
+    out = io.StringIO()
+    converter = StreamingRtfConverter(out)
+    held = 0
+    for i in range(0, len(data), 64 * 1024):
+        converter.feed(data[i : i + 64 * 1024].decode("cp1252"))
+        held = max(
+            held,
+            len(converter._token_pending)
+            + len(converter._link_pending)
+            + len(converter._font_pending),
+        )
+    converter.close()
+    assert out.getvalue() == expected_text(data) == "Before.\nAfter.\n"
+    assert held < 1024
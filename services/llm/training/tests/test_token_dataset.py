@@ -0,0 +1,62 @@
+"""
+A token dataset that cannot yield a single window must be refused when it is
+built or opened, not when the first batch is drawn.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from token_dataset import TokenDataset, build_token_dataset
+
+TEXTS = {
+    "Constitutional Court/Makwanyane.txt": "the death penalty is unconstitutional",
+    "Labour Court/Strike.txt": "the strike is protected",
+    "Labour Court/Short.txt": "dismissed",
+}
+
+
+def write_texts(data_dir, texts):
+    for name, text in texts.items():
+        path = os.path.join(data_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def build(tmp_path, texts):
+    data_dir = str(tmp_path / "data")
+    out_dir = str(tmp_path / "dataset")
+    write_texts(data_dir, texts)
+    os.makedirs(data_dir, exist_ok=True)
+    build_token_dataset(out_dir, source="files", workers=1, data_dir=data_dir)
+    return out_dir
+
+
+def test_windows_stay_inside_documents(tmp_path):
+    dataset = TokenDataset(build(tmp_path, TEXTS), block_size=4)
+    assert dataset.longest_document == 5
+    x, y = dataset.sample_batch(16, block_size=4, rng=np.random.default_rng(0))
+    # Only "the death penalty is unconstitutional" holds a window of 5.
+    expected = dataset.encode(TEXTS["Constitutional Court/Makwanyane.txt"].split())
+    assert (x == expected[:-1]).all() and (y == expected[1:]).all()
+
+
+def test_empty_corpus_is_refused_when_built(tmp_path):
+    with pytest.raises(ValueError, match="No documents"):
+        build(tmp_path, {})
+    with pytest.raises(ValueError, match="no words"):
+        build(tmp_path, {"Labour Court/Blank.txt": " \n"})
+
+
+def test_short_documents_are_refused_when_opened(tmp_path):
+    path = build(tmp_path, TEXTS)
+    with pytest.raises(ValueError, match="longest document .* 5 tokens"):
+        TokenDataset(path, block_size=5)
+    # Across documents the 10 tokens are enough.
+    dataset = TokenDataset(path, block_size=5, cross_documents=True)
+    with pytest.raises(ValueError, match="longest document"):
+        dataset.sample_batch(4, block_size=5)
+    with pytest.raises(ValueError, match="fewer than one window of 11"):
+        TokenDataset(path, block_size=10, cross_documents=True)